@@ -0,0 +1,329 @@
+
+# 标准库导入
+import os
+import json
+import zlib
+import heapq
+import shutil
+import struct
+import threading
+from datetime import datetime, timedelta
+
+# 本地模块导入
+from fileutil import atomic_write
+from plan_store import PlanStore, summarize_plan
+from tasks import parse_tasks
+from perf import timed
+
+SEGMENT_MAGIC = b'DPARCH1\n'
+FOOTER_MAGIC = b'DPIX'
+# 文件末尾：索引偏移(8 字节) + 索引长度(4 字节) + 魔数
+FOOTER = struct.Struct('>QI4s')
+SEGMENT_SUFFIX = '.seg'
+
+# 每条记录单独压缩以便随机读取，预置字典让短小的 JSON 也能压缩得动
+ZDICT = ('{"date": "", "content": "", "tag": "", "done": false, "last_modified": "", '
+         '"done": true}\n# \n## \n- [ ] \n- [x] \n- [>] \n```\n> （顺延自 ）'
+         '工作学习生活其他计划完成会议评审').encode('utf-8')
+
+# 默认把一年前的计划归档
+DEFAULT_ARCHIVE_AGE_DAYS = 365
+
+
+def _compress(payload):
+    compressor = zlib.compressobj(9, zdict=ZDICT)
+    return compressor.compress(payload) + compressor.flush()
+
+
+def _decompress(blob):
+    decompressor = zlib.decompressobj(zdict=ZDICT)
+    return decompressor.decompress(blob) + decompressor.flush()
+
+
+class ArchiveSegment:
+    """一个只读的归档段文件：逐条压缩的计划 + 末尾的偏移索引
+
+    索引中同时保存每天的摘要，日历总览不必解压计划内容。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._index = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def write(path, records):
+        """把按日期排序的计划写成段文件"""
+        chunks = [SEGMENT_MAGIC]
+        offset = len(SEGMENT_MAGIC)
+        index = {}
+        for data in records:
+            blob = _compress(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+            summary = summarize_plan(data)
+            index[data['date']] = [offset, len(blob), summary['tag'], summary['done'],
+                                   summary['items'], summary['done_items'], summary['last_modified'],
+                                   summary['hash']]
+            chunks.append(blob)
+            offset += len(blob)
+        index_blob = _compress(json.dumps(index, ensure_ascii=False).encode('utf-8'))
+        chunks.append(index_blob)
+        chunks.append(FOOTER.pack(offset, len(index_blob), FOOTER_MAGIC))
+        atomic_write(path, b''.join(chunks))
+
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                with open(self.path, 'rb') as f:
+                    f.seek(-FOOTER.size, os.SEEK_END)
+                    offset, length, magic = FOOTER.unpack(f.read(FOOTER.size))
+                    if magic != FOOTER_MAGIC:
+                        raise ValueError(f"归档文件已损坏: {self.path}")
+                    f.seek(offset)
+                    self._index = json.loads(_decompress(f.read(length)).decode('utf-8'))
+            return self._index
+
+    def dates(self):
+        return sorted(self.index())
+
+    def load(self, plan_date):
+        """只解压所需的一条记录"""
+        entry = self.index().get(plan_date)
+        if entry is None:
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(entry[0])
+            return json.loads(_decompress(f.read(entry[1])).decode('utf-8'))
+
+    def iter_records(self, start=None, end=None):
+        """按日期顺序产出区间内的计划，顺序读取整个文件"""
+        index = self.index()
+        wanted = [plan_date for plan_date in sorted(index)
+                  if (not start or plan_date >= start) and (not end or plan_date <= end)]
+        if not wanted:
+            return
+        with open(self.path, 'rb') as f:
+            for plan_date in wanted:
+                offset, length = index[plan_date][:2]
+                f.seek(offset)
+                yield json.loads(_decompress(f.read(length)).decode('utf-8'))
+
+    def summary(self, plan_date):
+        entry = self.index()[plan_date]
+        tag, done, items, done_items, last_modified = entry[2:7]
+        # 早期的段文件索引中没有内容哈希
+        return {'date': plan_date, 'tag': tag, 'done': done, 'items': items,
+                'done_items': done_items, 'last_modified': last_modified,
+                'hash': entry[7] if len(entry) > 7 else None}
+
+
+class ArchivedStore(PlanStore):
+    """在计划存储外面加一层归档：新数据写入 live，读取时 live 优先，找不到再查归档段
+
+    段文件按年（YYYY.seg）或按月（YYYY-MM.seg）存放在 archive 目录下。
+    归档过的日期再次保存时写入 live，覆盖归档中的旧内容，下次压缩时合并。
+    """
+
+    def __init__(self, live, archive_dir):
+        self.live = live
+        self.archive_dir = archive_dir
+        self._lock = threading.RLock()
+        self._segments = {}
+        self._dir_mtime = None
+
+    def _segment_map(self):
+        with self._lock:
+            try:
+                mtime = os.stat(self.archive_dir).st_mtime_ns
+            except OSError:
+                self._segments, self._dir_mtime = {}, None
+                return self._segments
+            if mtime != self._dir_mtime:
+                # 段文件都是改名替换的，目录修改时间变化就重新列出，索引随之重新读取
+                self._segments = {
+                    name[:-len(SEGMENT_SUFFIX)]: ArchiveSegment(os.path.join(self.archive_dir, name))
+                    for name in os.listdir(self.archive_dir) if name.endswith(SEGMENT_SUFFIX)
+                }
+                self._dir_mtime = mtime
+            return self._segments
+
+    def invalidate(self):
+        """段文件被改写后丢弃缓存的索引"""
+        with self._lock:
+            self._segments, self._dir_mtime = {}, None
+
+    def _segment_for(self, plan_date):
+        segments = self._segment_map()
+        return segments.get(plan_date[:7]) or segments.get(plan_date[:4])
+
+    def _segments_in_range(self, start=None, end=None):
+        """与区间有交集的段，按键排序"""
+        result = []
+        for key, segment in sorted(self._segment_map().items()):
+            first, last = _key_range(key)
+            if (not start or last >= start) and (not end or first <= end):
+                result.append(segment)
+        return result
+
+    def archived_dates(self, start=None, end=None):
+        dates = []
+        for segment in self._segments_in_range(start, end):
+            dates.extend(plan_date for plan_date in segment.dates()
+                         if (not start or plan_date >= start) and (not end or plan_date <= end))
+        return sorted(dates)
+
+    @timed('archive.load')
+    def load(self, plan_date):
+        data = self.live.load(plan_date)
+        if data is not None:
+            return data
+        segment = self._segment_for(plan_date)
+        return segment.load(plan_date) if segment is not None else None
+
+    def save_many(self, records):
+        self.live.save_many(records)
+
+    def delete(self, plan_date):
+        self.live.delete(plan_date)
+        segment = self._segment_for(plan_date)
+        if segment is not None and plan_date in segment.index():
+            # 归档中的删除很少见，直接重写所在的段
+            records = [data for data in segment.iter_records() if data['date'] != plan_date]
+            if records:
+                ArchiveSegment.write(segment.path, records)
+            else:
+                os.remove(segment.path)
+            self.invalidate()
+
+    def exists(self, plan_date):
+        if self.live.exists(plan_date):
+            return True
+        segment = self._segment_for(plan_date)
+        return segment is not None and plan_date in segment.index()
+
+    def dates(self, start=None, end=None):
+        return sorted(set(self.live.dates(start, end)) | set(self.archived_dates(start, end)))
+
+    def iter_plans(self, start=None, end=None, tags=None):
+        archived = (data for segment in self._segments_in_range(start, end)
+                    for data in segment.iter_records(start, end)
+                    if not tags or data.get('tag') in tags)
+        live_dates = set(self.live.dates(start, end))
+        archived = (data for data in archived if data['date'] not in live_dates)
+        # 两路都按日期有序，归并即可
+        return heapq.merge(self.live.iter_plans(start, end, tags), archived, key=lambda data: data['date'])
+
+    def day_summaries(self, start=None, end=None):
+        summaries = {}
+        for segment in self._segments_in_range(start, end):
+            for plan_date in segment.dates():
+                if (not start or plan_date >= start) and (not end or plan_date <= end):
+                    summaries[plan_date] = segment.summary(plan_date)
+        summaries.update(self.live.day_summaries(start, end))
+        return dict(sorted(summaries.items()))
+
+    def query_tasks(self, start=None, end=None, state=None, tags=None):
+        tasks = self.live.query_tasks(start, end, state, tags)
+        if not self._segments_in_range(start, end):
+            return tasks
+        live_dates = set(self.live.dates(start, end))
+        for segment in self._segments_in_range(start, end):
+            for data in segment.iter_records(start, end):
+                if data['date'] in live_dates:
+                    continue
+                tasks.extend(task for task in parse_tasks(data)
+                             if (state is None or task['state'] == state) and (not tags or task['tag'] in tags))
+        return sorted(tasks, key=lambda task: (task['date'], task['position']))
+
+    def checkpoint(self):
+        self.live.checkpoint()
+
+    def close(self):
+        self.live.close()
+
+
+def _key_range(key):
+    """段键（YYYY 或 YYYY-MM）覆盖的首尾日期"""
+    return (f"{key}-01", f"{key}-31") if len(key) == 7 else (f"{key}-01-01", f"{key}-12-31")
+
+
+def _tree_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _storage_size(data_dir, names):
+    return sum(_tree_size(os.path.join(data_dir, name)) for name in names
+               if os.path.exists(os.path.join(data_dir, name)))
+
+
+@timed('archive.compact')
+def compact(store, data_dir, older_than_days=DEFAULT_ARCHIVE_AGE_DAYS, by='year',
+            purge_legacy=False, today=None):
+    """把早于 older_than_days 天的计划移入压缩段，返回归档天数和节省的空间
+
+    by 为 'year' 或 'month'，决定段文件的粒度；已有段会与新归档的计划合并。
+    所有段文件都落盘之后，才在一个事务中从 live 删除这些天，中途失败时计划仍留在 live 中。
+    purge_legacy=True 时同时删除迁移遗留的 legacy_json 目录和旧版 zip 备份。
+    """
+    if by not in ('year', 'month'):
+        raise ValueError(f"不支持的归档粒度: {by}")
+    today = today or datetime.now().strftime('%Y-%m-%d')
+    cutoff = (datetime.strptime(today, '%Y-%m-%d') - timedelta(days=older_than_days)).strftime('%Y-%m-%d')
+    measured = ['plans.db', 'plans.db-wal', 'archive', 'legacy_json']
+    legacy_zips = []
+    backup_dir = os.path.join(data_dir, 'backups')
+    if os.path.isdir(backup_dir):
+        legacy_zips = [os.path.join('backups', name) for name in os.listdir(backup_dir) if name.endswith('.zip')]
+    # 前后统计同一组路径，未清理的旧备份不会被算作节省的空间
+    measured += legacy_zips
+    before = _storage_size(data_dir, measured)
+
+    archive_dir = store.archive_dir
+    os.makedirs(archive_dir, exist_ok=True)
+    old_dates = [plan_date for plan_date in store.live.dates(None, cutoff) if plan_date < cutoff]
+    groups = {}
+    for plan_date in old_dates:
+        groups.setdefault(plan_date[:4] if by == 'year' else plan_date[:7], []).append(plan_date)
+
+    for key, dates in sorted(groups.items()):
+        records = {}
+        # 先读出已有段中属于这个键的记录（包括另一种粒度的段），再用 live 中的新内容覆盖
+        existing = store._segments_in_range(*_key_range(key))
+        for segment in existing:
+            for data in segment.iter_records(*_key_range(key)):
+                records[data['date']] = data
+        for data in store.live.iter_plans(dates[0], dates[-1]):
+            if data['date'] in dates:
+                records[data['date']] = data
+        path = os.path.join(archive_dir, key + SEGMENT_SUFFIX)
+        ArchiveSegment.write(path, [records[plan_date] for plan_date in sorted(records)])
+        for segment in existing:
+            if os.path.normpath(segment.path) != os.path.normpath(path):
+                # 被合并进新段的记录也要从旧段中去掉，避免同一天存在两处
+                remaining = [data for data in segment.iter_records() if data['date'] not in records]
+                if remaining:
+                    ArchiveSegment.write(segment.path, remaining)
+                else:
+                    os.remove(segment.path)
+        store.invalidate()
+
+    # 段文件由 atomic_write 写入并 fsync，全部写完后一次删除 live 中的记录
+    archived = len(old_dates)
+    if archived:
+        store.live.delete_many(old_dates)
+        store.live.vacuum()
+    if purge_legacy:
+        shutil.rmtree(os.path.join(data_dir, 'legacy_json'), ignore_errors=True)
+        for rel_path in legacy_zips:
+            os.remove(os.path.join(data_dir, rel_path))
+    after = _storage_size(data_dir, measured)
+    return {'archived_days': archived, 'segments': len(groups), 'bytes_before': before,
+            'bytes_after': after, 'bytes_saved': before - after}
@@ -0,0 +1,151 @@
+
+# 标准库导入
+import os
+import json
+import hashlib
+
+
+def plan_hash(data):
+    """计划内容的哈希，只包含用户可编辑的字段"""
+    payload = json.dumps(
+        [data.get('date'), data.get('content', ''), data.get('tag'), bool(data.get('done'))],
+        ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class EditJournal:
+    """未保存编辑的预写日志（JSON Lines，只追加）
+
+    保存前先追加一条 edit 记录，保存成功后追加 commit 记录；
+    启动时 edit 之后没有对应 commit 的就是上次未保存的内容。
+    """
+
+    # 没有待恢复内容且日志超过这个行数时截断
+    COMPACT_LINES = 200
+
+    def __init__(self, data_dir):
+        self.path = os.path.join(data_dir, 'journal.jsonl')
+        self._lines = 0
+
+    def _append(self, record):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._lines += 1
+
+    def record_edit(self, data):
+        self._append({'type': 'edit', 'hash': plan_hash(data), 'data': data})
+
+    def record_commit(self, data):
+        self._append({'type': 'commit', 'date': data['date'], 'hash': plan_hash(data)})
+        if self._lines >= self.COMPACT_LINES and not self.pending():
+            self.clear()
+
+    def pending(self):
+        """返回各日期最后一次未提交的编辑，按日期排序"""
+        if not os.path.exists(self.path):
+            return []
+        edits = {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 崩溃时最后一行可能只写了一半
+                    continue
+                if record.get('type') == 'edit':
+                    edits[record['data']['date']] = record
+                elif record.get('type') == 'commit':
+                    edit = edits.get(record['date'])
+                    if edit is not None and edit['hash'] == record['hash']:
+                        del edits[record['date']]
+        return [edits[plan_date]['data'] for plan_date in sorted(edits)]
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._lines = 0
+
+
+class AutoSaver:
+    """监听 tk.Text 的 <<Modified>> 事件，停止输入一段时间后自动保存
+
+    get_state() 返回当前编辑器对应的计划（不含 last_modified），返回 None 表示暂不保存；
+    save(data, on_done) 负责真正写入存储，并在成功后于主线程调用 on_done()；
+    background(fn) 在后台按顺序执行写日志操作，应与 save 使用同一个串行通道。
+    只有内容哈希与上次持久化的版本不同时才会写日志和保存。
+    listeners 中的回调在每次内容变化时调用，供实时预览等功能复用同一个事件。
+    """
+
+    JOURNAL_DELAY_MS = 500
+    SAVE_DELAY_MS = 3000
+
+    def __init__(self, root, text, journal, get_state, save, background):
+        self.root = root
+        self.text = text
+        self.journal = journal
+        self.get_state = get_state
+        self.save = save
+        self.background = background
+        self._saved_hash = None
+        self._journaled_hash = None
+        self._journal_job = None
+        self._save_job = None
+        self.listeners = []
+        text.bind('<<Modified>>', self._on_modified, add='+')
+
+    def mark_saved(self, data):
+        """记录已持久化的版本，例如加载或手动保存之后"""
+        self._saved_hash = self._journaled_hash = plan_hash(data)
+        self.cancel()
+        self.text.edit_modified(False)
+
+    def cancel(self):
+        for job in (self._journal_job, self._save_job):
+            if job is not None:
+                self.root.after_cancel(job)
+        self._journal_job = self._save_job = None
+
+    def _on_modified(self, event=None):
+        if not self.text.edit_modified():
+            return
+        # 重置标志，下一次修改才会再次触发事件
+        self.text.edit_modified(False)
+        self.schedule()
+
+    def schedule(self):
+        """内容有变化，重新开始计时"""
+        self.cancel()
+        self._journal_job = self.root.after(self.JOURNAL_DELAY_MS, self._write_journal)
+        self._save_job = self.root.after(self.SAVE_DELAY_MS, self.flush)
+        for callback in self.listeners:
+            callback()
+
+    def _write_journal(self, data=None):
+        self._journal_job = None
+        data = data or self.get_state()
+        if data is None:
+            return
+        digest = plan_hash(data)
+        if digest in (self._saved_hash, self._journaled_hash):
+            return
+        self._journaled_hash = digest
+        self.background(lambda: self.journal.record_edit(data))
+
+    def flush(self):
+        """立即保存尚未持久化的修改"""
+        self.cancel()
+        data = self.get_state()
+        if data is None:
+            return
+        digest = plan_hash(data)
+        if digest == self._saved_hash:
+            return
+        self._write_journal(data)
+
+        def done():
+            self._saved_hash = digest
+            self.background(lambda: self.journal.record_commit(data))
+
+        self.save(data, done)
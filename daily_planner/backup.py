@@ -0,0 +1,212 @@
+
+# 标准库导入
+import os
+import json
+import zlib
+import hashlib
+from datetime import datetime
+
+# 本地模块导入
+from fileutil import atomic_write
+from perf import timed
+
+# 不参与备份的顶层条目：备份本身、由计划派生的数据库文件、已迁移的旧文件、编辑日志、
+# 归档段（归档中的计划经由 store.iter_plans 按天备份）
+EXCLUDED_NAMES = {'backups', 'legacy_json', 'archive'}
+EXCLUDED_PREFIXES = ('plans.db', 'search.db', 'history.db', 'journal.jsonl', 'sync_state.json', '.tmp_')
+
+
+class BackupCancelled(Exception):
+    """备份或恢复被取消"""
+
+
+class BackupRepository:
+    """内容寻址的增量备份库
+
+    每个计划和文件按 SHA-256 存成一个压缩对象，相同内容只存一份；
+    每次快照只写一个记录 日期/路径 -> 哈希 的清单文件。
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.backup_dir = os.path.join(data_dir, 'backups')
+        self.objects_dir = os.path.join(self.backup_dir, 'objects')
+        self.snapshots_dir = os.path.join(self.backup_dir, 'snapshots')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def _put(self, payload, known):
+        digest = hashlib.sha256(payload).hexdigest()
+        if digest in known:
+            return digest, False
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            known.add(digest)
+            return digest, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 对象逐个 fsync 太慢，只保证不出现半个文件；清单写入时才同步落盘
+        atomic_write(path, zlib.compress(payload), fsync=False)
+        known.add(digest)
+        return digest, True
+
+    def _get(self, digest):
+        with open(self._object_path(digest), 'rb') as f:
+            return zlib.decompress(f.read())
+
+    def _iter_files(self):
+        """产出需要备份的数据文件相对路径"""
+        for root, dirs, files in os.walk(self.data_dir):
+            if root == self.data_dir:
+                dirs[:] = [d for d in dirs if d not in EXCLUDED_NAMES]
+                files = [f for f in files if not f.startswith(EXCLUDED_PREFIXES)]
+            for name in sorted(files):
+                yield os.path.relpath(os.path.join(root, name), self.data_dir)
+
+    def list_snapshots(self):
+        """按时间从新到旧返回快照编号"""
+        return sorted(
+            (name[:-5] for name in os.listdir(self.snapshots_dir) if name.endswith('.json')),
+            reverse=True)
+
+    def load_manifest(self, snapshot_id):
+        with open(os.path.join(self.snapshots_dir, f"{snapshot_id}.json"), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @timed('backup.create')
+    def create_snapshot(self, store, progress=None, cancelled=None):
+        """创建快照，返回清单；progress(已处理, 总数) 用于汇报进度"""
+        known = set()
+        snapshots = self.list_snapshots()
+        if snapshots:
+            # 上一次快照引用的对象一定存在，不必再查磁盘
+            previous = self.load_manifest(snapshots[0])
+            known.update(previous['plans'].values())
+            known.update(previous['files'].values())
+
+        store.checkpoint()
+        plan_dates = store.dates()
+        files = list(self._iter_files())
+        total = len(plan_dates) + len(files)
+        processed = 0
+        manifest = {'plans': {}, 'files': {}, 'new_objects': 0, 'new_bytes': 0}
+
+        def step():
+            nonlocal processed
+            processed += 1
+            if cancelled is not None and cancelled():
+                raise BackupCancelled()
+            if progress is not None and (processed % 100 == 0 or processed == total):
+                progress(processed, total)
+
+        for data in store.iter_plans():
+            payload = json.dumps(data, ensure_ascii=False, sort_keys=True).encode('utf-8')
+            digest, created = self._put(payload, known)
+            manifest['plans'][data['date']] = digest
+            if created:
+                manifest['new_objects'] += 1
+                manifest['new_bytes'] += len(payload)
+            step()
+
+        for rel_path in files:
+            try:
+                with open(os.path.join(self.data_dir, rel_path), 'rb') as f:
+                    payload = f.read()
+            except OSError as e:
+                print(f"备份文件失败 {rel_path}: {e}")
+                step()
+                continue
+            digest, created = self._put(payload, known)
+            manifest['files'][rel_path.replace(os.sep, '/')] = digest
+            if created:
+                manifest['new_objects'] += 1
+                manifest['new_bytes'] += len(payload)
+            step()
+
+        now = datetime.now()
+        snapshot_id = now.strftime('%Y%m%d_%H%M%S')
+        while os.path.exists(os.path.join(self.snapshots_dir, f"{snapshot_id}.json")):
+            snapshot_id += '_1'
+        manifest['id'] = snapshot_id
+        manifest['created'] = now.strftime('%Y-%m-%d %H:%M:%S')
+
+        atomic_write(os.path.join(self.snapshots_dir, f"{snapshot_id}.json"),
+                     json.dumps(manifest, ensure_ascii=False))
+        return manifest
+
+    @timed('backup.restore')
+    def restore_snapshot(self, snapshot_id, store, progress=None):
+        """把计划、模板和配置文件恢复到快照时的状态
+
+        快照之后新增的计划和模板会被删除，调用前应先创建一次快照以便回退。
+        """
+        manifest = self.load_manifest(snapshot_id)
+        total = len(manifest['plans']) + len(manifest['files'])
+        processed = 0
+
+        records = []
+        for plan_date, digest in manifest['plans'].items():
+            records.append(json.loads(self._get(digest).decode('utf-8')))
+            processed += 1
+            if len(records) >= 500:
+                store.save_many(records)
+                records = []
+                if progress is not None:
+                    progress(processed, total)
+        if records:
+            store.save_many(records)
+        for plan_date in store.dates():
+            if plan_date not in manifest['plans']:
+                store.delete(plan_date)
+
+        restored = set()
+        for rel_path, digest in manifest['files'].items():
+            target = os.path.join(self.data_dir, *rel_path.split('/'))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # 恢复中途失败时文件保持旧内容，不会留下写了一半的模板或配置
+            atomic_write(target, self._get(digest))
+            restored.add(os.path.normpath(target))
+            processed += 1
+            if progress is not None and processed % 100 == 0:
+                progress(processed, total)
+
+        # 模板目录按快照精确恢复
+        # 两边都规范化，数据目录是相对路径（如 ./data）时前缀才能匹配
+        template_root = os.path.normpath(os.path.join(self.data_dir, 'templates'))
+        for rel_path in self._iter_files():
+            full_path = os.path.normpath(os.path.join(self.data_dir, rel_path))
+            if full_path.startswith(template_root + os.sep) and full_path not in restored:
+                os.remove(full_path)
+
+        if progress is not None:
+            progress(total, total)
+        return manifest
+
+    @timed('backup.prune')
+    def prune(self, keep_last=30):
+        """只保留最近 keep_last 个快照，并删除不再被引用的对象，返回释放的字节数"""
+        snapshots = self.list_snapshots()
+        for snapshot_id in snapshots[keep_last:]:
+            os.remove(os.path.join(self.snapshots_dir, f"{snapshot_id}.json"))
+
+        referenced = set()
+        for snapshot_id in snapshots[:keep_last]:
+            manifest = self.load_manifest(snapshot_id)
+            referenced.update(manifest['plans'].values())
+            referenced.update(manifest['files'].values())
+
+        freed = 0
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                if prefix + name not in referenced:
+                    path = os.path.join(prefix_dir, name)
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+            if not os.listdir(prefix_dir):
+                os.rmdir(prefix_dir)
+        return freed
@@ -0,0 +1,271 @@
+
+# 标准库导入
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+# 本地模块导入
+from plan_store import open_store
+from planner_core import PlannerCore
+from report import build_summary
+from preview import MarkdownRenderer
+from bulk_io import import_plans, export_plans
+from template_engine import date_range
+
+# 合成数据用到的词汇，中英文混合
+CJK_WORDS = ['需求评审', '代码评审', '周报', '团队会议', '客户演示', '接口调试', '性能优化',
+             '数据分析', '文档整理', '单元测试', '版本发布', '学习笔记', '健身', '买菜', '读书']
+ASCII_WORDS = ['API', 'SQLite', 'release', 'bugfix', 'refactor', 'deploy', 'review',
+               'benchmark', 'cache', 'index', 'backup', 'sprint', 'roadmap', 'v2.0']
+
+# 比较结果时，耗时增加超过这个比例视为退化
+REGRESSION_THRESHOLD = 0.2
+
+
+def _phrase(rng, words=3):
+    return ' '.join(rng.choice(CJK_WORDS if rng.random() < 0.6 else ASCII_WORDS) for _ in range(words))
+
+
+def _plan_content(rng):
+    lines = [f"# {_phrase(rng, 2)}", '']
+    for _ in range(rng.randint(3, 12)):
+        mark = 'x' if rng.random() < 0.6 else ' '
+        estimate = f" ~{rng.choice([15, 30, 45, 60, 90])}m" if rng.random() < 0.3 else ''
+        lines.append(f"- [{mark}] {_phrase(rng, rng.randint(1, 4))}{estimate}")
+    if rng.random() < 0.3:
+        lines.extend(['', '```python', 'def task():', '    return "done"', '```'])
+    lines.extend(['', f"> {_phrase(rng, 6)}"])
+    return '\n'.join(lines)
+
+
+def generate_dataset(data_dir, years=10, tag_count=50, template_count=5000, seed=42):
+    """生成合成数据目录：每天一份计划、若干分类和模板，返回各类数据的数量"""
+    rng = random.Random(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    tags = [f"分类{i:02d}" if i % 2 else f"tag{i:02d}" for i in range(tag_count)]
+    with open(os.path.join(data_dir, 'tags.json'), 'w', encoding='utf-8') as f:
+        json.dump({'tags': tags}, f, ensure_ascii=False)
+
+    store = open_store(data_dir)
+    end = date.today()
+    start = end - timedelta(days=365 * years)
+    records, plans = [], 0
+    day = start
+    while day <= end:
+        records.append({
+            'date': day.strftime('%Y-%m-%d'),
+            'content': _plan_content(rng),
+            'tag': rng.choice(tags),
+            'done': rng.random() < 0.5,
+            'last_modified': f"{day.strftime('%Y-%m-%d')} 18:00:00",
+        })
+        if len(records) >= 500:
+            store.save_many(records)
+            plans += len(records)
+            records = []
+        day += timedelta(days=1)
+    store.save_many(records)
+    plans += len(records)
+    store.close()
+
+    template_dir = os.path.join(data_dir, 'templates')
+    for i in range(template_count):
+        category_dir = os.path.join(template_dir, rng.choice(tags))
+        os.makedirs(category_dir, exist_ok=True)
+        with open(os.path.join(category_dir, f"模板{i:05d}.md"), 'w', encoding='utf-8') as f:
+            f.write(_plan_content(rng))
+    return {'plans': plans, 'tags': tag_count, 'templates': template_count}
+
+
+def measure(fn, repeat=5):
+    """多次执行 fn 统计耗时，再单独执行一次记录内存峰值（tracemalloc 会拖慢执行，不计入耗时）"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    timings.sort()
+    return {
+        'min_ms': round(timings[0] * 1000, 3),
+        'median_ms': round(timings[len(timings) // 2] * 1000, 3),
+        'max_ms': round(timings[-1] * 1000, 3),
+        'peak_kb': peak // 1024,
+        'repeat': repeat,
+    }
+
+
+def run_benchmarks(dataset_dir, repeat=5, only=None):
+    """在数据集的副本上执行各项核心操作，返回 {名称: 统计}"""
+    work_dir = tempfile.mkdtemp(prefix='planner_bench_')
+    data_dir = os.path.join(work_dir, 'data')
+    shutil.copytree(dataset_dir, data_dir)
+    rng = random.Random(0)
+    results = {}
+
+    def bench(name, fn, times=repeat):
+        if only and not any(name.startswith(prefix) for prefix in only):
+            return
+        results[name] = measure(fn, times)
+        print(f"{name:<28} {results[name]['median_ms']:>10.2f} ms  {results[name]['peak_kb']:>8} KB")
+
+    try:
+        def startup():
+            PlannerCore(data_dir).close()
+        bench('startup', startup)
+
+        core = PlannerCore(data_dir)
+        dates = core.store.dates()
+        sample = [rng.choice(dates) for _ in range(200)]
+        last_year = (dates[-365], dates[-1])
+
+        bench('load_plan x200', lambda: [core.load_plan(plan_date) for plan_date in sample])
+
+        def save_plans():
+            for plan_date in sample[:50]:
+                data = core.load_plan(plan_date)
+                core.save_plan(dict(data, content=data['content'] + '\n- [ ] 追加事项',
+                                    last_modified=datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        bench('save_plan x50', save_plans)
+
+        bench('load_tags x1000', lambda: [core.tags() for _ in range(1000)])
+
+        bench('template_catalog.build', core.template_catalog.build, times=max(1, repeat // 2))
+        bench('template_catalog.refresh', core.template_catalog.refresh)
+        tags = core.tags()
+        bench('template_list x100', lambda: [
+            core.template_catalog.list(rng.choice(tags), rng.choice(['', '评审', 'api'])) for _ in range(100)])
+
+        bench('search.rebuild', core.rebuild_search_index, times=1)
+        queries = ['代码评审', 'release', '周报 API', '性能优化 cache', '不存在的词']
+        bench('search x5', lambda: [core.search(query) for query in queries])
+
+        bench('calendar.year', lambda: core.day_summaries(*last_year))
+        rule_texts = ['每天', '工作日', '每周1,3', '每月1,-1', 'FREQ=WEEKLY;INTERVAL=2;BYDAY=FR', '每年']
+        for i in range(60):
+            core.recurrence.add(f"例行{i:02d}", rule_texts[i % len(rule_texts)], dates[0])
+        bench('calendar.recurring_year', lambda: core.recurring_calendar(*last_year))
+
+        core.write_template('基准', '日报', "## {date} {weekday} 第{week_no}周\n- [ ] 站会\n- [ ] {项目:日常}\n{carried}\n")
+        quarter = date_range(*last_year, workdays_only=True)[-64:]
+        bench('template.apply_quarter_preview',
+              lambda: core.apply_template('基准', '日报', quarter, mode='replace', dry_run=True))
+        bench('template.apply_quarter', lambda: core.apply_template('基准', '日报', quarter, mode='append'),
+              times=max(1, repeat // 2))
+        bench('open_tasks.30d', lambda: core.open_tasks(30, today=dates[-1]))
+        bench('report.year', lambda: build_summary(core.store, *last_year).to_markdown())
+        bench('report.all_csv', lambda: core.export_report(os.path.join(work_dir, 'report.csv'), 'csv'),
+              times=max(1, repeat // 2))
+
+        jsonl_path = os.path.join(work_dir, 'plans.jsonl')
+        bench('bulk.export_jsonl', lambda: export_plans(core, jsonl_path), times=max(1, repeat // 2))
+        bench('bulk.import_dry_run', lambda: import_plans(core, jsonl_path, dry_run=True), times=1)
+
+        bench('backup.full', lambda: core.backup(), times=1)
+        bench('backup.incremental', lambda: core.backup(), times=max(1, repeat // 2))
+
+        try:
+            import markdown  # noqa: F401
+        except ImportError:
+            print("未安装 markdown，跳过预览测试")
+        else:
+            document = '\n\n'.join(core.load_plan(plan_date)['content'] for plan_date in dates[-120:])
+
+            def preview_cold():
+                MarkdownRenderer().render(document)
+            renderer = MarkdownRenderer()
+            # 分片渲染必须与整篇渲染的结果完全相同
+            if renderer.render(document) != renderer._render(document):
+                raise AssertionError("分片渲染的预览与整篇渲染不一致")
+            bench('preview.cold', preview_cold)
+            bench('preview.edit', lambda: renderer.render(document + f"\n\n- [ ] {rng.random()}"))
+        core.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def environment_info():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def compare_results(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """返回中位耗时比基线增加超过 threshold 的测试项 [(名称, 基线, 当前)]"""
+    regressions = []
+    for name, stats in current['results'].items():
+        base = baseline['results'].get(name)
+        if base and base['median_ms'] > 0 and stats['median_ms'] > base['median_ms'] * (1 + threshold):
+            regressions.append((name, base['median_ms'], stats['median_ms']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="每日计划管理器性能测试")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help="生成合成数据目录")
+    generate.add_argument('data_dir')
+    generate.add_argument('--years', type=int, default=10)
+    generate.add_argument('--tags', type=int, default=50)
+    generate.add_argument('--templates', type=int, default=5000)
+    generate.add_argument('--seed', type=int, default=42)
+
+    run = commands.add_parser('run', help="在数据目录的副本上运行性能测试")
+    run.add_argument('data_dir')
+    run.add_argument('-o', '--output', help="结果 JSON 文件")
+    run.add_argument('-r', '--repeat', type=int, default=5)
+    run.add_argument('-k', '--only', action='append', help="只运行名称以此开头的测试项")
+
+    compare = commands.add_parser('compare', help="和基线结果比较，发现退化时返回非零")
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+
+    args = parser.parse_args(argv)
+    if args.command == 'generate':
+        if os.path.exists(args.data_dir) and os.listdir(args.data_dir):
+            print(f"目录不为空: {args.data_dir}", file=sys.stderr)
+            return 1
+        counts = generate_dataset(args.data_dir, args.years, args.tags, args.templates, args.seed)
+        print(f"已生成 {counts['plans']} 天的计划、{counts['tags']} 个分类、{counts['templates']} 个模板")
+        return 0
+
+    if args.command == 'run':
+        output = {'environment': environment_info(), 'dataset': os.path.abspath(args.data_dir),
+                  'results': run_benchmarks(args.data_dir, args.repeat, args.only)}
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(output, f, ensure_ascii=False, indent=2)
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, 'r', encoding='utf-8') as f:
+        current = json.load(f)
+    regressions = compare_results(baseline, current, args.threshold)
+    for name, before, after in regressions:
+        print(f"{name}: {before:.2f} ms -> {after:.2f} ms")
+    if not regressions:
+        print("没有发现性能退化")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
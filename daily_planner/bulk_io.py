@@ -0,0 +1,329 @@
+
+# 标准库导入
+import os
+import csv
+import json
+import functools
+from collections import deque
+from datetime import datetime
+
+# 本地模块导入
+from planner_core import validate_date, now_str
+from autosave import plan_hash
+from perf import timed
+
+FORMATS = ('jsonl', 'csv', 'markdown')
+# 文件扩展名到格式；没有扩展名或是目录时按 Markdown 文件夹处理
+FORMAT_EXTENSIONS = {'.jsonl': 'jsonl', '.ndjson': 'jsonl', '.csv': 'csv'}
+CSV_FIELDS = ['date', 'tag', 'done', 'last_modified', 'content']
+
+# 每个事务写入的天数
+BATCH_SIZE = 500
+# 交给一个解析进程的记录数
+CHUNK_SIZE = 1000
+# 输入超过这个大小（或文件夹中超过这么多文件）时才启用进程池，小的输入在本进程解析更快
+PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+PARALLEL_MIN_FILES = 2000
+# 报告中最多列出的冲突日期和错误条数，其余只计数
+MAX_REPORTED = 200
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'x', 'done', '是', '已完成'}
+
+
+class TransferCancelled(Exception):
+    """批量导入或导出被取消"""
+
+
+def detect_format(path):
+    if os.path.isdir(path):
+        return 'markdown'
+    ext = os.path.splitext(path)[1].lower()
+    if ext in FORMAT_EXTENSIONS:
+        return FORMAT_EXTENSIONS[ext]
+    if not ext:
+        return 'markdown'
+    raise ValueError(f"无法识别的格式: {path}，请指定 jsonl、csv 或 markdown")
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in TRUE_VALUES
+
+
+def _normalize(raw):
+    """校验并规范化一条计划，日期用与保存计划相同的 strptime 检查"""
+    if not isinstance(raw, dict):
+        raise ValueError("记录不是对象")
+    try:
+        plan_date = validate_date(str(raw.get('date') or ''))
+    except ValueError:
+        raise ValueError(f"日期格式不正确: {raw.get('date')!r}")
+    last_modified = str(raw.get('last_modified') or '').strip() or None
+    if last_modified:
+        try:
+            datetime.strptime(last_modified, '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            raise ValueError(f"修改时间格式不正确: {last_modified!r}")
+    return {
+        'date': plan_date,
+        'content': str(raw.get('content') or ''),
+        'tag': str(raw.get('tag') or '').strip() or None,
+        'done': _parse_bool(raw.get('done')),
+        'last_modified': last_modified,
+    }
+
+
+def parse_markdown(text, fallback_date=None, fallback_modified=None):
+    """解析带可选头信息（--- 之间的 key: value 行）的 Markdown 计划"""
+    text = text.replace('\r\n', '\n')
+    raw = {'date': fallback_date, 'last_modified': fallback_modified}
+    if text.startswith('---\n'):
+        end = text.find('\n---\n', 3)
+        if end != -1:
+            for line in text[4:end].splitlines():
+                key, sep, value = line.partition(':')
+                if sep:
+                    raw[key.strip()] = value.strip()
+            text = text[end + 5:]
+    raw['content'] = text.strip('\n')
+    return raw
+
+
+def format_markdown(data):
+    return (f"---\ndate: {data['date']}\ntag: {data.get('tag') or ''}\n"
+            f"done: {'true' if data.get('done') else 'false'}\n"
+            f"last_modified: {data.get('last_modified') or ''}\n---\n{data.get('content', '')}\n")
+
+
+def _parse_item(fmt, payload):
+    if fmt == 'jsonl':
+        return json.loads(payload)
+    if fmt == 'csv':
+        return payload
+    with open(payload, 'r', encoding='utf-8-sig') as f:
+        text = f.read()
+    stem = os.path.splitext(os.path.basename(payload))[0]
+    modified = datetime.fromtimestamp(os.path.getmtime(payload)).strftime('%Y-%m-%d %H:%M:%S')
+    return parse_markdown(text, stem, modified)
+
+
+def _parse_chunk(fmt, items):
+    """解析一批原始记录，返回 (计划列表, [(位置, 错误信息)])；在解析进程中执行"""
+    records, errors = [], []
+    for where, payload in items:
+        try:
+            records.append(_normalize(_parse_item(fmt, payload)))
+        except (OSError, ValueError) as e:
+            errors.append((where, str(e)))
+    return records, errors
+
+
+def _iter_lines(path):
+    """逐行读取文本，同时产出已读取的字节数，用于汇报进度"""
+    position = 0
+    with open(path, 'rb') as f:
+        for number, line in enumerate(f, 1):
+            position += len(line)
+            text = line.decode('utf-8')
+            if number == 1:
+                text = text.lstrip('\ufeff')
+            yield number, text, position
+
+
+def _iter_items(path, fmt):
+    """按顺序产出 (位置描述, 原始记录, 进度)，不把整个文件读入内存
+
+    进度对文件是已读取的字节数，对文件夹是已读取的文件数。
+    """
+    if fmt == 'jsonl':
+        for number, line, position in _iter_lines(path):
+            if line.strip():
+                yield f"第 {number} 行", line, position
+    elif fmt == 'csv':
+        state = {'position': 0}
+
+        def lines():
+            for _, line, position in _iter_lines(path):
+                state['position'] = position
+                yield line
+        reader = csv.DictReader(lines())
+        missing = {'date', 'content'} - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"CSV 缺少列: {', '.join(sorted(missing))}")
+        for row in reader:
+            yield f"第 {reader.line_num} 行", row, state['position']
+    else:
+        count = 0
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith('.md'):
+                    count += 1
+                    full_path = os.path.join(root, name)
+                    yield os.path.relpath(full_path, path), full_path, count
+
+
+def _input_size(path, fmt):
+    if fmt != 'markdown':
+        return os.path.getsize(path)
+    return sum(len([name for name in files if name.lower().endswith('.md')])
+               for _, _, files in os.walk(path))
+
+
+def _chunks(items, size):
+    chunk, position = [], 0
+    for where, payload, position in items:
+        chunk.append((where, payload))
+        if len(chunk) >= size:
+            yield chunk, position
+            chunk = []
+    if chunk:
+        yield chunk, position
+
+
+def _parse_parallel(fmt, chunks, workers):
+    """解析各批记录并按输入顺序产出；同时提交的批数有上限，内存占用不随输入增长"""
+    parse = functools.partial(_parse_chunk, fmt)
+    if workers <= 1:
+        for chunk, position in chunks:
+            yield parse(chunk), position
+        return
+    # 进程池会导入 multiprocessing，只在真正并行解析时才导入，其他命令不必承担启动开销
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk, position in chunks:
+            pending.append((executor.submit(parse, chunk), position))
+            if len(pending) >= workers * 2:
+                future, done_position = pending.popleft()
+                yield future.result(), done_position
+        while pending:
+            future, done_position = pending.popleft()
+            yield future.result(), done_position
+
+
+def _report(result, key, value):
+    result[key + '_count'] += 1
+    if len(result[key]) < MAX_REPORTED:
+        result[key].append(value)
+
+
+@timed('bulk.import')
+def import_plans(core, path, fmt=None, dry_run=False, skip_existing=False, workers=None,
+                 progress=None, batch_size=BATCH_SIZE, cancelled=None):
+    """流式导入 JSONL、CSV 或 Markdown 文件夹中的计划，返回导入报告
+
+    已有计划的日期视为冲突，内容相同的不算冲突；skip_existing=True 时保留已有计划，否则覆盖。
+    dry_run=True 时只解析和检查冲突，不写入任何数据。不认识的分类会加入分类列表。
+    cancelled() 返回 True 时在下一批之前抛出 TransferCancelled，已写入的批次保留。
+    """
+    fmt = fmt or detect_format(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的格式: {fmt}")
+    total = _input_size(path, fmt)
+    if workers is None:
+        large = total >= (PARALLEL_MIN_FILES if fmt == 'markdown' else PARALLEL_MIN_BYTES)
+        workers = min(os.cpu_count() or 1, 8) if large else 1
+
+    result = {'format': fmt, 'dry_run': dry_run, 'read': 0, 'imported': 0, 'unchanged': 0,
+              'skipped': 0, 'conflicts': [], 'conflicts_count': 0, 'errors': [], 'errors_count': 0,
+              'new_tags': []}
+    tags = core.tags()
+    default_tag = tags[0]
+    tags_saved = True
+    batch = []
+
+    def write_batch():
+        nonlocal tags_saved
+        dates = [data['date'] for data in batch]
+        existing = set(core.store.dates(min(dates), max(dates)))
+        to_write = []
+        for data in batch:
+            if data['date'] in existing:
+                current = core.store.load(data['date'])
+                if current is not None and plan_hash(current) == plan_hash(data):
+                    result['unchanged'] += 1
+                    continue
+                _report(result, 'conflicts', data['date'])
+                if skip_existing:
+                    result['skipped'] += 1
+                    continue
+            to_write.append(data)
+        if not dry_run:
+            # 先登记新分类，再写入用到它们的计划
+            if not tags_saved:
+                core.tag_registry.save(tags)
+                tags_saved = True
+            core.save_plans(to_write)
+        result['imported'] += len(to_write)
+        batch.clear()
+
+    chunks = _chunks(_iter_items(path, fmt), CHUNK_SIZE)
+    for (records, errors), position in _parse_parallel(fmt, chunks, workers):
+        if cancelled is not None and cancelled():
+            raise TransferCancelled()
+        for where, message in errors:
+            _report(result, 'errors', f"{where}: {message}")
+        for data in records:
+            result['read'] += 1
+            if data['tag'] is None:
+                data['tag'] = default_tag
+            elif data['tag'] not in tags:
+                tags.append(data['tag'])
+                result['new_tags'].append(data['tag'])
+                tags_saved = False
+            if data['last_modified'] is None:
+                data['last_modified'] = now_str()
+            batch.append(data)
+            if len(batch) >= batch_size:
+                write_batch()
+        if progress is not None:
+            progress(position, total)
+    if batch:
+        write_batch()
+    return result
+
+
+@timed('bulk.export')
+def export_plans(core, path, fmt=None, start=None, end=None, tags=None, progress=None, cancelled=None):
+    """逐条导出计划为 JSONL、CSV 或 Markdown 文件夹（每天一个文件），返回导出的天数
+
+    cancelled() 返回 True 时抛出 TransferCancelled；导出到单个文件时删除写了一半的文件。
+    """
+    fmt = fmt or detect_format(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的格式: {fmt}")
+    count = 0
+    plans = core.iter_plans(start, end, tags)
+    if fmt == 'markdown':
+        os.makedirs(path, exist_ok=True)
+        for data in plans:
+            if cancelled is not None and cancelled():
+                raise TransferCancelled()
+            with open(os.path.join(path, f"{data['date']}.md"), 'w', encoding='utf-8') as f:
+                f.write(format_markdown(data))
+            count += 1
+            if progress is not None and count % 100 == 0:
+                progress(count, 0)
+        return count
+
+    try:
+        with open(path, 'w', encoding='utf-8-sig' if fmt == 'csv' else 'utf-8', newline='') as f:
+            writer = csv.DictWriter(f, CSV_FIELDS, extrasaction='ignore') if fmt == 'csv' else None
+            if writer is not None:
+                writer.writeheader()
+            for data in plans:
+                if cancelled is not None and cancelled():
+                    raise TransferCancelled()
+                if writer is not None:
+                    writer.writerow(dict(data, done='true' if data.get('done') else 'false'))
+                else:
+                    f.write(json.dumps(data, ensure_ascii=False) + '\n')
+                count += 1
+                if progress is not None and count % 100 == 0:
+                    progress(count, 0)
+    except TransferCancelled:
+        os.remove(path)
+        raise
+    return count
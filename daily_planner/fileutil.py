@@ -0,0 +1,38 @@
+
+# 标准库导入
+import os
+import tempfile
+
+
+def atomic_write(path, content, encoding='utf-8', fsync=True):
+    """原子写文件：先写同目录临时文件并 fsync，再改名覆盖
+
+    断电或崩溃时目标文件要么是旧内容，要么是完整的新内容。
+    content 可以是 str 或 bytes；fsync=False 时只保证不会出现写了一半的文件。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content.encode(encoding) if isinstance(content, str) else content)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if fsync:
+        _fsync_dir(directory)
+
+
+def _fsync_dir(directory):
+    # 改名操作需要同步目录项才算落盘，Windows 不支持打开目录，忽略即可
+    if os.name != 'posix':
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
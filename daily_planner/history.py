@@ -0,0 +1,213 @@
+
+# 标准库导入
+import os
+import json
+import zlib
+import difflib
+import sqlite3
+import threading
+from datetime import datetime
+
+# 本地模块导入
+from autosave import plan_hash
+from perf import timed
+
+# 与上一版本的修改时间相差不到这么多秒时合并为同一个版本，连续的自动保存不会各占一个版本
+COALESCE_SECONDS = 300
+
+KIND_FULL = 'full'
+KIND_DELTA = 'delta'
+
+
+def _lines(content):
+    return (content or '').splitlines(keepends=True)
+
+
+def make_delta(newer, older):
+    """由新内容还原旧内容所需的行级编辑 [[起始行, 结束行, 替换成的旧行], ...]"""
+    new_lines, old_lines = _lines(newer), _lines(older)
+    matcher = difflib.SequenceMatcher(None, new_lines, old_lines, autojunk=False)
+    return [[i1, i2, old_lines[j1:j2]]
+            for op, i1, i2, j1, j2 in matcher.get_opcodes() if op != 'equal']
+
+
+def apply_delta(newer, delta):
+    lines = _lines(newer)
+    # 从后往前替换，前面的行号不受影响
+    for i1, i2, replacement in reversed(delta):
+        lines[i1:i2] = replacement
+    return ''.join(lines)
+
+
+def _pack(value):
+    return zlib.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+
+
+def _unpack(blob):
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+def _seconds_between(earlier, later):
+    try:
+        return (datetime.strptime(later, '%Y-%m-%d %H:%M:%S')
+                - datetime.strptime(earlier, '%Y-%m-%d %H:%M:%S')).total_seconds()
+    except (TypeError, ValueError):
+        return None
+
+
+class PlanHistory:
+    """每天计划的修订历史，保存在数据目录下的 history.db
+
+    采用反向增量：最新版本存全文，更早的版本只存"由后一版本还原出它"的行级差异，
+    占用空间与实际修改的内容成正比。内容、分类和完成状态都没变的保存不产生新版本。
+    """
+
+    DB_NAME = 'history.db'
+
+    def __init__(self, data_dir):
+        self.db_path = os.path.join(data_dir, self.DB_NAME)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS revisions (
+                date TEXT NOT NULL,
+                rev INTEGER NOT NULL,
+                last_modified TEXT,
+                tag TEXT,
+                done INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                length INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                PRIMARY KEY (date, rev)
+            ) WITHOUT ROWID;
+        """)
+        self._conn.commit()
+
+    def _head(self, plan_date):
+        return self._conn.execute(
+            'SELECT rev, last_modified, hash, payload FROM revisions '
+            'WHERE date = ? ORDER BY rev DESC LIMIT 1', (plan_date,)).fetchone()
+
+    def has_history(self, plan_date):
+        with self._lock:
+            return self._head(plan_date) is not None
+
+    def dates_with_history(self, dates):
+        """dates 中已有历史版本的日期"""
+        dates = list(dates)
+        found = set()
+        with self._lock:
+            # SQLite 限制单条语句的参数个数，分批查询
+            for start in range(0, len(dates), 500):
+                chunk = dates[start:start + 500]
+                found.update(row[0] for row in self._conn.execute(
+                    f"SELECT DISTINCT date FROM revisions WHERE date IN ({','.join('?' * len(chunk))})", chunk))
+        return found
+
+    @timed('history.record')
+    def record(self, data, coalesce=True):
+        """记录一次保存，返回版本号；与最新版本相同时不记录，返回 None
+
+        coalesce=True 时，与最新版本的修改时间相差不到 COALESCE_SECONDS 秒则直接替换最新版本。
+        """
+        with self._lock, self._conn:
+            return self._record(data, coalesce)
+
+    @timed('history.record_many')
+    def record_many(self, records, coalesce=False):
+        """在一个事务中记录多天的保存，批量写入时使用"""
+        with self._lock, self._conn:
+            return [self._record(data, coalesce) for data in records]
+
+    def _record(self, data, coalesce):
+        plan_date = data['date']
+        content = data.get('content', '')
+        digest = plan_hash(data)
+        row_values = (data.get('last_modified'), data.get('tag'), bool(data.get('done')),
+                      digest, len(content), KIND_FULL, _pack(content))
+        head = self._head(plan_date)
+        if head is None:
+            self._conn.execute(
+                'INSERT INTO revisions VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?)', (plan_date,) + row_values)
+            return 1
+        head_rev, head_modified, head_hash, head_payload = head
+        if head_hash == digest:
+            return None
+        head_content = _unpack(head_payload)
+        elapsed = _seconds_between(head_modified, data.get('last_modified'))
+        if coalesce and head_rev > 1 and elapsed is not None and 0 <= elapsed < COALESCE_SECONDS:
+            # 替换最新版本：前一个版本原本相对最新版本存差异，需要改为相对新内容
+            previous = self._conn.execute(
+                'SELECT payload FROM revisions WHERE date = ? AND rev = ?',
+                (plan_date, head_rev - 1)).fetchone()
+            previous_content = apply_delta(head_content, _unpack(previous[0]))
+            self._conn.execute(
+                'UPDATE revisions SET payload = ? WHERE date = ? AND rev = ?',
+                (_pack(make_delta(content, previous_content)), plan_date, head_rev - 1))
+            self._conn.execute(
+                'UPDATE revisions SET last_modified = ?, tag = ?, done = ?, hash = ?, length = ?, '
+                'kind = ?, payload = ? WHERE date = ? AND rev = ?', row_values + (plan_date, head_rev))
+            return head_rev
+        self._conn.execute(
+            'UPDATE revisions SET kind = ?, payload = ? WHERE date = ? AND rev = ?',
+            (KIND_DELTA, _pack(make_delta(content, head_content)), plan_date, head_rev))
+        self._conn.execute(
+            'INSERT INTO revisions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (plan_date, head_rev + 1) + row_values)
+        return head_rev + 1
+
+    def revisions(self, plan_date):
+        """某天的全部版本，最新的在前：[{'rev', 'last_modified', 'tag', 'done', 'length'}]"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT rev, last_modified, tag, done, length FROM revisions '
+                'WHERE date = ? ORDER BY rev DESC', (plan_date,)).fetchall()
+        return [{'rev': rev, 'last_modified': last_modified, 'tag': tag, 'done': bool(done), 'length': length}
+                for rev, last_modified, tag, done, length in rows]
+
+    @timed('history.load')
+    def load(self, plan_date, rev):
+        """还原某个版本的计划，版本不存在时返回 None"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT rev, last_modified, tag, done, kind, payload FROM revisions '
+                'WHERE date = ? AND rev >= ? ORDER BY rev DESC', (plan_date, rev)).fetchall()
+        if not rows or rows[-1][0] != rev:
+            return None
+        content = None
+        # 从最新的全文开始，逐个应用反向差异直到目标版本
+        for _, last_modified, tag, done, kind, payload in rows:
+            value = _unpack(payload)
+            content = value if kind == KIND_FULL else apply_delta(content, value)
+        return {'date': plan_date, 'content': content, 'tag': tag, 'done': bool(done),
+                'last_modified': last_modified}
+
+    def diff(self, plan_date, old_rev, new_rev):
+        """两个版本之间的统一格式差异，返回文本行列表"""
+        old, new = self.load(plan_date, old_rev), self.load(plan_date, new_rev)
+        if old is None or new is None:
+            raise ValueError(f"{plan_date} 没有版本 {old_rev if old is None else new_rev}")
+        lines = []
+        for field, label in (('tag', '分类'), ('done', '已完成')):
+            if old[field] != new[field]:
+                lines.append(f"{label}: {old[field]} -> {new[field]}\n")
+        for line in difflib.unified_diff(
+                _lines(old['content']), _lines(new['content']),
+                fromfile=f"版本 {old_rev} ({old['last_modified']})",
+                tofile=f"版本 {new_rev} ({new['last_modified']})"):
+            # 最后一行可能没有换行符
+            lines.append(line if line.endswith('\n') else line + '\n')
+        return lines
+
+    def size(self):
+        """历史数据占用的字节数（压缩后）"""
+        with self._lock:
+            row = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM revisions').fetchone()
+        return {'revisions': row[0], 'bytes': row[1]}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
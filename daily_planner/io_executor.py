@@ -0,0 +1,141 @@
+
+# 标准库导入
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 本地模块导入
+from perf import registry
+
+
+class TaskCancelled(Exception):
+    """任务在执行过程中被取消"""
+
+
+class IOTask:
+    """提交到后台的一项任务，工作函数通过它汇报进度和检查取消"""
+
+    def __init__(self, name, cancellable):
+        self.name = name
+        self.cancellable = cancellable
+        self.done = 0
+        self.total = 0
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        if self.cancellable:
+            self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        """在工作函数的循环中调用，已取消时抛出 TaskCancelled"""
+        if self._cancel_event.is_set():
+            raise TaskCancelled()
+
+    def progress(self, done, total):
+        # 只写两个整数，界面线程轮询读取，无需加锁
+        self.done, self.total = done, total
+
+
+class TkIOExecutor:
+    """把磁盘操作放到后台线程，结果通过队列交回 Tk 主线程
+
+    serial=True 的任务在同一个线程里按提交顺序执行，用于计划的读写，
+    保证"先保存再加载"之类的操作不会乱序；其余任务并行执行。
+    回调（on_done、on_error）总是在主线程中调用，可以直接操作界面。
+    """
+
+    # 主线程每次轮询时处理回调的时间上限（秒），保证界面一帧内能响应
+    FRAME_BUDGET = 0.008
+    POLL_MS = 16
+
+    def __init__(self, root, max_workers=4):
+        self.root = root
+        self._serial = ThreadPoolExecutor(max_workers=1, thread_name_prefix='planner-io-serial')
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='planner-io')
+        self._results = queue.Queue()
+        self._active = []
+        self._listeners = []
+        self._polling = False
+
+    def submit(self, work, on_done=None, on_error=None, name='', serial=False, cancellable=False):
+        """提交任务，work(task) 在后台线程执行，返回 IOTask"""
+        task = IOTask(name, cancellable)
+        self._active.append(task)
+        submitted = time.perf_counter()
+
+        def run():
+            # 统计排队时间和执行时间，用于区分"线程池忙"和"操作本身慢"
+            started = time.perf_counter()
+            try:
+                result = work(task)
+            except BaseException as e:
+                self._results.put((task, None, e, on_done, on_error))
+            else:
+                self._results.put((task, result, None, on_done, on_error))
+            if registry.enabled:
+                lane = 'serial' if serial else 'pool'
+                registry.record(f'io.{lane}.wait', started - submitted, task.name)
+                registry.record(f'io.{lane}.run', time.perf_counter() - started, task.name)
+
+        (self._serial if serial else self._pool).submit(run)
+        self._notify()
+        self._schedule_poll()
+        return task
+
+    def active_tasks(self):
+        return list(self._active)
+
+    def add_listener(self, callback):
+        """注册任务列表变化或进度刷新时的回调，用于更新忙碌指示"""
+        self._listeners.append(callback)
+
+    def _notify(self):
+        for callback in self._listeners:
+            callback(self.active_tasks())
+
+    def _schedule_poll(self):
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.POLL_MS, self._poll)
+
+    def _poll(self):
+        deadline = time.perf_counter() + self.FRAME_BUDGET
+        while time.perf_counter() < deadline:
+            try:
+                task, result, error, on_done, on_error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._active.remove(task)
+            started = time.perf_counter()
+            try:
+                if error is None:
+                    if on_done is not None:
+                        on_done(result)
+                elif isinstance(error, TaskCancelled):
+                    pass
+                elif on_error is not None:
+                    on_error(error)
+                else:
+                    print(f"后台任务 {task.name} 失败: {error}")
+            except Exception as e:
+                print(f"后台任务 {task.name} 的回调失败: {e}")
+            if registry.enabled:
+                registry.record('ui.callback', time.perf_counter() - started, task.name)
+
+        self._notify()
+        if self._active or not self._results.empty():
+            self.root.after(self.POLL_MS, self._poll)
+        else:
+            self._polling = False
+
+    def shutdown(self):
+        """取消所有可取消的任务；串行通道中排队的保存操作会执行完再返回"""
+        for task in self._active:
+            task.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._serial.shutdown(wait=True)
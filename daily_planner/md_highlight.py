@@ -0,0 +1,201 @@
+
+# 标准库导入
+import re
+import tkinter as tk
+import tkinter.font as tkfont
+
+# 本地模块导入
+from tasks import TASK_PATTERN, TAG_PATTERN, ESTIMATE_PATTERN
+from perf import span
+
+FENCE_PATTERN = re.compile(r'^\s*(```|~~~)')
+HEADING_PATTERN = re.compile(r'^(#{1,6})\s')
+QUOTE_PATTERN = re.compile(r'^\s*>')
+BULLET_PATTERN = re.compile(r'^(\s*)([-*+]|\d+\.)\s')
+INLINE_CODE_PATTERN = re.compile(r'`[^`]+`')
+BOLD_PATTERN = re.compile(r'\*\*[^*]+\*\*')
+
+# 停止输入或滚动这么多毫秒后才重新着色
+DEBOUNCE_MS = 60
+
+# 标签名和样式；着色时只移除这些标签，不影响选区等其他标签。
+# 字体中的 None 在运行时换成编辑器当前的字体族
+TAG_STYLES = {
+    'md_h1': {'font': (None, 14, 'bold'), 'foreground': '#1A237E'},
+    'md_h2': {'font': (None, 12, 'bold'), 'foreground': '#283593'},
+    'md_h3': {'font': (None, 10, 'bold'), 'foreground': '#3949AB'},
+    'md_fence': {'foreground': '#9E9E9E', 'background': '#F5F5F5'},
+    'md_code': {'font': ('Consolas', 10), 'background': '#F5F5F5'},
+    'md_inline_code': {'font': ('Consolas', 10), 'background': '#EEEEEE', 'foreground': '#C2185B'},
+    'md_quote': {'foreground': '#757575'},
+    'md_bullet': {'foreground': '#1565C0'},
+    'md_checkbox': {'foreground': '#1565C0'},
+    'md_done': {'foreground': '#9E9E9E', 'overstrike': True},
+    'md_carried': {'foreground': '#9E9E9E'},
+    'md_bold': {'font': (None, 10, 'bold')},
+    'md_tag': {'foreground': '#6A1B9A'},
+    'md_estimate': {'foreground': '#EF6C00'},
+}
+
+# 点击复选框时的切换规则；已顺延的任务 [>] 不切换
+CHECKBOX_TOGGLE = {' ': 'x', 'x': ' ', 'X': ' '}
+
+
+def fence_after(line, in_fence):
+    """一行之后是否处于代码块中"""
+    return not in_fence if FENCE_PATTERN.match(line) else in_fence
+
+
+def tokenize_line(line, in_fence):
+    """一行的着色区间 [(起始列, 结束列, 标签)]，以及这一行之后是否处于代码块中
+
+    代码块的开闭状态是唯一需要跨行传递的状态，其余规则只看当前行。
+    """
+    if FENCE_PATTERN.match(line):
+        return [(0, len(line), 'md_fence')], not in_fence
+    if in_fence:
+        return [(0, len(line), 'md_code')], True
+
+    spans = []
+    heading = HEADING_PATTERN.match(line)
+    if heading:
+        spans.append((0, len(line), f"md_h{min(len(heading.group(1)), 3)}"))
+    elif QUOTE_PATTERN.match(line):
+        spans.append((0, len(line), 'md_quote'))
+    else:
+        task = TASK_PATTERN.match(line)
+        if task:
+            box_start = len(task.group(1)) - 1
+            spans.append((box_start, box_start + 3, 'md_checkbox'))
+            if task.group(2) in 'xX':
+                spans.append((task.start(4), task.end(4), 'md_done'))
+            elif task.group(2) == '>':
+                spans.append((task.start(4), task.end(4), 'md_carried'))
+        else:
+            bullet = BULLET_PATTERN.match(line)
+            if bullet:
+                spans.append((bullet.start(2), bullet.end(2), 'md_bullet'))
+
+    for pattern, tag in ((INLINE_CODE_PATTERN, 'md_inline_code'), (BOLD_PATTERN, 'md_bold'),
+                         (TAG_PATTERN, 'md_tag'), (ESTIMATE_PATTERN, 'md_estimate')):
+        spans.extend((match.start(), match.end(), tag) for match in pattern.finditer(line))
+    return spans, False
+
+
+class MarkdownHighlighter:
+    """编辑器内的 Markdown 着色
+
+    拦截 Text 的 insert/delete 得知改动从哪一行开始，停止输入 DEBOUNCE_MS 毫秒后
+    只重新着色可见区域的几十行，耗时与文档长度无关。各行开头是否处于代码块中缓存在
+    列表里，改动只让该行之后的缓存失效；滚动到尚未计算的位置时只做一次廉价的代码块扫描。
+    不可见区域的旧标签随文本一起移动，滚动进可见区域时重新着色。
+    """
+
+    def __init__(self, text, debounce_ms=DEBOUNCE_MS):
+        self.text = text
+        self.debounce_ms = debounce_ms
+        # _states[i] 为第 i + 1 行开头是否处于代码块中
+        self._states = [False]
+        self._after_id = None
+        self._painted = None
+
+        family = tkfont.Font(root=text, font=text.cget('font')).actual('family')
+        for tag, style in TAG_STYLES.items():
+            if style.get('font') and style['font'][0] is None:
+                style = dict(style, font=(family,) + style['font'][1:])
+            text.tag_configure(tag, **style)
+        text.tag_raise('sel')
+        text.tag_bind('md_checkbox', '<Button-1>', self._on_checkbox_click)
+        text.tag_bind('md_checkbox', '<Enter>', lambda event: text.config(cursor='hand2'))
+        text.tag_bind('md_checkbox', '<Leave>', lambda event: text.config(cursor='xterm'))
+
+        # 把控件命令改名，换成自己的命令转发，从而看到所有修改（包括粘贴和程序写入）
+        self._orig = text._w + '_orig'
+        text.tk.call('rename', text._w, self._orig)
+        text.tk.createcommand(text._w, self._dispatch)
+        # 视图变化（滚动、改变大小、内容变化）时 Tk 会调用 yscrollcommand
+        self._yscroll = text.cget('yscrollcommand')
+        text.configure(yscrollcommand=self._on_view_changed)
+
+    def _dispatch(self, operation, *args):
+        if operation in ('insert', 'delete', 'replace') and args:
+            try:
+                line = int(self.text.tk.call(self._orig, 'index', args[0]).split('.')[0])
+            except tk.TclError:
+                line = 1
+            self._invalidate(line)
+        try:
+            return self.text.tk.call((self._orig, operation) + args)
+        except tk.TclError:
+            return ''
+
+    def _invalidate(self, line):
+        """第 line 行被修改：之后各行的代码块状态都可能变化"""
+        del self._states[line:]
+        self._painted = None
+        self.schedule()
+
+    def _on_view_changed(self, first, last):
+        if self._yscroll:
+            self.text.tk.call(*(self.text.tk.splitlist(self._yscroll) + (first, last)))
+        if self._painted != self._viewport():
+            self.schedule()
+
+    def schedule(self):
+        if self._after_id is not None:
+            self.text.after_cancel(self._after_id)
+        self._after_id = self.text.after(self.debounce_ms, self.refresh)
+
+    def _viewport(self):
+        top = int(self.text.index('@0,0').split('.')[0])
+        bottom = int(self.text.index(f"@0,{self.text.winfo_height()}").split('.')[0])
+        return top, bottom
+
+    def _state_at(self, line):
+        """第 line 行开头是否处于代码块中，缺少的缓存从已知的最后一行往下补"""
+        known = len(self._states)
+        if line > known:
+            in_fence = self._states[-1]
+            for text_line in self.text.get(f"{known}.0", f"{line - 1}.end").split('\n'):
+                in_fence = fence_after(text_line, in_fence)
+                self._states.append(in_fence)
+        return self._states[line - 1]
+
+    def refresh(self):
+        """重新着色可见区域"""
+        self._after_id = None
+        if not self.text.winfo_exists():
+            return
+        with span('editor.highlight'):
+            top, bottom = self._viewport()
+            self.highlight_lines(top, bottom)
+            self._painted = (top, bottom)
+
+    def highlight_lines(self, first, last):
+        in_fence = self._state_at(first)
+        for tag in TAG_STYLES:
+            self.text.tag_remove(tag, f"{first}.0", f"{last}.end")
+        for number, line in enumerate(self.text.get(f"{first}.0", f"{last}.end").split('\n'), first):
+            spans, in_fence = tokenize_line(line, in_fence)
+            if len(self._states) == number:
+                self._states.append(in_fence)
+            for start, end, tag in spans:
+                self.text.tag_add(tag, f"{number}.{start}", f"{number}.{end}")
+
+    def _on_checkbox_click(self, event):
+        """点击 [ ] / [x] 时原地切换完成状态"""
+        line = self.text.index(f"@{event.x},{event.y}").split('.')[0]
+        match = TASK_PATTERN.match(self.text.get(f"{line}.0", f"{line}.end"))
+        if match and match.group(2) in CHECKBOX_TOGGLE:
+            column = len(match.group(1))
+            self.text.delete(f"{line}.{column}")
+            self.text.insert(f"{line}.{column}", CHECKBOX_TOGGLE[match.group(2)])
+        return 'break'
+
+    def close(self):
+        """恢复控件原来的命令"""
+        if self._after_id is not None:
+            self.text.after_cancel(self._after_id)
+            self._after_id = None
+        self.text.tk.deletecommand(self.text._w)
+        self.text.tk.call('rename', self._orig, self.text._w)
@@ -0,0 +1,167 @@
+
+# 标准库导入
+import os
+import json
+import time
+import heapq
+import bisect
+import threading
+import functools
+from contextlib import nullcontext
+from datetime import datetime
+
+# 设置 DAILY_PLANNER_PERF=1 时启动即开启统计，也可以在诊断窗口中随时开关
+ENV_VAR = 'DAILY_PLANNER_PERF'
+
+# 直方图的桶上界（毫秒），最后一个桶收集所有更慢的调用
+BUCKET_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# 每次会话保留的最慢调用数量
+SLOWEST_KEEP = 50
+
+
+class Histogram:
+    """一个操作的调用次数、总耗时、最大耗时和按对数分桶的耗时分布"""
+
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+
+    def add(self, ms):
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+
+    def percentile(self, fraction):
+        """按桶上界估算分位数，落在最后一个桶时返回最大值"""
+        if not self.count:
+            return 0.0
+        threshold = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= threshold:
+                return min(BUCKET_BOUNDS_MS[index], self.max) if index < len(BUCKET_BOUNDS_MS) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': round(self.total, 3),
+            'mean_ms': round(self.total / self.count, 3) if self.count else 0.0,
+            'p50_ms': round(self.percentile(0.5), 3),
+            'p95_ms': round(self.percentile(0.95), 3),
+            'max_ms': round(self.max, 3),
+            'buckets': dict(zip([f"<={bound}" for bound in BUCKET_BOUNDS_MS] + ['>5000'], self.buckets)),
+        }
+
+
+class PerfRegistry:
+    """进程内的性能统计，线程安全"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._slowest = []
+        self._seq = 0
+        self.started = datetime.now()
+
+    def record(self, name, seconds, detail=None):
+        ms = seconds * 1000
+        with self._lock:
+            histogram = self._stats.get(name)
+            if histogram is None:
+                histogram = self._stats[name] = Histogram()
+            histogram.add(ms)
+            # 小顶堆只保留最慢的若干次调用
+            self._seq += 1
+            entry = (ms, self._seq, name, detail, datetime.now().strftime('%H:%M:%S'))
+            if len(self._slowest) < SLOWEST_KEEP:
+                heapq.heappush(self._slowest, entry)
+            elif ms > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._slowest = []
+            self.started = datetime.now()
+
+    def snapshot(self):
+        """当前统计的副本：按总耗时排序的操作列表和最慢的调用"""
+        with self._lock:
+            operations = sorted(
+                ((name, histogram.to_dict()) for name, histogram in self._stats.items()),
+                key=lambda item: item[1]['total_ms'], reverse=True)
+            slowest = sorted(self._slowest, reverse=True)
+        return {
+            'enabled': self.enabled,
+            'started': self.started.strftime('%Y-%m-%d %H:%M:%S'),
+            'operations': [dict(stats, name=name) for name, stats in operations],
+            'slowest': [{'name': name, 'ms': round(ms, 3), 'detail': detail, 'at': at}
+                        for ms, _, name, detail, at in slowest],
+        }
+
+    def dump_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+
+
+registry = PerfRegistry(os.environ.get(ENV_VAR, '').lower() in ('1', 'true', 'yes', 'on'))
+
+
+class _Span:
+    __slots__ = ('name', 'detail', 'started')
+
+    def __init__(self, name, detail):
+        self.name = name
+        self.detail = detail
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        registry.record(self.name, time.perf_counter() - self.started, self.detail)
+        return False
+
+
+_NULL_SPAN = nullcontext()
+
+
+def span(name, detail=None):
+    """计时上下文管理器；统计关闭时返回共享的空上下文，几乎没有开销"""
+    if not registry.enabled:
+        return _NULL_SPAN
+    return _Span(name, detail)
+
+
+def timed(name):
+    """计时装饰器；统计关闭时只多一次属性判断"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                registry.record(name, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def set_enabled(enabled):
+    registry.enabled = bool(enabled)
+
+
+def is_enabled():
+    return registry.enabled
@@ -0,0 +1,436 @@
+
+# 标准库导入
+import os
+import re
+import json
+import shutil
+import sqlite3
+import threading
+from datetime import datetime
+
+# 本地模块导入
+from fileutil import atomic_write
+from autosave import plan_hash
+from report import parse_items
+from tasks import parse_tasks
+from perf import timed, span
+
+# 按日期命名的旧版计划文件，例如 2025-04-09.json
+PLAN_FILE_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2})\.json$')
+
+
+def summarize_plan(data):
+    """计划的每日摘要：分类、完成状态、事项数、已完成事项数、修改时间和内容哈希"""
+    items = done_items = 0
+    for done, text in parse_items(data.get('content', '')):
+        items += 1
+        done_items += done
+    return {
+        'date': data['date'],
+        'tag': data.get('tag'),
+        'done': bool(data.get('done')),
+        'items': items,
+        'done_items': done_items,
+        'last_modified': data.get('last_modified'),
+        'hash': plan_hash(data),
+    }
+
+
+class PlanStore:
+    """计划存储后端基类，所有日期均为 YYYY-MM-DD 字符串"""
+
+    def load(self, plan_date):
+        """读取某天的计划，不存在时返回 None"""
+        raise NotImplementedError
+
+    def save(self, data):
+        """保存一天的计划，data 中必须包含 date 字段"""
+        self.save_many([data])
+
+    def save_many(self, records):
+        """批量保存多天的计划"""
+        raise NotImplementedError
+
+    def delete(self, plan_date):
+        """删除某天的计划"""
+        raise NotImplementedError
+
+    def delete_many(self, plan_dates):
+        """批量删除多天的计划"""
+        for plan_date in plan_dates:
+            self.delete(plan_date)
+
+    def vacuum(self):
+        """回收删除后留下的空间"""
+
+    def exists(self, plan_date):
+        """判断某天是否有计划"""
+        return self.load(plan_date) is not None
+
+    def dates(self, start=None, end=None):
+        """按日期升序返回区间内（含两端）有计划的日期"""
+        raise NotImplementedError
+
+    def iter_plans(self, start=None, end=None, tags=None):
+        """按日期升序逐条产出区间内的计划，tags 不为空时只产出这些分类"""
+        for plan_date in self.dates(start, end):
+            data = self.load(plan_date)
+            if data is not None and (not tags or data.get('tag') in tags):
+                yield data
+
+    def day_summaries(self, start=None, end=None):
+        """返回区间内每天的摘要 {日期: summarize_plan 的结果}，用于日历总览"""
+        return {data['date']: summarize_plan(data) for data in self.iter_plans(start, end)}
+
+    def query_tasks(self, start=None, end=None, state=None, tags=None):
+        """按日期和行号顺序返回区间内的任务，state 和 tags 用于筛选"""
+        return [
+            task
+            for data in self.iter_plans(start, end)
+            for task in parse_tasks(data)
+            if (state is None or task['state'] == state) and (not tags or task['tag'] in tags)
+        ]
+
+    def checkpoint(self):
+        """把缓冲中的写入落盘，备份前调用"""
+
+    def close(self):
+        """释放后端占用的资源"""
+
+
+class JsonDirStore(PlanStore):
+    """旧版存储：每天一个 JSON 文件"""
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+
+    def get_plan_file(self, plan_date):
+        return os.path.join(self.data_dir, f"{plan_date}.json")
+
+    @timed('store.load')
+    def load(self, plan_date):
+        file_path = self.get_plan_file(plan_date)
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @timed('store.save_many')
+    def save_many(self, records):
+        for data in records:
+            atomic_write(self.get_plan_file(data['date']),
+                         json.dumps(data, ensure_ascii=False, indent=2))
+
+    @timed('store.delete')
+    def delete(self, plan_date):
+        file_path = self.get_plan_file(plan_date)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+    def exists(self, plan_date):
+        return os.path.exists(self.get_plan_file(plan_date))
+
+    @timed('store.dates')
+    def dates(self, start=None, end=None):
+        result = []
+        for name in os.listdir(self.data_dir):
+            match = PLAN_FILE_PATTERN.match(name)
+            if not match:
+                continue
+            plan_date = match.group(1)
+            if (start and plan_date < start) or (end and plan_date > end):
+                continue
+            result.append(plan_date)
+        return sorted(result)
+
+
+class SQLiteStore(PlanStore):
+    """默认存储：单个 SQLite 文件，按日期主键索引"""
+
+    DB_NAME = 'plans.db'
+    # 表结构版本，保存在 PRAGMA user_version 中
+    SCHEMA_VERSION = 3
+
+    def __init__(self, data_dir, read_only=False):
+        self.data_dir = data_dir
+        self.db_path = os.path.join(data_dir, self.DB_NAME)
+        self.read_only = read_only
+        # 提醒线程也会读取计划，连接需要跨线程共享
+        self._lock = threading.RLock()
+        if read_only:
+            # 浏览他人的数据时只读打开，不建表、不升级，也不改日志模式
+            from urllib.parse import quote
+            path = os.path.abspath(self.db_path).replace(os.sep, '/')
+            uri = 'file:' + quote(path if path.startswith('/') else '/' + path) + '?mode=ro'
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self._derived = self._conn.execute('PRAGMA user_version').fetchone()[0] >= self.SCHEMA_VERSION
+            return
+        self._derived = True
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS plans (
+                date TEXT PRIMARY KEY,
+                tag TEXT,
+                done INTEGER NOT NULL DEFAULT 0,
+                last_modified TEXT,
+                data TEXT NOT NULL
+            )
+        """)
+        # 每日摘要随计划一起写入，日历总览只读这张小表，不必解析计划内容
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS day_summary (
+                date TEXT PRIMARY KEY,
+                tag TEXT,
+                done INTEGER NOT NULL DEFAULT 0,
+                items INTEGER NOT NULL DEFAULT 0,
+                done_items INTEGER NOT NULL DEFAULT 0,
+                last_modified TEXT,
+                hash TEXT
+            )
+        """)
+        columns = [row[1] for row in self._conn.execute('PRAGMA table_info(day_summary)')]
+        if 'hash' not in columns:
+            # 版本 3 在摘要中加入内容哈希，旧表补上这一列，下面重建时填入
+            self._conn.execute('ALTER TABLE day_summary ADD COLUMN hash TEXT')
+        # 计划中的复选框任务，同样随计划一起写入，按状态和日期建索引
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                date TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                state TEXT NOT NULL,
+                tag TEXT,
+                estimate INTEGER,
+                carried_from TEXT,
+                PRIMARY KEY (date, position)
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS tasks_state_date ON tasks (state, date)')
+        self._conn.commit()
+        if self._conn.execute('PRAGMA user_version').fetchone()[0] < self.SCHEMA_VERSION:
+            self.rebuild_derived()
+
+    def rebuild_derived(self):
+        """根据计划内容重建摘要表和任务表"""
+        with self._lock:
+            records = []
+            with self._conn:
+                self._conn.execute('DELETE FROM day_summary')
+                self._conn.execute('DELETE FROM tasks')
+                for data in self.iter_plans():
+                    records.append(data)
+                    if len(records) >= 500:
+                        self._write_derived(records)
+                        records = []
+                self._write_derived(records)
+                self._conn.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+
+    def _write_derived(self, records):
+        """更新计划对应的摘要和任务行，在写计划的同一事务中调用"""
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO day_summary (date, tag, done, items, done_items, last_modified, hash) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)', [self._summary_row(data) for data in records])
+        self._conn.executemany('DELETE FROM tasks WHERE date = ?', [(data['date'],) for data in records])
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO tasks (date, position, text, state, tag, estimate, carried_from) '
+            'VALUES (:date, :position, :text, :state, :tag, :estimate, :carried_from)',
+            [task for data in records for task in parse_tasks(data)])
+
+    @staticmethod
+    def _summary_row(data):
+        summary = summarize_plan(data)
+        return (summary['date'], summary['tag'], int(summary['done']), summary['items'],
+                summary['done_items'], summary['last_modified'], summary['hash'])
+
+    @timed('store.load')
+    def load(self, plan_date):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data FROM plans WHERE date = ?', (plan_date,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @timed('store.save_many')
+    def save_many(self, records):
+        rows = [
+            (data['date'], data.get('tag'), int(bool(data.get('done'))),
+             data.get('last_modified'), json.dumps(data, ensure_ascii=False))
+            for data in records
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO plans (date, tag, done, last_modified, data) '
+                'VALUES (?, ?, ?, ?, ?)', rows)
+            self._write_derived(records)
+
+    @timed('store.delete')
+    def delete(self, plan_date):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM plans WHERE date = ?', (plan_date,))
+            self._conn.execute('DELETE FROM day_summary WHERE date = ?', (plan_date,))
+            self._conn.execute('DELETE FROM tasks WHERE date = ?', (plan_date,))
+
+    @timed('store.delete_many')
+    def delete_many(self, plan_dates):
+        rows = [(plan_date,) for plan_date in plan_dates]
+        with self._lock, self._conn:
+            for table in ('plans', 'day_summary', 'tasks'):
+                self._conn.executemany(f'DELETE FROM {table} WHERE date = ?', rows)
+
+    def vacuum(self):
+        with self._lock:
+            self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self._conn.execute('VACUUM')
+            # WAL 模式下 VACUUM 的结果先写进 WAL，再截断一次才真正释放空间
+            self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def exists(self, plan_date):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM plans WHERE date = ?', (plan_date,)).fetchone()
+        return row is not None
+
+    def _range_clause(self, start, end, tags=None):
+        clauses, params = [], []
+        if tags:
+            clauses.append(f"tag IN ({','.join('?' * len(tags))})")
+            params.extend(tags)
+        if start:
+            clauses.append('date >= ?')
+            params.append(start)
+        if end:
+            clauses.append('date <= ?')
+            params.append(end)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        return where, params
+
+    @timed('store.dates')
+    def dates(self, start=None, end=None):
+        where, params = self._range_clause(start, end)
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT date FROM plans{where} ORDER BY date', params).fetchall()
+        return [row[0] for row in rows]
+
+    def iter_plans(self, start=None, end=None, tags=None, batch_size=500):
+        # 分批按主键续读，避免一次性把整个区间读入内存，也不长时间占用锁
+        where, params = self._range_clause(start, end, tags)
+        last_date = None
+        while True:
+            if last_date is None:
+                query, query_params = where, list(params)
+            else:
+                query = f"{where} AND date > ?" if where else ' WHERE date > ?'
+                query_params = list(params) + [last_date]
+            with span('store.iter_batch'), self._lock:
+                rows = self._conn.execute(
+                    f'SELECT date, data FROM plans{query} ORDER BY date LIMIT ?',
+                    query_params + [batch_size]).fetchall()
+            if not rows:
+                return
+            for plan_date, data in rows:
+                yield json.loads(data)
+            last_date = rows[-1][0]
+
+    @timed('store.day_summaries')
+    def day_summaries(self, start=None, end=None):
+        if not self._derived:
+            # 只读打开的旧版数据库没有摘要表，退回逐条解析
+            return PlanStore.day_summaries(self, start, end)
+        where, params = self._range_clause(start, end)
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT date, tag, done, items, done_items, last_modified, hash '
+                f'FROM day_summary{where} ORDER BY date', params).fetchall()
+        return {
+            row[0]: {'date': row[0], 'tag': row[1], 'done': bool(row[2]), 'items': row[3],
+                     'done_items': row[4], 'last_modified': row[5], 'hash': row[6]}
+            for row in rows
+        }
+
+    @timed('store.query_tasks')
+    def query_tasks(self, start=None, end=None, state=None, tags=None):
+        if not self._derived:
+            return PlanStore.query_tasks(self, start, end, state, tags)
+        where, params = self._range_clause(start, end, tags)
+        if state is not None:
+            where += ' AND state = ?' if where else ' WHERE state = ?'
+            params.append(state)
+        with self._lock:
+            cursor = self._conn.execute(
+                'SELECT date, position, text, state, tag, estimate, carried_from '
+                f'FROM tasks{where} ORDER BY date, position', params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def checkpoint(self):
+        if self.read_only:
+            return
+        with self._lock:
+            self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# 可用的存储后端，键为配置中使用的名称
+STORE_BACKENDS = {
+    'sqlite': SQLiteStore,
+    'json': JsonDirStore,
+}
+
+DEFAULT_BACKEND = 'sqlite'
+
+
+def open_store(data_dir, backend=DEFAULT_BACKEND):
+    """按名称创建存储后端"""
+    try:
+        store_cls = STORE_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"未知的存储后端: {backend}")
+    return store_cls(data_dir)
+
+
+def migrate_json_plans(data_dir, store, legacy_dir_name='legacy_json'):
+    """把旧版每天一个的 JSON 文件一次性导入 store
+
+    导入成功的文件会移动到 legacy_dir_name 子目录，因此重复调用不会重复导入。
+    返回导入的天数。
+    """
+    if isinstance(store, JsonDirStore):
+        return 0
+
+    records, paths = [], []
+    for name in sorted(os.listdir(data_dir)):
+        match = PLAN_FILE_PATTERN.match(name)
+        if not match:
+            continue
+        plan_date = match.group(1)
+        try:
+            datetime.strptime(plan_date, '%Y-%m-%d')
+        except ValueError:
+            continue
+        file_path = os.path.join(data_dir, name)
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            # 损坏的文件留在原处，不影响其他日期的迁移
+            print(f"迁移计划文件失败 {name}: {e}")
+            continue
+        data['date'] = plan_date
+        records.append(data)
+        paths.append(file_path)
+
+    if not records:
+        return 0
+
+    store.save_many(records)
+
+    legacy_dir = os.path.join(data_dir, legacy_dir_name)
+    os.makedirs(legacy_dir, exist_ok=True)
+    for file_path in paths:
+        shutil.move(file_path, os.path.join(legacy_dir, os.path.basename(file_path)))
+    return len(records)
@@ -0,0 +1,451 @@
+
+# 标准库导入
+import os
+import sys
+import sqlite3
+import argparse
+from datetime import date
+
+# 本地模块导入
+from planner_core import PlannerCore, BACKUP_KEEP_LAST, validate_date
+from profiles import load_profiles, save_profiles, resolve_data_dir
+from archive import DEFAULT_ARCHIVE_AGE_DAYS
+from bulk_io import import_plans, export_plans, FORMATS
+from recurrence import format_rule
+from template_engine import date_range, next_month, MODES, ACTION_NAMES, ACTION_SKIP, ACTION_UNCHANGED
+import perf
+
+# 导出格式按文件扩展名推断
+EXPORT_FORMATS = {'.html': 'html', '.htm': 'html', '.csv': 'csv'}
+
+
+def _date_arg(text):
+    try:
+        return validate_date(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError("日期格式不正确，请使用YYYY-MM-DD格式")
+
+
+def _split_tags(values):
+    tags = []
+    for value in values or []:
+        tags.extend(tag.strip() for tag in value.replace('，', ',').split(',') if tag.strip())
+    return tags
+
+
+def cmd_add(core, args):
+    """写入某天的计划，内容为 - 时从标准输入读取"""
+    content = ' '.join(args.content)
+    if content == '-':
+        content = sys.stdin.read()
+    content = content.strip()
+
+    # 没有计划的日期以例行计划的内容为基础追加
+    data = core.effective_plan(args.date) or {'date': args.date, 'content': '', 'tag': core.tags()[0], 'done': False}
+    if args.append and data['content']:
+        content = data['content'] + '\n' + content
+    data = dict(data, content=content)
+    data.pop('last_modified', None)
+    data.pop('recurring', None)
+    if args.tag:
+        data['tag'] = args.tag
+    if args.done is not None:
+        data['done'] = args.done
+    core.save_plan(data)
+    print(f"{args.date} 的计划已保存")
+    return 0
+
+
+def cmd_show(core, args):
+    data = core.effective_plan(args.date)
+    if data is None:
+        print(f"{args.date} 还没有计划", file=sys.stderr)
+        return 1
+    state = '已完成' if data.get('done') else '未完成'
+    if data.get('recurring'):
+        state = f"尚未保存，例行计划: {'、'.join(data['recurring'])}"
+    print(f"# {data['date']}  [{data.get('tag', '')}] {state}")
+    print(data.get('content', ''))
+    return 0
+
+
+def cmd_list(core, args):
+    count = 0
+    for data in core.iter_plans(args.start, args.end, _split_tags(args.tag)):
+        first_line = next((line for line in data.get('content', '').splitlines() if line.strip()), '')
+        mark = 'x' if data.get('done') else ' '
+        print(f"{data['date']}  [{mark}] {data.get('tag', '')}\t{first_line[:60]}")
+        count += 1
+    if not count:
+        print("没有符合条件的计划", file=sys.stderr)
+    return 0
+
+
+def cmd_search(core, args):
+    core.ensure_search_index()
+    results = core.search(' '.join(args.query), limit=args.limit, kind=args.kind)
+    for item in results:
+        kind = "计划" if item['kind'] == 'plan' else "模板"
+        print(f"[{kind}] {item['key']}  ({item['tag']})  {item['score']:.2f}")
+    if not results:
+        print("没有匹配的结果", file=sys.stderr)
+    return 0
+
+
+def cmd_export(core, args):
+    fmt = args.format or EXPORT_FORMATS.get(os.path.splitext(args.path)[1].lower(), 'markdown')
+    core.export_report(args.path, fmt, args.start, args.end, _split_tags(args.tag))
+    print(f"工作总结已导出到: {args.path}")
+    return 0
+
+
+def cmd_backup(core, args):
+    manifest = core.backup(keep_last=args.keep)
+    print(f"已创建备份 {manifest['id']}：计划 {len(manifest['plans'])} 天，"
+          f"文件 {len(manifest['files'])} 个，新增 {manifest['new_objects']} 项"
+          f"（{manifest['new_bytes'] // 1024} KB）")
+    return 0
+
+
+def cmd_tasks(core, args):
+    tasks = core.open_tasks(args.days, _split_tags(args.tag))
+    for task in tasks:
+        estimate = f"  ~{task['estimate']}m" if task['estimate'] else ''
+        origin = f"  (顺延自 {task['carried_from']})" if task['carried_from'] else ''
+        print(f"{task['date']}  [{task['tag'] or ''}] {task['text']}{estimate}{origin}")
+    if not tasks:
+        print("没有未完成的任务", file=sys.stderr)
+    return 0
+
+
+def cmd_carry(core, args):
+    count = core.carry_unfinished(args.date)
+    print(f"已把 {count} 项未完成任务顺延到 {args.date}")
+    return 0
+
+
+def cmd_import(core, args):
+    result = import_plans(core, args.path, args.format, args.dry_run, args.skip_existing, args.workers)
+    for message in result['errors']:
+        print(f"跳过 {message}", file=sys.stderr)
+    if result['conflicts_count']:
+        listed = ', '.join(result['conflicts'])
+        more = f" 等 {result['conflicts_count']} 天" if result['conflicts_count'] > len(result['conflicts']) else ''
+        action = "保留已有内容" if args.skip_existing else "覆盖"
+        print(f"与已有计划冲突（{action}）: {listed}{more}")
+    if result['new_tags']:
+        print(f"新增分类: {', '.join(result['new_tags'])}")
+    verb = "将导入" if args.dry_run else "已导入"
+    print(f"读取 {result['read']} 天，{verb} {result['imported']} 天，内容相同 {result['unchanged']} 天，"
+          f"跳过 {result['skipped']} 天，错误 {result['errors_count']} 条")
+    return 1 if result['errors_count'] else 0
+
+
+def cmd_export_plans(core, args):
+    count = export_plans(core, args.path, args.format, args.start, args.end, _split_tags(args.tag))
+    print(f"已导出 {count} 天的计划到: {args.path}")
+    return 0
+
+
+def cmd_history(core, args):
+    """列出某天的版本，或显示、比较、恢复某个版本"""
+    if args.diff:
+        sys.stdout.write(core.diff_revisions(args.date, *args.diff))
+        return 0
+    if args.show is not None:
+        data = core.load_revision(args.date, args.show)
+        if data is None:
+            print(f"{args.date} 没有版本 {args.show}", file=sys.stderr)
+            return 1
+        print(data['content'])
+        return 0
+    if args.restore is not None:
+        core.restore_revision(args.date, args.restore)
+        print(f"{args.date} 已恢复到版本 {args.restore}")
+        return 0
+    revisions = core.plan_history(args.date)
+    for revision in revisions:
+        mark = 'x' if revision['done'] else ' '
+        print(f"{revision['rev']:>4}  {revision['last_modified']}  [{mark}] {revision['tag']}\t{revision['length']} 字")
+    if not revisions:
+        print(f"{args.date} 没有历史版本", file=sys.stderr)
+    return 0
+
+
+def cmd_apply_template(core, args):
+    """把模板按日期渲染后批量写入一段日期，--dry-run 只列出每天的变化"""
+    category, _, template_name = args.template.partition('/')
+    if not template_name:
+        print("模板请写成 分类/模板名", file=sys.stderr)
+        return 1
+    if args.next_month:
+        start, end = next_month()
+    elif args.start:
+        start, end = args.start, args.end or args.start
+    else:
+        print("请指定 --start/--end 或 --next-month", file=sys.stderr)
+        return 1
+    fields = {}
+    for item in args.set or []:
+        key, sep, value = item.partition('=')
+        if not sep:
+            print(f"字段请写成 名称=值: {item}", file=sys.stderr)
+            return 1
+        fields[key.strip()] = value
+    changes = core.apply_template(category, template_name, date_range(start, end, args.workdays), fields,
+                                  args.mode, args.tag, dry_run=args.dry_run)
+    for change in changes:
+        first_line = next((line for line in change['content'].splitlines() if line.strip()), '')
+        print(f"{change['date']}  {ACTION_NAMES[change['action']]}\t{first_line[:60]}")
+    written = sum(change['action'] not in (ACTION_SKIP, ACTION_UNCHANGED) for change in changes)
+    print(f"{'将写入' if args.dry_run else '已写入'} {written} 天，共 {len(changes)} 天", file=sys.stderr)
+    return 0
+
+
+def cmd_recur(core, args):
+    """列出、添加、删除例行计划，跳过某天，或列出日期区间内的触发情况"""
+    book = core.recurrence
+    if args.add:
+        name, rule_text = args.add
+        rule = book.add(name, rule_text, args.start, args.template, args.tag)
+        print(f"已添加例行计划 {rule['id']}: {rule['name']}  {format_rule(rule)}")
+        return 0
+    if args.remove is not None:
+        book.remove(args.remove)
+        print(f"已删除例行计划 {args.remove}")
+        return 0
+    if args.skip:
+        rule_id, skip_date = args.skip
+        book.skip(int(rule_id), validate_date(skip_date))
+        print(f"例行计划 {rule_id} 在 {skip_date} 跳过")
+        return 0
+    if args.expand:
+        for plan_date, names in core.recurring_calendar(*args.expand).items():
+            print(f"{plan_date}  {'、'.join(names)}")
+        return 0
+    rules = book.rules()
+    for rule in rules:
+        state = ' ' if rule.get('enabled', True) else '-'
+        print(f"{rule['id']:>4} {state} {rule['name']}\t{format_rule(rule)}\t{rule.get('template') or ''}")
+    if not rules:
+        print("还没有例行计划", file=sys.stderr)
+    return 0
+
+
+def cmd_sync(core, args):
+    # 同步模块会加载 http.server，只在用到时导入
+    from sync import SyncClient
+    client = SyncClient(core, args.target)
+    if args.resolve:
+        key, keep = args.resolve
+        client.resolve(key, keep)
+        print(f"已按{'本机' if keep == 'local' else '远端'}内容解决冲突: {key}")
+        if keep == 'remote':
+            return 0
+    result = client.sync()
+    print(f"已同步到版本 {result['revision']}：上传 {result['pushed']} 条，下载 {result['pulled']} 条")
+    if result['conflicts']:
+        print(f"有 {len(result['conflicts'])} 条冲突未解决，两边的内容都已保留:", file=sys.stderr)
+        for conflict in client.conflicts():
+            print(f"  {conflict['key']}  本机 {conflict['local_modified'] or '已删除'}  "
+                  f"远端 {conflict['remote_modified'] or '已删除'}", file=sys.stderr)
+        print("使用 sync --resolve 键 local|remote 选择保留哪一边", file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_sync_server(args):
+    from sync import SyncServer
+    server = SyncServer(args.root, args.host, args.port)
+    print(f"同步服务器已启动: http://{args.host}:{server.server_address[1]}  数据目录: {args.root}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def cmd_compact(core, args):
+    result = core.compact(args.older_than, args.by, args.purge_legacy)
+    print(f"已归档 {result['archived_days']} 天的计划（{result['segments']} 个段），"
+          f"占用空间 {result['bytes_before'] // 1024} KB -> {result['bytes_after'] // 1024} KB，"
+          f"节省 {result['bytes_saved'] // 1024} KB")
+    return 0
+
+
+def cmd_profiles(args):
+    config = load_profiles()
+    if args.add:
+        config['profiles'][args.add[0]] = os.path.abspath(args.add[1])
+    if args.remove:
+        if args.remove == config['default']:
+            print("不能删除默认档案", file=sys.stderr)
+            return 1
+        config['profiles'].pop(args.remove, None)
+    if args.default:
+        if args.default not in config['profiles']:
+            print(f"未知的档案: {args.default}", file=sys.stderr)
+            return 1
+        config['default'] = args.default
+    if args.add or args.remove or args.default:
+        save_profiles(config)
+    for name, data_dir in sorted(config['profiles'].items()):
+        mark = '*' if name == config['default'] else ' '
+        print(f"{mark} {name}\t{data_dir}")
+    return 0
+
+
+def build_parser():
+    today = date.today().strftime('%Y-%m-%d')
+    parser = argparse.ArgumentParser(prog='daily_planner', description="每日计划管理器命令行")
+    parser.add_argument('--data-dir', help="数据目录，默认为用户目录下的 DailyPlannerData")
+    parser.add_argument('--profile', help="使用档案配置中的某个档案")
+    parser.add_argument('--perf', metavar='FILE', help="记录各操作耗时并在结束时写入 JSON 文件")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help="写入某天的计划")
+    add.add_argument('content', nargs='+', help="计划内容，- 表示从标准输入读取")
+    add.add_argument('-d', '--date', type=_date_arg, default=today)
+    add.add_argument('-t', '--tag')
+    add.add_argument('-a', '--append', action='store_true', help="追加到已有内容之后")
+    add.add_argument('--done', dest='done', action='store_true', default=None)
+    add.add_argument('--undone', dest='done', action='store_false')
+    add.set_defaults(func=cmd_add)
+
+    show = commands.add_parser('show', help="显示某天的计划")
+    show.add_argument('date', nargs='?', type=_date_arg, default=today)
+    show.set_defaults(func=cmd_show)
+
+    for name, func, help_text in (('list', cmd_list, "列出日期区间内的计划"),
+                                  ('export', cmd_export, "导出工作总结")):
+        sub = commands.add_parser(name, help=help_text)
+        if name == 'export':
+            sub.add_argument('path')
+            sub.add_argument('-f', '--format', choices=['markdown', 'html', 'csv'])
+        sub.add_argument('-s', '--start', type=_date_arg)
+        sub.add_argument('-e', '--end', type=_date_arg)
+        sub.add_argument('-t', '--tag', action='append', help="分类，可重复或用逗号分隔")
+        sub.set_defaults(func=func)
+
+    search = commands.add_parser('search', help="全文搜索计划和模板")
+    search.add_argument('query', nargs='+')
+    search.add_argument('-n', '--limit', type=int, default=20)
+    search.add_argument('-k', '--kind', choices=['plan', 'template'])
+    search.set_defaults(func=cmd_search)
+
+    tasks = commands.add_parser('tasks', help="列出最近未完成的任务")
+    tasks.add_argument('--days', type=int, default=30)
+    tasks.add_argument('-t', '--tag', action='append', help="分类，可重复或用逗号分隔")
+    tasks.set_defaults(func=cmd_tasks)
+
+    carry = commands.add_parser('carry', help="把之前未完成的任务顺延到某天")
+    carry.add_argument('date', nargs='?', type=_date_arg, default=today)
+    carry.set_defaults(func=cmd_carry)
+
+    importer = commands.add_parser('import', help="从 JSONL、CSV 或 Markdown 文件夹批量导入计划")
+    importer.add_argument('path')
+    importer.add_argument('-f', '--format', choices=FORMATS, help="默认按扩展名推断，目录为 markdown")
+    importer.add_argument('-n', '--dry-run', action='store_true', help="只检查，报告与已有计划的冲突")
+    importer.add_argument('--skip-existing', action='store_true', help="已有计划的日期保留原内容")
+    importer.add_argument('-j', '--workers', type=int, help="解析进程数，默认按输入大小决定")
+    importer.set_defaults(func=cmd_import)
+
+    exporter = commands.add_parser('export-plans', help="批量导出计划为 JSONL、CSV 或 Markdown 文件夹")
+    exporter.add_argument('path')
+    exporter.add_argument('-f', '--format', choices=FORMATS, help="默认按扩展名推断，其余为 markdown 文件夹")
+    exporter.add_argument('-s', '--start', type=_date_arg)
+    exporter.add_argument('-e', '--end', type=_date_arg)
+    exporter.add_argument('-t', '--tag', action='append', help="分类，可重复或用逗号分隔")
+    exporter.set_defaults(func=cmd_export_plans)
+
+    history = commands.add_parser('history', help="查看、比较或恢复某天计划的历史版本")
+    history.add_argument('date', nargs='?', type=_date_arg, default=today)
+    action = history.add_mutually_exclusive_group()
+    action.add_argument('--show', type=int, metavar='REV', help="显示某个版本的内容")
+    action.add_argument('--diff', type=int, nargs=2, metavar=('OLD', 'NEW'), help="比较两个版本")
+    action.add_argument('--restore', type=int, metavar='REV', help="恢复到某个版本")
+    history.set_defaults(func=cmd_history)
+
+    apply_template = commands.add_parser('apply-template', help="把模板批量应用到一段日期")
+    apply_template.add_argument('template', metavar='CATEGORY/NAME')
+    apply_template.add_argument('-s', '--start', type=_date_arg)
+    apply_template.add_argument('-e', '--end', type=_date_arg, help="默认与开始日期相同")
+    apply_template.add_argument('--next-month', action='store_true', help="下个月的每一天")
+    apply_template.add_argument('-w', '--workdays', action='store_true', help="只包含周一到周五")
+    apply_template.add_argument('--set', action='append', metavar='KEY=VALUE', help="自定义字段的值，可重复")
+    apply_template.add_argument('-m', '--mode', choices=MODES, default='skip',
+                                help="已有计划的日期：skip 保留（默认）、replace 替换、append 追加")
+    apply_template.add_argument('-t', '--tag', help="分类，默认新计划用第一个分类，已有计划保留原分类")
+    apply_template.add_argument('-n', '--dry-run', action='store_true', help="只预览每天的变化，不写入")
+    apply_template.set_defaults(func=cmd_apply_template)
+
+    recur = commands.add_parser('recur', help="管理例行计划（按重复规则自动带出的模板内容）")
+    action = recur.add_mutually_exclusive_group()
+    action.add_argument('--add', nargs=2, metavar=('NAME', 'RULE'),
+                        help="添加规则：每天、工作日、每周1,3、每月1,-1、每年，或 RRULE 如 FREQ=WEEKLY;BYDAY=MO")
+    action.add_argument('--remove', type=int, metavar='ID')
+    action.add_argument('--skip', nargs=2, metavar=('ID', 'DATE'), help="某天不触发")
+    action.add_argument('--expand', nargs=2, type=_date_arg, metavar=('START', 'END'), help="列出区间内每天触发的规则")
+    recur.add_argument('--start', type=_date_arg, help="开始日期，默认今天")
+    recur.add_argument('--template', metavar='CATEGORY/NAME', help="插入的模板，默认插入以名称为内容的任务")
+    recur.add_argument('-t', '--tag')
+    recur.set_defaults(func=cmd_recur)
+
+    sync = commands.add_parser('sync', help="与同步目录或同步服务器双向同步")
+    sync.add_argument('target', nargs='?', help="同步目录或 http://地址，省略时使用上次的设置")
+    sync.add_argument('--resolve', nargs=2, metavar=('KEY', 'local|remote'), help="解决一条冲突")
+    sync.set_defaults(func=cmd_sync)
+
+    sync_server = commands.add_parser('sync-server', help="启动同步服务器")
+    sync_server.add_argument('root', help="服务器保存同步数据的目录")
+    sync_server.add_argument('--host', default='127.0.0.1')
+    sync_server.add_argument('--port', type=int, default=8765)
+    sync_server.set_defaults(func=cmd_sync_server, needs_core=False)
+
+    compact = commands.add_parser('compact', help="把旧计划移入压缩归档")
+    compact.add_argument('--older-than', type=int, default=DEFAULT_ARCHIVE_AGE_DAYS, metavar='DAYS')
+    compact.add_argument('--by', choices=['year', 'month'], default='year', help="归档段的粒度")
+    compact.add_argument('--purge-legacy', action='store_true', help="同时删除 legacy_json 目录和旧版 zip 备份")
+    compact.set_defaults(func=cmd_compact)
+
+    profiles = commands.add_parser('profiles', help="列出或修改档案配置")
+    profiles.add_argument('--add', nargs=2, metavar=('NAME', 'DATA_DIR'))
+    profiles.add_argument('--remove', metavar='NAME')
+    profiles.add_argument('--default', metavar='NAME')
+    profiles.set_defaults(func=cmd_profiles, needs_core=False)
+
+    backup = commands.add_parser('backup', help="创建增量备份")
+    backup.add_argument('--keep', type=int, default=BACKUP_KEEP_LAST, help="保留最近的备份数量")
+    backup.set_defaults(func=cmd_backup)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.perf:
+        perf.set_enabled(True)
+    if not getattr(args, 'needs_core', True):
+        return args.func(args)
+    try:
+        core = PlannerCore(args.data_dir or resolve_data_dir(args.profile))
+    except ValueError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+    except (OSError, sqlite3.Error) as e:
+        print(f"无法打开数据目录: {e}", file=sys.stderr)
+        return 1
+    try:
+        return args.func(core, args)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+    finally:
+        core.close()
+        if args.perf:
+            perf.registry.dump_json(args.perf)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
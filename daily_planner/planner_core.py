@@ -0,0 +1,259 @@
+
+# 标准库导入
+import os
+from datetime import datetime, timedelta
+
+# 本地模块导入
+from plan_store import open_store, migrate_json_plans
+from search_index import SearchIndex
+from report import export_report
+from backup import BackupRepository
+from tag_registry import TagRegistry
+from autosave import EditJournal
+from fileutil import atomic_write
+from template_catalog import TemplateCatalog
+from tasks import carry_unfinished, STATE_OPEN
+from archive import ArchivedStore, compact, DEFAULT_ARCHIVE_AGE_DAYS
+from history import PlanHistory
+from recurrence import RecurrenceBook
+from template_engine import TemplateEngine, plan_template_range, carried_items, day_context, MODE_SKIP
+
+DEFAULT_DATA_DIR = os.path.join(os.path.expanduser('~'), 'DailyPlannerData')
+DEFAULT_TAGS = ["工作", "学习", "生活", "其他"]
+
+# 自动清理时保留的备份快照数量
+BACKUP_KEEP_LAST = 30
+
+
+def validate_date(text):
+    """检查 YYYY-MM-DD 格式，格式错误时抛出 ValueError，返回规范化后的日期字符串"""
+    return datetime.strptime(text.strip(), '%Y-%m-%d').strftime('%Y-%m-%d')
+
+
+def now_str():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+class PlannerCore:
+    """不依赖界面的核心逻辑：计划存储、标签、模板、搜索、报告和备份
+
+    图形界面和命令行都建立在它之上；出错时直接抛出异常，由调用方决定如何提示。
+    """
+
+    def __init__(self, data_dir=None, default_tags=None):
+        self.data_dir = data_dir or DEFAULT_DATA_DIR
+        self.template_dir = os.path.join(self.data_dir, 'templates')
+        self.default_tags = list(default_tags or DEFAULT_TAGS)
+
+        os.makedirs(self.template_dir, exist_ok=True)
+        os.makedirs(os.path.join(self.data_dir, 'backups'), exist_ok=True)
+
+        # 标签注册表，读取一次后常驻内存；标签文件不存在时写入默认标签
+        self.tag_registry = TagRegistry(self.data_dir, self.default_tags)
+        if not os.path.exists(os.path.join(self.data_dir, 'tags.json')):
+            self.tag_registry.save(self.default_tags)
+
+        # 打开计划存储，并一次性迁移旧版按天存放的 JSON 文件
+        live_store = open_store(self.data_dir)
+        migrate_json_plans(self.data_dir, live_store)
+        # 旧计划归档在 archive 目录下的压缩段中，读取时透明合并
+        self.store = ArchivedStore(live_store, os.path.join(self.data_dir, 'archive'))
+        self.search_index = SearchIndex(self.data_dir)
+        self.journal = EditJournal(self.data_dir)
+        self.history = PlanHistory(self.data_dir)
+        self.template_catalog = TemplateCatalog(self.template_dir)
+        self.template_engine = TemplateEngine(self.template_catalog)
+        self.recurrence = RecurrenceBook(self.data_dir)
+
+    def load_plan(self, plan_date):
+        return self.store.load(plan_date)
+
+    def effective_plan(self, plan_date):
+        """某天的计划；还没有计划时按当天触发的例行计划拼出内容，不写入存储
+
+        拼出的计划带有 recurring 字段（触发的规则名称），没有 last_modified；
+        没有计划也没有例行计划时返回 None。
+        """
+        data = self.store.load(plan_date)
+        if data is not None:
+            return data
+        rules = self.recurrence.rules_on(plan_date)
+        if not rules:
+            return None
+        return {
+            'date': plan_date,
+            'content': '\n\n'.join(self.recurring_content(rule, plan_date) for rule in rules),
+            'tag': next((rule['tag'] for rule in rules if rule.get('tag')), None) or self.tags()[0],
+            'done': False,
+            'recurring': [rule['name'] for rule in rules],
+        }
+
+    def recurring_content(self, rule, plan_date):
+        """例行计划插入的内容：关联模板按当天渲染，没有模板或模板已删除时为以规则名称为内容的任务"""
+        if rule.get('template'):
+            category, _, template_name = rule['template'].partition('/')
+            try:
+                return self.render_template(category, template_name, plan_date, tag=rule.get('tag'))
+            except OSError:
+                pass
+        return f"- [ ] {rule['name']}"
+
+    def recurring_calendar(self, start, end):
+        """start 到 end 之间每天触发的例行计划 {日期: [规则名称]}"""
+        return self.recurrence.occurrences(start, end)
+
+    def save_plan(self, data, coalesce=True):
+        """写入计划、记录修订历史并更新索引，缺少修改时间时补上当前时间"""
+        if 'last_modified' not in data:
+            data = dict(data, last_modified=now_str())
+        self._record_history(data, coalesce)
+        self.store.save(data)
+        self.search_index.index_plan(data)
+        return data
+
+    def save_plans(self, records):
+        """批量写入计划：一个事务写入存储，一个事务更新索引；覆盖已有计划的日期记录历史版本"""
+        if not records:
+            return
+        dates = [data['date'] for data in records]
+        existing = set(self.store.dates(min(dates), max(dates)))
+        overwritten = [data for data in records if data['date'] in existing]
+        if overwritten:
+            # 没有历史的日期先把原内容记为第一个版本，再在一个事务中记录全部新版本
+            known = self.history.dates_with_history(data['date'] for data in overwritten)
+            baselines = [self.store.load(data['date']) for data in overwritten if data['date'] not in known]
+            self.history.record_many([data for data in baselines if data is not None] + overwritten)
+        self.store.save_many(records)
+        self.search_index.index_plans(records)
+
+    def delete_plan(self, plan_date):
+        """删除某天的计划，历史版本保留，可以从历史中恢复"""
+        self.store.delete(plan_date)
+        self.search_index.remove_plan(plan_date)
+
+    def _record_history(self, data, coalesce=True):
+        if not self.history.has_history(data['date']):
+            # 第一次修改在启用历史之前就存在的计划时，先把原内容记为第一个版本
+            previous = self.store.load(data['date'])
+            if previous is not None:
+                self.history.record(previous)
+        self.history.record(data, coalesce)
+
+    def plan_history(self, plan_date):
+        """某天计划的全部版本，最新的在前"""
+        return self.history.revisions(plan_date)
+
+    def load_revision(self, plan_date, rev):
+        return self.history.load(plan_date, rev)
+
+    def diff_revisions(self, plan_date, old_rev, new_rev):
+        return ''.join(self.history.diff(plan_date, old_rev, new_rev))
+
+    def restore_revision(self, plan_date, rev):
+        """把某个旧版本保存为当前内容；恢复本身也会成为一个新版本，可以再撤销"""
+        data = self.history.load(plan_date, rev)
+        if data is None:
+            raise ValueError(f"{plan_date} 没有版本 {rev}")
+        return self.save_plan(dict(data, last_modified=now_str()), coalesce=False)
+
+    def iter_plans(self, start=None, end=None, tags=None):
+        return self.store.iter_plans(start, end, tags)
+
+    def day_summaries(self, start=None, end=None):
+        """每日摘要，日历总览和统计用"""
+        return self.store.day_summaries(start, end)
+
+    def open_tasks(self, days=30, tags=None, today=None):
+        """最近 days 天（含今天）未完成的任务"""
+        today = today or datetime.now().strftime('%Y-%m-%d')
+        start = (datetime.strptime(today, '%Y-%m-%d') - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+        return self.store.query_tasks(start, today, STATE_OPEN, tags)
+
+    def carry_unfinished(self, today=None):
+        """把之前未完成的任务顺延到今天，返回顺延的任务数
+
+        经由 save_plans 批量写入：先记录各计划顺延前的内容作为历史版本，再写入存储和索引。
+        """
+        count, changed = carry_unfinished(self.store, today, self.tags()[0])
+        self.save_plans(changed)
+        return count
+
+    def tags(self):
+        return self.tag_registry.tags()
+
+    def rename_tag(self, old_tag, new_tag):
+        """重命名分类，改写的计划经由 save_plans 写入，返回受影响的计划天数"""
+        return self.tag_registry.rename(old_tag, new_tag, self.store, self.template_dir, self.save_plans)
+
+    def merge_tags(self, source_tags, target_tag):
+        return self.tag_registry.merge(source_tags, target_tag, self.store, self.template_dir, self.save_plans)
+
+    def delete_tag(self, tag, fallback_tag=None):
+        return self.tag_registry.delete(tag, self.store, self.template_dir, fallback_tag, self.save_plans)
+
+    def search(self, query, limit=20, kind=None):
+        return self.search_index.search(query, limit=limit, kind=kind)
+
+    def ensure_search_index(self):
+        """索引尚未建立时建立一次"""
+        if not self.search_index.is_built():
+            self.rebuild_search_index()
+
+    def rebuild_search_index(self):
+        self.search_index.rebuild(self.store, self.template_dir)
+
+    def export_report(self, path, fmt, start=None, end=None, tags=None):
+        return export_report(self.store, path, fmt, start, end, tags)
+
+    def backup(self, progress=None, cancelled=None, keep_last=BACKUP_KEEP_LAST):
+        """创建增量快照并清理旧快照，返回快照清单"""
+        repo = BackupRepository(self.data_dir)
+        manifest = repo.create_snapshot(self.store, progress, cancelled)
+        repo.prune(keep_last)
+        return manifest
+
+    def compact(self, older_than_days=DEFAULT_ARCHIVE_AGE_DAYS, by='year', purge_legacy=False):
+        """把旧计划移入压缩归档，返回归档天数和节省的字节数"""
+        return compact(self.store, self.data_dir, older_than_days, by, purge_legacy)
+
+    def render_template(self, category, template_name, plan_date, fields=None, tag=None):
+        """按某天渲染模板中的占位符，{carried} 为之前未完成的任务"""
+        compiled = self.template_engine.compile(category, template_name)
+        tag = tag or self.tags()[0]
+        carried = ''
+        if compiled.uses('carried'):
+            carried = carried_items(self.store, [plan_date], tag, exclude=[plan_date]).get(plan_date, '')
+        return compiled.render(day_context(plan_date, tag, fields, carried)).strip('\n')
+
+    def apply_template(self, category, template_name, dates, fields=None, mode=MODE_SKIP, tag=None,
+                       dry_run=False):
+        """把模板应用到一组日期，返回每天的变化；dry_run=False 时在一次批量写入中保存全部计划"""
+        changes, records = plan_template_range(self, category, template_name, dates, fields, mode, tag)
+        if not dry_run:
+            self.save_plans(records)
+        return changes
+
+    def template_path(self, category, template_name):
+        return os.path.join(self.template_dir, category, f"{template_name}.md")
+
+    def write_template(self, category, template_name, content):
+        """写入模板文件并更新模板库和搜索索引"""
+        os.makedirs(os.path.join(self.template_dir, category), exist_ok=True)
+        atomic_write(self.template_path(category, template_name), content)
+        self.template_catalog.put(category, template_name)
+        self.search_index.index_template(category, template_name, content)
+
+    def delete_template(self, category, template_name):
+        """删除模板，模板不存在时返回 False"""
+        template_path = self.template_path(category, template_name)
+        if not os.path.exists(template_path):
+            return False
+        os.remove(template_path)
+        self.template_catalog.remove(category, template_name)
+        self.search_index.remove_template(category, template_name)
+        return True
+
+    def close(self):
+        self.history.close()
+        self.search_index.close()
+        self.store.close()
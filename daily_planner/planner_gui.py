@@ -0,0 +1,2138 @@
+
+# 标准库导入
+import os
+import sqlite3
+import calendar
+from datetime import datetime, date, timedelta
+
+# 第三方库导入
+# 图形界面模块只由 daily_planner.py 在不带参数启动时导入，命令行模式不加载；
+# tkcalendar、plyer 和 markdown 在第一次用到时才导入
+import tkinter as tk
+from tkinter import ttk, messagebox, simpledialog, filedialog
+import webbrowser
+
+# 本地模块导入
+from planner_core import PlannerCore, DEFAULT_TAGS, BACKUP_KEEP_LAST, validate_date
+from backup import BackupRepository, BackupCancelled
+from archive import DEFAULT_ARCHIVE_AGE_DAYS
+from bulk_io import import_plans, export_plans, TransferCancelled
+from md_highlight import MarkdownHighlighter
+from io_executor import TkIOExecutor
+from autosave import AutoSaver, plan_hash
+from profiles import load_profiles, save_profiles, resolve_data_dir, shared_cache
+import perf
+from preview import MarkdownRenderer, PreviewFile, render_page
+from recurrence import describe_rule
+from template_engine import date_range, next_month, ACTION_NAMES, ACTION_SKIP, ACTION_UNCHANGED
+from scheduler import (ReminderScheduler, ScheduledJob, daily_at, load_reminders,
+                       save_reminders, parse_reminder_time, describe_reminder)
+
+class DailyPlanner:
+    """每日计划管理应用主类"""
+    
+    # 自动清理时保留的备份快照数量
+    BACKUP_KEEP_LAST = BACKUP_KEEP_LAST
+    
+    # 日历中各分类的颜色，按分类顺序取用，超出的分类共用最后一种
+    TAG_COLOURS = ['#4e79a7', '#59a14f', '#f28e2b', '#b07aa1', '#76b7b2', '#9c755f', '#7f7f7f']
+    
+    # 当前打开的所有档案窗口，关闭主窗口时依次保存
+    instances = []
+    
+    def __init__(self, root, data_dir=None, profile=None):
+        """初始化应用界面和数据结构，root 可以是主窗口，也可以是另开档案时的 Toplevel"""
+        self.root = root
+        self.profile = profile
+        self.root.title(f"每日计划管理器 - {profile}" if profile else "每日计划管理器")
+        self.root.geometry("1000x700")
+        
+        # 初始化分类管理
+        self.default_categories = list(DEFAULT_TAGS)
+        self.current_category = tk.StringVar(value=self.default_categories[0])
+        
+        # 初始化数据目录路径
+        self.data_dir = data_dir or resolve_data_dir()
+        self.template_dir = os.path.join(self.data_dir, 'templates')
+        
+        # 设置默认标签
+        self.default_tags =self.default_categories
+        
+        # 磁盘读写都经由后台执行器，避免阻塞界面
+        self.io = TkIOExecutor(self.root)
+        
+        # Markdown 预览：渲染结果按内容缓存，始终复用同一个预览文件
+        self.renderer = MarkdownRenderer()
+        self.preview_file = PreviewFile()
+        self._live_preview_job = None
+        
+        # 初始化数据目录
+        self._init_data_dirs()
+        self.create_widgets()
+        self.setup_reminder()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        DailyPlanner.instances.append(self)
+        
+        # 先在串行通道中检查上次未保存的编辑，再打开今天的计划
+        self.recover_unsaved_edits()
+        self.load_plan(quiet=True)
+        
+        # 全文索引，首次使用时在后台建立
+        if not self.search_index.is_built():
+            self.rebuild_search_index()
+        # 模板库索引在后台建立，打开模板库时无需再扫描目录
+        self.io.submit(lambda task: self.template_catalog.build(), name="索引模板库")
+    def update_tags(self,tag):
+        self.default_tags.append(tag)
+        return
+        
+        
+    def _init_data_dirs(self):
+        """打开数据目录，存储、标签、模板和索引都由 PlannerCore 管理"""
+        try:
+            self.core = PlannerCore(self.data_dir, self.default_tags)
+        except (OSError, sqlite3.Error) as e:
+            messagebox.showerror("初始化错误", f"无法创建数据目录: {str(e)}")
+            raise
+        
+        self.tag_registry = self.core.tag_registry
+        self.store = self.core.store
+        self.search_index = self.core.search_index
+        self.journal = self.core.journal
+        self.template_catalog = self.core.template_catalog
+
+    def create_widgets(self):
+        # 日期选择
+        self.date_frame = tk.Frame(self.root)
+        self.date_frame.pack(pady=10)
+        
+        tk.Label(self.date_frame, text="选择日期:").pack(side=tk.LEFT)
+        # 日期选择按钮
+        self.date_str = tk.StringVar(value=date.today().strftime('%Y-%m-%d'))
+        tk.Entry(self.date_frame, textvariable=self.date_str, width=10).pack(side=tk.LEFT, padx=5)
+        
+        # 日历弹出按钮
+        tk.Button(self.date_frame, text="📅", command=self.open_calendar).pack(side=tk.LEFT)
+        
+        tk.Button(self.date_frame, text="加载", command=self.load_plan).pack(side=tk.LEFT)
+        tk.Button(self.date_frame, text="搜索", command=self.open_search).pack(side=tk.LEFT, padx=5)
+        
+        # 分类标签
+        self.tag_frame = tk.Frame(self.root)
+        self.tag_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        tk.Label(self.tag_frame, text="分类:").pack(side=tk.LEFT)
+        self.tag_var = tk.StringVar(value="工作")
+        
+        # 预设分类
+        #self.default_tags = ["工作", "学习", "生活", "其他"]
+        self.default_tags = self.load_tags()
+        self.tag_combobox = ttk.Combobox(self.tag_frame, 
+                                      textvariable=self.tag_var,
+                                      values=self.default_tags)
+        self.tag_combobox.pack(side=tk.LEFT, padx=5)
+        self.tag_combobox.config(postcommand=lambda: self.tag_combobox.config(values=self.load_tags()))
+        
+        # 添加新分类按钮
+        tk.Button(self.tag_frame, text="+", command=self.add_new_tag).pack(side=tk.LEFT, padx=5)
+        tk.Button(self.tag_frame, text="管理分类", command=self.manage_tags).pack(side=tk.LEFT)
+        
+        # 计划内容编辑
+        self.text_frame = tk.Frame(self.root)
+        self.text_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        tk.Label(self.text_frame, text="计划内容(Markdown格式):").pack(anchor=tk.W)
+        # 编辑器和实时预览并排放在可拖动的分隔窗口中
+        self.editor_pane = tk.PanedWindow(self.text_frame, orient=tk.HORIZONTAL)
+        self.editor_pane.pack(fill=tk.BOTH, expand=True)
+        self.text = tk.Text(self.editor_pane, wrap=tk.WORD)
+        self.editor_pane.add(self.text, stretch='always')
+        # 编辑器内的 Markdown 着色，只处理可见区域
+        self.highlighter = MarkdownHighlighter(self.text)
+        self.preview_pane = None
+        
+        # 自动保存：编辑器当前对应的日期，加载或保存后才确定
+        self.current_date = None
+        self.autosaver = AutoSaver(self.root, self.text, self.journal,
+                                   self._editor_state, self._autosave, self._run_serial)
+        
+        # Markdown测试和预览按钮
+        btn_frame = tk.Frame(self.text_frame)
+        btn_frame.pack(anchor=tk.E, pady=5)
+        
+        tk.Button(btn_frame, text="测试Markdown", 
+                command=self.insert_markdown_test).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="预览Markdown", 
+                command=self.preview_markdown).pack(side=tk.LEFT)
+        self.live_preview_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(btn_frame, text="实时预览", variable=self.live_preview_var,
+                       command=self.toggle_live_preview).pack(side=tk.LEFT, padx=5)
+        self.autosaver.listeners.append(self.schedule_live_preview)
+        
+        # 完成状态
+        self.done_var = tk.BooleanVar()
+        tk.Checkbutton(self.root, text="已完成", variable=self.done_var).pack(anchor=tk.W, padx=10)
+        
+        # 分类和完成状态的修改同样触发自动保存
+        self.tag_var.trace_add('write', lambda *args: self.autosaver.schedule())
+        self.done_var.trace_add('write', lambda *args: self.autosaver.schedule())
+        
+        # 操作按钮
+        self.btn_frame = tk.Frame(self.root)
+        self.btn_frame.pack(pady=10)
+        
+        tk.Button(self.btn_frame, text="保存计划", command=self.save_plan).pack(side=tk.LEFT, padx=5)
+        tk.Button(self.btn_frame, text="备份数据", command=self.backup_data).pack(side=tk.LEFT, padx=5)
+        tk.Button(self.btn_frame, text="恢复备份", command=self.manage_backups).pack(side=tk.LEFT, padx=5)
+        tk.Button(self.btn_frame, text="导入内容到模板库", command=self.import_to_template).pack(side=tk.LEFT, padx=5)
+        tk.Button(self.btn_frame, text="模板库", command=self.manage_templates).pack(side=tk.LEFT, padx=5)
+        tk.Button(self.btn_frame, text="工作总结", command=self.export_summary).pack(side=tk.LEFT, padx=5)
+        tk.Button(self.btn_frame, text="批量导入导出", command=self.open_bulk_io).pack(side=tk.LEFT, padx=5)
+        tk.Button(self.btn_frame, text="提醒设置", command=self.manage_reminders).pack(side=tk.LEFT, padx=5)
+        tk.Button(self.btn_frame, text="例行计划", command=self.manage_recurring).pack(side=tk.LEFT, padx=5)
+        tk.Button(self.btn_frame, text="顺延未完成", command=self.carry_unfinished).pack(side=tk.LEFT, padx=5)
+        tk.Button(self.btn_frame, text="未完成任务", command=self.open_tasks).pack(side=tk.LEFT, padx=5)
+        tk.Button(self.btn_frame, text="历史版本", command=self.open_history).pack(side=tk.LEFT, padx=5)
+        tk.Button(self.btn_frame, text="同步", command=self.open_sync).pack(side=tk.LEFT, padx=5)
+        tk.Button(self.btn_frame, text="档案", command=self.manage_profiles).pack(side=tk.LEFT, padx=5)
+        tk.Button(self.btn_frame, text="性能诊断", command=self.open_diagnostics).pack(side=tk.LEFT, padx=5)
+        self.root.bind('<F12>', lambda event: self.open_diagnostics())
+        
+        # 状态栏：显示后台任务和进度，可取消耗时任务
+        self.status_frame = tk.Frame(self.root, relief=tk.SUNKEN, bd=1)
+        self.status_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        self.status_label = tk.Label(self.status_frame, text="就绪", anchor=tk.W)
+        self.status_label.pack(side=tk.LEFT, padx=5)
+        self.status_cancel = tk.Button(self.status_frame, text="取消", command=self.cancel_tasks)
+        self.status_progress = ttk.Progressbar(self.status_frame, length=200, mode='determinate')
+        self.io.add_listener(self.update_status)
+        
+    def open_calendar(self):
+        """日历总览：有计划的日期按分类着色，未完成的日期用红字，只有例行计划的日期用灰底，底部显示月度和年度统计"""
+        from tkcalendar import Calendar
+        
+        try:
+            current = datetime.strptime(self.date_str.get(), '%Y-%m-%d').date()
+        except ValueError:
+            current = date.today()
+        
+        top = tk.Toplevel(self.root)
+        top.title("日历总览")
+        cal = Calendar(top, selectmode='day', date_pattern='y-mm-dd',
+                       year=current.year, month=current.month, day=current.day)
+        cal.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        stats_label = tk.Label(top, justify=tk.LEFT, anchor=tk.W)
+        stats_label.pack(fill=tk.X, padx=10)
+        
+        tags = self.load_tags()
+        for index, colour in enumerate(self.TAG_COLOURS):
+            cal.tag_config(f"done{index}", background=colour, foreground='white')
+            cal.tag_config(f"open{index}", background=colour, foreground='red')
+        cal.tag_config('recurring', background='#E0E0E0', foreground='black')
+        summaries = {}
+        loaded_years = set()
+        
+        def colour_index(tag):
+            index = tags.index(tag) if tag in tags else len(self.TAG_COLOURS) - 1
+            return min(index, len(self.TAG_COLOURS) - 1)
+        
+        def show_stats():
+            month, year = cal.get_displayed_month()
+            month_prefix, year_prefix = f"{year:04d}-{month:02d}-", f"{year:04d}-"
+            month_days = [s for d, s in summaries.items() if d.startswith(month_prefix)]
+            year_days = [s for d, s in summaries.items() if d.startswith(year_prefix)]
+            stats_label.config(text=(
+                f"{year}年{month}月：{len(month_days)}/{calendar.monthrange(year, month)[1]} 天有计划，"
+                f"已完成 {sum(s['done'] for s in month_days)} 天，"
+                f"事项 {sum(s['done_items'] for s in month_days)}/{sum(s['items'] for s in month_days)} 项完成\n"
+                f"{year}年全年：{len(year_days)} 天有计划，已完成 {sum(s['done'] for s in year_days)} 天"))
+        
+        def mark(year_summaries, recurring):
+            # 例行计划按需展开，只标出还没有计划的日期
+            for plan_date, names in recurring.items():
+                if plan_date not in year_summaries:
+                    cal.calevent_create(datetime.strptime(plan_date, '%Y-%m-%d').date(),
+                                        f"例行: {'、'.join(names)}", 'recurring')
+            for plan_date, summary in year_summaries.items():
+                index = colour_index(summary['tag'])
+                state = f"{summary['done_items']}/{summary['items']} 项" if summary['items'] else ''
+                cal.calevent_create(
+                    datetime.strptime(plan_date, '%Y-%m-%d').date(),
+                    f"{summary['tag'] or ''} {'已完成' if summary['done'] else '未完成'} {state}",
+                    f"{'done' if summary['done'] else 'open'}{index}")
+        
+        def load_year(year):
+            # 一次读取整年的摘要，翻到同一年的其他月份时不再读取
+            if year in loaded_years:
+                return
+            loaded_years.add(year)
+            
+            def work(task):
+                start, end = f"{year:04d}-01-01", f"{year:04d}-12-31"
+                return self.core.day_summaries(start, end), self.core.recurring_calendar(start, end)
+            
+            def shown(result):
+                if not top.winfo_exists():
+                    return
+                year_summaries, recurring = result
+                summaries.update(year_summaries)
+                mark(year_summaries, recurring)
+                show_stats()
+            
+            self.io.submit(work, shown, self._show_io_error, name="加载日历")
+        
+        def month_changed(event=None):
+            load_year(cal.get_displayed_month()[1])
+            show_stats()
+        
+        def set_date(event=None):
+            self.date_str.set(cal.get_date())
+            top.destroy()
+            self.load_plan()
+        
+        def reload():
+            # 数据被整体替换后丢弃已读取的摘要，重新读取当前显示的年份
+            if not top.winfo_exists():
+                return
+            cal.calevent_remove('all')
+            summaries.clear()
+            loaded_years.clear()
+            month_changed()
+        
+        self._reload_calendar = reload
+        cal.bind('<<CalendarMonthChanged>>', month_changed)
+        cal.bind('<Double-Button-1>', set_date)
+        tk.Button(top, text="选择", command=set_date).pack(pady=5)
+        month_changed()
+        
+    def update_status(self, tasks):
+        """根据后台任务列表刷新状态栏"""
+        if not tasks:
+            self.status_label.config(text="就绪")
+            self.status_progress.pack_forget()
+            self.status_cancel.pack_forget()
+            return
+        
+        names = [task.name for task in tasks if task.name]
+        self.status_label.config(text=f"处理中: {'、'.join(names) if names else len(tasks)}")
+        progress_task = next((task for task in tasks if task.total), None)
+        if progress_task is not None:
+            self.status_progress.config(maximum=progress_task.total, value=progress_task.done)
+            if not self.status_progress.winfo_ismapped():
+                self.status_progress.pack(side=tk.RIGHT, padx=5)
+        else:
+            self.status_progress.pack_forget()
+        if any(task.cancellable for task in tasks):
+            if not self.status_cancel.winfo_ismapped():
+                self.status_cancel.pack(side=tk.RIGHT, padx=5)
+        else:
+            self.status_cancel.pack_forget()
+        
+    def cancel_tasks(self):
+        """取消所有可取消的后台任务"""
+        for task in self.io.active_tasks():
+            task.cancel()
+        
+    def rebuild_search_index(self):
+        """在后台重建全文索引"""
+        self.io.submit(lambda task: self.core.rebuild_search_index(), name="重建索引")
+        
+    def load_plan(self, quiet=False):
+        selected_date = self.date_str.get()
+        try:
+            datetime.strptime(selected_date, '%Y-%m-%d')
+        except ValueError:
+            messagebox.showerror("错误", "日期格式不正确，请使用YYYY-MM-DD格式")
+            return
+        
+        # 切换日期前先保存当前日期未保存的修改
+        self.autosaver.flush()
+            
+        def show(data):
+            if data is not None:
+                # 还没有计划但有例行计划时，显示拼好的内容，编辑后才保存
+                self.text.delete(1.0, tk.END)
+                self.text.insert(tk.END, data.get('content', ''))
+                self.tag_var.set(data.get('tag', '工作'))
+                self.done_var.set(data.get('done', False))
+            else:
+                self.text.delete(1.0, tk.END)
+                self.tag_var.set("工作")
+                self.done_var.set(False)
+                if not quiet:
+                    messagebox.showinfo("提示", f"{selected_date} 还没有计划，可以开始创建")
+            self.current_date = selected_date
+            self.autosaver.mark_saved(self._editor_state())
+        
+        self.io.submit(lambda task: self.core.effective_plan(selected_date), show,
+                       self._show_io_error, name="加载计划", serial=True)
+        
+    def reload_views(self):
+        """数据被整体替换（例如恢复备份）后，重新加载编辑器、分类、日历和模板列表"""
+        # 编辑器中是替换前的内容，先记为已保存，切换时不会再写回存储
+        state = self._editor_state()
+        if state is not None:
+            self.autosaver.mark_saved(state)
+        self.tag_registry.invalidate()
+        self.tag_combobox.config(values=self.load_tags())
+        self.load_plan(quiet=True)
+        if getattr(self, '_reload_calendar', None) is not None:
+            self._reload_calendar()
+        self.io.submit(lambda task: self.template_catalog.refresh(),
+                       lambda result: self.refresh_template_list(), name="刷新模板库")
+        
+    def _show_io_error(self, error):
+        messagebox.showerror("错误", f"读写数据失败: {error}")
+        
+    def _run_serial(self, fn):
+        """在计划读写的串行通道中执行 fn"""
+        self.io.submit(lambda task: fn(), serial=True)
+        
+    def _persist_plan(self, data):
+        """写入计划并更新索引，在后台线程中调用"""
+        self.core.save_plan(data)
+        
+    def _editor_state(self):
+        """编辑器中当前计划的内容，尚未加载任何日期时返回 None"""
+        if self.current_date is None:
+            return None
+        return {
+            'date': self.current_date,
+            'content': self.text.get(1.0, tk.END).strip(),
+            'tag': self.tag_var.get(),
+            'done': self.done_var.get(),
+        }
+        
+    def _autosave(self, data, on_done):
+        data = dict(data, last_modified=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        self.io.submit(lambda task: self._persist_plan(data), lambda result: on_done(),
+                       self._show_io_error, name="自动保存", serial=True)
+        
+    def recover_unsaved_edits(self):
+        """启动时检查编辑日志，询问是否恢复上次未保存的内容"""
+        def find(task):
+            # 关闭窗口时的最后一次保存来不及写 commit 记录，内容与存储一致的不必恢复
+            pending = []
+            for data in self.journal.pending():
+                saved = self.store.load(data['date'])
+                if saved is None or plan_hash(saved) != plan_hash(data):
+                    pending.append(data)
+            if not pending:
+                self.journal.clear()
+            return pending
+        
+        def ask(pending):
+            if not pending:
+                return
+            dates = '、'.join(data['date'] for data in pending)
+            if not messagebox.askyesno("恢复未保存的内容", f"发现上次未保存的编辑: {dates}\n是否恢复？"):
+                self.io.submit(lambda task: self.journal.clear(), None, self._show_io_error,
+                               name="清除编辑日志", serial=True)
+                return
+            
+            def work(task):
+                now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                for data in pending:
+                    self._persist_plan(dict(data, last_modified=now))
+                self.journal.clear()
+            
+            def done(result):
+                # 询问期间今天的计划已经加载，恢复的是当前日期时重新加载编辑器
+                if self.current_date in {data['date'] for data in pending}:
+                    self.load_plan(quiet=True)
+            
+            self.io.submit(work, done, self._show_io_error, name="恢复编辑", serial=True)
+        
+        self.io.submit(find, ask, lambda error: print(f"读取编辑日志失败: {error}"),
+                       name="检查编辑日志", serial=True)
+        
+    def on_close(self):
+        """关闭窗口前保存未保存的修改"""
+        if self in DailyPlanner.instances:
+            DailyPlanner.instances.remove(self)
+        if not isinstance(self.root, tk.Toplevel):
+            for other in list(DailyPlanner.instances):
+                other.on_close()
+        self.autosaver.flush()
+        self.preview_file.cleanup()
+        self.root.destroy()
+        # 另开的档案窗口自己释放资源，主窗口在 main() 中退出主循环后释放
+        if isinstance(self.root, tk.Toplevel):
+            self.scheduler.stop()
+            self.io.shutdown()
+            self.core.close()
+            
+    def save_plan(self):
+        selected_date = self.date_str.get()
+        try:
+            datetime.strptime(selected_date, '%Y-%m-%d')
+        except ValueError:
+            messagebox.showerror("错误", "日期格式不正确，请使用YYYY-MM-DD格式")
+            return
+            
+        content = self.text.get(1.0, tk.END).strip()
+        data = {
+            'date': selected_date,
+            'content': content,
+            'tag': self.tag_var.get(),
+            'done': self.done_var.get(),
+            'last_modified': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        
+        def done(result):
+            self.current_date = selected_date
+            self.autosaver.mark_saved(data)
+            self._run_serial(lambda: self.journal.record_commit(data))
+            messagebox.showinfo("成功", f"{selected_date} 的计划已保存")
+            
+        self.io.submit(lambda task: self._persist_plan(data), done,
+                       self._show_io_error, name="保存计划", serial=True)
+        
+    def carry_unfinished(self):
+        """把最近30天未完成的任务顺延到今天，并打开今天的计划"""
+        today = date.today().strftime('%Y-%m-%d')
+        # 先把编辑器中未保存的修改写入，顺延任务在同一串行通道中随后执行
+        self.autosaver.flush()
+        
+        def done(count):
+            self.date_str.set(today)
+            self.load_plan(quiet=True)
+            if count:
+                messagebox.showinfo("成功", f"已把 {count} 项未完成任务顺延到今天")
+            else:
+                messagebox.showinfo("提示", "最近没有未完成的任务")
+        
+        self.io.submit(lambda task: self.core.carry_unfinished(today), done,
+                       self._show_io_error, name="顺延任务", serial=True)
+        
+    def open_tasks(self):
+        """未完成任务窗口：列出最近30天未完成的任务，双击打开所在日期"""
+        if hasattr(self, '_tasks_win') and self._tasks_win.winfo_exists():
+            self._tasks_win.lift()
+            return
+        
+        self._tasks_win = tk.Toplevel(self.root)
+        self._tasks_win.title("最近30天未完成的任务")
+        self._tasks_win.geometry("600x450")
+        
+        task_list = tk.Listbox(self._tasks_win)
+        task_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        summary_label = tk.Label(self._tasks_win, anchor=tk.W)
+        summary_label.pack(fill=tk.X, padx=10)
+        tasks = []
+        
+        def show(found):
+            if not task_list.winfo_exists():
+                return
+            tasks[:] = found
+            task_list.delete(0, tk.END)
+            for task in tasks:
+                origin = f"  顺延自 {task['carried_from']}" if task['carried_from'] else ''
+                estimate = f"  ~{task['estimate']}分钟" if task['estimate'] else ''
+                task_list.insert(tk.END, f"{task['date']}  [{task['tag'] or ''}] {task['text']}{estimate}{origin}")
+            total = sum(task['estimate'] or 0 for task in tasks)
+            summary_label.config(text=f"共 {len(tasks)} 项，预估 {total // 60} 小时 {total % 60} 分钟")
+        
+        def open_task(event=None):
+            selection = task_list.curselection()
+            if selection:
+                self.date_str.set(tasks[selection[0]]['date'])
+                self.load_plan()
+        
+        task_list.bind('<Double-Button-1>', open_task)
+        btn_frame = tk.Frame(self._tasks_win)
+        btn_frame.pack(pady=10)
+        tk.Button(btn_frame, text="顺延到今天", command=self.carry_unfinished).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="关闭", command=self._tasks_win.destroy).pack(side=tk.LEFT, padx=5)
+        self.io.submit(lambda task: self.core.open_tasks(30), show, self._show_io_error,
+                       name="查询未完成任务", serial=True)
+        
+    def open_history(self):
+        """当前日期计划的历史版本：选中一个版本显示它相对前一版本的改动，选中两个则比较这两个版本"""
+        plan_date = self.date_str.get()
+        if hasattr(self, '_history_win') and self._history_win.winfo_exists():
+            self._history_win.destroy()
+        # 先把编辑器中未保存的修改写入，作为最新版本
+        self.autosaver.flush()
+        
+        self._history_win = tk.Toplevel(self.root)
+        self._history_win.title(f"{plan_date} 的历史版本")
+        self._history_win.geometry("760x520")
+        
+        revision_list = tk.Listbox(self._history_win, selectmode=tk.EXTENDED, height=8)
+        revision_list.pack(fill=tk.X, padx=10, pady=5)
+        diff_text = tk.Text(self._history_win, wrap=tk.NONE, font=('Consolas', 10))
+        diff_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        diff_text.tag_config('added', foreground='#2E7D32')
+        diff_text.tag_config('removed', foreground='#C62828')
+        diff_text.tag_config('hunk', foreground='#1565C0')
+        revisions = []
+        
+        def show_revisions(found):
+            if not revision_list.winfo_exists():
+                return
+            revisions[:] = found
+            revision_list.delete(0, tk.END)
+            for revision in revisions:
+                state = '已完成' if revision['done'] else '未完成'
+                revision_list.insert(tk.END, f"版本 {revision['rev']}  {revision['last_modified']}  "
+                                             f"[{revision['tag']}] {state}  {revision['length']} 字")
+            if not revisions:
+                revision_list.insert(tk.END, "还没有历史版本")
+        
+        def show_diff(text):
+            if not diff_text.winfo_exists():
+                return
+            diff_text.delete(1.0, tk.END)
+            for line in text.splitlines(keepends=True):
+                tag = ('hunk' if line.startswith('@@') else
+                       'added' if line.startswith('+') else
+                       'removed' if line.startswith('-') else '')
+                diff_text.insert(tk.END, line, tag)
+        
+        def on_select(event=None):
+            selection = [revisions[i]['rev'] for i in revision_list.curselection() if i < len(revisions)]
+            if not selection:
+                return
+            if len(selection) == 1:
+                new_rev = selection[0]
+                old_rev = new_rev - 1
+                if old_rev < 1:
+                    self.io.submit(lambda task: self.core.load_revision(plan_date, new_rev)['content'],
+                                   show_diff, self._show_io_error, name="读取历史版本")
+                    return
+            else:
+                old_rev, new_rev = min(selection), max(selection)
+            self.io.submit(lambda task: self.core.diff_revisions(plan_date, old_rev, new_rev),
+                           show_diff, self._show_io_error, name="比较历史版本")
+        
+        def restore():
+            selection = [revisions[i]['rev'] for i in revision_list.curselection() if i < len(revisions)]
+            if len(selection) != 1:
+                messagebox.showwarning("警告", "请选择一个版本", parent=self._history_win)
+                return
+            rev = selection[0]
+            if not messagebox.askyesno("确认", f"把 {plan_date} 的计划恢复到版本 {rev}？当前内容会保留在历史中。",
+                                       parent=self._history_win):
+                return
+            
+            def done(result):
+                self.date_str.set(plan_date)
+                self.load_plan(quiet=True)
+                refresh()
+            
+            self.io.submit(lambda task: self.core.restore_revision(plan_date, rev), done,
+                           self._show_io_error, name="恢复历史版本", serial=True)
+        
+        def refresh():
+            self.io.submit(lambda task: self.core.plan_history(plan_date), show_revisions,
+                           self._show_io_error, name="读取历史版本", serial=True)
+        
+        revision_list.bind('<<ListboxSelect>>', on_select)
+        btn_frame = tk.Frame(self._history_win)
+        btn_frame.pack(pady=10)
+        tk.Button(btn_frame, text="恢复此版本", command=restore).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="关闭", command=self._history_win.destroy).pack(side=tk.LEFT, padx=5)
+        refresh()
+        
+    def open_sync(self):
+        """同步窗口：与同步目录或同步服务器双向同步，列出冲突并选择保留哪一边"""
+        # 同步模块会加载 http.server，只在打开窗口时导入
+        from sync import SyncClient, saved_target, KEEP_LOCAL, KEEP_REMOTE
+        if hasattr(self, '_sync_win') and self._sync_win.winfo_exists():
+            self._sync_win.lift()
+            return
+        
+        self._sync_win = tk.Toplevel(self.root)
+        self._sync_win.title("同步")
+        self._sync_win.geometry("640x460")
+        
+        target_var = tk.StringVar(value=saved_target(self.data_dir) or '')
+        target_frame = tk.Frame(self._sync_win)
+        target_frame.pack(fill=tk.X, padx=10, pady=5)
+        tk.Label(target_frame, text="同步目录或服务器地址:").pack(side=tk.LEFT)
+        tk.Entry(target_frame, textvariable=target_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        
+        def choose_folder():
+            folder = filedialog.askdirectory(title="选择同步目录", parent=self._sync_win)
+            if folder:
+                target_var.set(folder)
+        
+        tk.Button(target_frame, text="选择目录", command=choose_folder).pack(side=tk.LEFT)
+        status_label = tk.Label(self._sync_win, text="", anchor=tk.W)
+        status_label.pack(fill=tk.X, padx=10)
+        tk.Label(self._sync_win, text="冲突（两边都改过的记录）:", anchor=tk.W).pack(fill=tk.X, padx=10, pady=(10, 0))
+        conflict_list = tk.Listbox(self._sync_win, height=5)
+        conflict_list.pack(fill=tk.X, padx=10, pady=5)
+        preview = tk.Text(self._sync_win, height=10, wrap=tk.WORD)
+        preview.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        conflicts = []
+        
+        def client():
+            return SyncClient(self.core, target_var.get().strip() or None)
+        
+        def show_conflicts(found):
+            if not conflict_list.winfo_exists():
+                return
+            conflicts[:] = found
+            conflict_list.delete(0, tk.END)
+            for conflict in conflicts:
+                conflict_list.insert(tk.END, f"{conflict['key']}  本机 {conflict['local_modified'] or '已删除'}  "
+                                             f"远端 {conflict['remote_modified'] or '已删除'}")
+        
+        def run_sync():
+            if not target_var.get().strip():
+                messagebox.showwarning("警告", "请先选择同步目录或填写服务器地址", parent=self._sync_win)
+                return
+            self.autosaver.flush()
+            
+            def work(task):
+                sync_client = client()
+                return sync_client.sync(progress=task.progress), sync_client.conflicts()
+            
+            def done(outcome):
+                result, found = outcome
+                if status_label.winfo_exists():
+                    status_label.config(text=f"已同步到版本 {result['revision']}：上传 {result['pushed']} 条，"
+                                             f"下载 {result['pulled']} 条，冲突 {len(found)} 条")
+                show_conflicts(found)
+                if result['pulled']:
+                    self.load_plan(quiet=True)
+            
+            self.io.submit(work, done, self._show_io_error, name="同步", serial=True)
+        
+        def selected_key():
+            selection = conflict_list.curselection()
+            return conflicts[selection[0]]['key'] if selection and selection[0] < len(conflicts) else None
+        
+        def show_versions(versions):
+            if not preview.winfo_exists():
+                return
+            preview.delete(1.0, tk.END)
+            for label, payload in zip(("本机", "远端"), versions):
+                text = '（已删除）' if payload is None else payload.get('content', ', '.join(payload.get('tags', [])))
+                preview.insert(tk.END, f"===== {label} =====\n{text}\n\n")
+        
+        def on_select(event=None):
+            key = selected_key()
+            if key:
+                self.io.submit(lambda task: client().conflict_versions(key), show_versions,
+                               self._show_io_error, name="读取冲突内容")
+        
+        def resolve(keep):
+            key = selected_key()
+            if not key:
+                messagebox.showwarning("警告", "请选择一条冲突", parent=self._sync_win)
+                return
+            
+            def work(task):
+                sync_client = client()
+                sync_client.resolve(key, keep)
+                # 保留本机时立即上传，让其他设备尽快看到
+                if keep == KEEP_LOCAL:
+                    sync_client.sync()
+                return sync_client.conflicts()
+            
+            def done(found):
+                show_conflicts(found)
+                if preview.winfo_exists():
+                    preview.delete(1.0, tk.END)
+                if keep == KEEP_REMOTE:
+                    self.load_plan(quiet=True)
+            
+            self.io.submit(work, done, self._show_io_error, name="解决同步冲突", serial=True)
+        
+        conflict_list.bind('<<ListboxSelect>>', on_select)
+        btn_frame = tk.Frame(self._sync_win)
+        btn_frame.pack(pady=10)
+        tk.Button(btn_frame, text="立即同步", command=run_sync).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="保留本机", command=lambda: resolve(KEEP_LOCAL)).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="使用远端", command=lambda: resolve(KEEP_REMOTE)).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="关闭", command=self._sync_win.destroy).pack(side=tk.LEFT, padx=5)
+        if target_var.get():
+            self.io.submit(lambda task: client().conflicts(), show_conflicts, self._show_io_error,
+                           name="读取同步冲突")
+        
+    def manage_profiles(self):
+        """档案管理窗口：添加、删除、设为默认，在新窗口中打开，或并排浏览多个档案"""
+        if hasattr(self, '_profile_win') and self._profile_win.winfo_exists():
+            self._profile_win.lift()
+            return
+        
+        self._profile_win = tk.Toplevel(self.root)
+        self._profile_win.title("档案管理")
+        self._profile_win.geometry("560x380")
+        
+        # 配置在后台读取，读到之前列表为空
+        config = {'default': None, 'profiles': {}}
+        profile_list = tk.Listbox(self._profile_win, selectmode=tk.EXTENDED)
+        profile_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        names = []
+        
+        def refresh():
+            if not self._profile_win.winfo_exists():
+                return
+            names[:] = sorted(config['profiles'])
+            profile_list.delete(0, tk.END)
+            for name in names:
+                default = "（默认）" if name == config['default'] else ''
+                profile_list.insert(tk.END, f"{name}{default}  {config['profiles'][name]}")
+        
+        def selected_names():
+            result = [names[i] for i in profile_list.curselection()]
+            if not result:
+                messagebox.showwarning("警告", "请先选择档案", parent=self._profile_win)
+            return result
+        
+        def loaded(result):
+            config.update(result)
+            refresh()
+        
+        def apply():
+            if config['default'] is None:
+                # 配置还没有读到，不能用空配置覆盖档案文件
+                return
+            snapshot = {'default': config['default'], 'profiles': dict(config['profiles'])}
+            
+            def failed(error):
+                messagebox.showerror("错误", f"保存档案配置失败: {error}", parent=self._profile_win)
+            
+            self.io.submit(lambda task: save_profiles(snapshot), lambda result: refresh(), failed,
+                           name="保存档案配置", serial=True)
+            refresh()
+        
+        def add_profile():
+            name = simpledialog.askstring("添加档案", "档案名称:", parent=self._profile_win)
+            if not name or not name.strip():
+                return
+            data_dir = filedialog.askdirectory(title="选择数据目录", parent=self._profile_win)
+            if not data_dir:
+                return
+            config['profiles'][name.strip()] = data_dir
+            apply()
+        
+        def remove_profile():
+            for name in selected_names():
+                if name == config['default']:
+                    messagebox.showwarning("警告", "不能删除默认档案", parent=self._profile_win)
+                    continue
+                # 只从配置中移除，不删除数据目录
+                del config['profiles'][name]
+            apply()
+        
+        def set_default():
+            selection = selected_names()
+            if selection:
+                config['default'] = selection[0]
+                apply()
+                messagebox.showinfo("提示", "下次启动时生效", parent=self._profile_win)
+        
+        def open_profile():
+            for name in selected_names():
+                DailyPlanner(tk.Toplevel(self.root), config['profiles'][name], name)
+        
+        def browse():
+            selection = selected_names()
+            if selection:
+                self.browse_profiles({name: config['profiles'][name] for name in selection})
+        
+        btn_frame = tk.Frame(self._profile_win)
+        btn_frame.pack(pady=10)
+        tk.Button(btn_frame, text="添加", command=add_profile).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="移除", command=remove_profile).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="设为默认", command=set_default).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="在新窗口打开", command=open_profile).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="并排浏览", command=browse).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="关闭", command=self._profile_win.destroy).pack(side=tk.LEFT, padx=5)
+        self.io.submit(lambda task: load_profiles(), loaded, self._show_io_error, name="读取档案配置")
+        
+    def browse_profiles(self, profiles):
+        """只读并排浏览多个档案同一天的计划，数据经由共享缓存读取"""
+        win = tk.Toplevel(self.root)
+        win.title("并排浏览")
+        win.geometry(f"{min(400 * len(profiles), 1600)}x600")
+        
+        date_var = tk.StringVar(value=self.date_str.get())
+        nav = tk.Frame(win)
+        nav.pack(fill=tk.X, padx=10, pady=5)
+        
+        panes = tk.PanedWindow(win, orient=tk.HORIZONTAL)
+        panes.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        views = {}
+        for name in profiles:
+            frame = tk.Frame(panes)
+            header = tk.Label(frame, anchor=tk.W, justify=tk.LEFT)
+            header.pack(fill=tk.X)
+            text = tk.Text(frame, wrap=tk.WORD)
+            text.pack(fill=tk.BOTH, expand=True)
+            panes.add(frame, stretch='always')
+            views[name] = (header, text)
+        generation = [0]
+        
+        def show(name, plan_date, current, result):
+            # 日期已经切换或窗口已关闭时丢弃结果
+            if current != generation[0] or not win.winfo_exists():
+                return
+            data, month_days = result
+            header, text = views[name]
+            done = sum(summary['done'] for summary in month_days)
+            state = '' if data is None else (' 已完成' if data.get('done') else ' 未完成')
+            tag = f" [{data.get('tag', '')}]" if data else ''
+            header.config(text=f"{name}{tag}{state}\n本月 {len(month_days)} 天有计划，已完成 {done} 天")
+            text.config(state=tk.NORMAL)
+            text.delete(1.0, tk.END)
+            text.insert(tk.END, data.get('content', '') if data else f"{plan_date} 没有计划")
+            text.config(state=tk.DISABLED)
+        
+        def load(event=None):
+            try:
+                plan_date = datetime.strptime(date_var.get(), '%Y-%m-%d').strftime('%Y-%m-%d')
+            except ValueError:
+                messagebox.showerror("错误", "日期格式不正确，请使用YYYY-MM-DD格式", parent=win)
+                return
+            generation[0] += 1
+            current = generation[0]
+            
+            # 每个档案单独提交，一个档案所在的网络盘慢不会拖住其他档案
+            for name, data_dir in profiles.items():
+                def work(task, data_dir=data_dir):
+                    cache = shared_cache.for_root(data_dir)
+                    summaries = cache.day_summaries(int(plan_date[:4]))
+                    month_days = [summary for day, summary in summaries.items() if day[:7] == plan_date[:7]]
+                    return cache.load(plan_date), month_days
+                
+                self.io.submit(work, lambda result, name=name: show(name, plan_date, current, result),
+                               lambda error, name=name: views[name][0].config(text=f"{name}\n读取失败: {error}"),
+                               name=f"浏览 {name}")
+        
+        def step(days):
+            try:
+                current = datetime.strptime(date_var.get(), '%Y-%m-%d')
+            except ValueError:
+                current = datetime.now()
+            date_var.set((current + timedelta(days=days)).strftime('%Y-%m-%d'))
+            load()
+        
+        tk.Button(nav, text="◀", command=lambda: step(-1)).pack(side=tk.LEFT)
+        entry = tk.Entry(nav, textvariable=date_var, width=12)
+        entry.pack(side=tk.LEFT, padx=5)
+        entry.bind('<Return>', load)
+        tk.Button(nav, text="▶", command=lambda: step(1)).pack(side=tk.LEFT)
+        tk.Button(nav, text="显示", command=load).pack(side=tk.LEFT, padx=5)
+        load()
+        
+    def open_diagnostics(self):
+        """性能诊断窗口：各操作的调用次数和耗时分布，以及本次会话最慢的调用"""
+        if hasattr(self, '_perf_win') and self._perf_win.winfo_exists():
+            self._perf_win.lift()
+            return
+        
+        self._perf_win = tk.Toplevel(self.root)
+        self._perf_win.title("性能诊断")
+        self._perf_win.geometry("760x520")
+        
+        enabled_var = tk.BooleanVar(value=perf.is_enabled())
+        top_frame = tk.Frame(self._perf_win)
+        top_frame.pack(fill=tk.X, padx=10, pady=5)
+        tk.Checkbutton(top_frame, text=f"记录耗时（也可设置环境变量 {perf.ENV_VAR}=1）", variable=enabled_var,
+                       command=lambda: perf.set_enabled(enabled_var.get())).pack(side=tk.LEFT)
+        
+        columns = ('count', 'mean', 'p50', 'p95', 'max', 'total')
+        headings = ('次数', '平均(ms)', 'P50(ms)', 'P95(ms)', '最大(ms)', '合计(ms)')
+        operations = ttk.Treeview(self._perf_win, columns=columns, height=12)
+        operations.heading('#0', text='操作')
+        operations.column('#0', width=200)
+        for column, heading in zip(columns, headings):
+            operations.heading(column, text=heading)
+            operations.column(column, width=80, anchor=tk.E)
+        operations.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        tk.Label(self._perf_win, text="最慢的调用:").pack(anchor=tk.W, padx=10)
+        slowest = tk.Listbox(self._perf_win, height=8)
+        slowest.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        def refresh():
+            if not self._perf_win.winfo_exists():
+                return
+            snapshot = perf.registry.snapshot()
+            operations.delete(*operations.get_children())
+            for stats in snapshot['operations']:
+                operations.insert('', tk.END, text=stats['name'], values=(
+                    stats['count'], f"{stats['mean_ms']:.2f}", stats['p50_ms'], stats['p95_ms'],
+                    f"{stats['max_ms']:.1f}", f"{stats['total_ms']:.0f}"))
+            slowest.delete(0, tk.END)
+            for call in snapshot['slowest']:
+                detail = f"  {call['detail']}" if call['detail'] else ''
+                slowest.insert(tk.END, f"{call['at']}  {call['ms']:>9.1f} ms  {call['name']}{detail}")
+        
+        def auto_refresh():
+            if self._perf_win.winfo_exists():
+                refresh()
+                self._perf_win.after(2000, auto_refresh)
+        
+        def dump():
+            path = filedialog.asksaveasfilename(
+                title="导出性能数据", parent=self._perf_win,
+                initialfile=f"perf_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                defaultextension='.json', filetypes=[("JSON", "*.json")])
+            if path:
+                try:
+                    perf.registry.dump_json(path)
+                except OSError as e:
+                    messagebox.showerror("错误", f"导出失败: {e}", parent=self._perf_win)
+        
+        def reset():
+            perf.registry.reset()
+            refresh()
+        
+        btn_frame = tk.Frame(self._perf_win)
+        btn_frame.pack(pady=10)
+        tk.Button(btn_frame, text="导出JSON", command=dump).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="清空", command=reset).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="关闭", command=self._perf_win.destroy).pack(side=tk.LEFT, padx=5)
+        auto_refresh()
+        
+    def export_summary(self):
+        """按日期区间和分类导出工作总结"""
+        today = date.today()
+        quarter_start = date(today.year, (today.month - 1) // 3 * 3 + 1, 1)
+        start = simpledialog.askstring("工作总结", "开始日期(YYYY-MM-DD):",
+                                       initialvalue=quarter_start.strftime('%Y-%m-%d'))
+        if not start:
+            return
+        end = simpledialog.askstring("工作总结", "结束日期(YYYY-MM-DD):",
+                                     initialvalue=today.strftime('%Y-%m-%d'))
+        if not end:
+            return
+        try:
+            datetime.strptime(start, '%Y-%m-%d')
+            datetime.strptime(end, '%Y-%m-%d')
+        except ValueError:
+            messagebox.showerror("错误", "日期格式不正确，请使用YYYY-MM-DD格式")
+            return
+        
+        tag_text = simpledialog.askstring("工作总结", "分类(多个用逗号分隔，留空表示全部):")
+        if tag_text is None:
+            return
+        tags = [tag.strip() for tag in tag_text.replace('，', ',').split(',') if tag.strip()]
+        
+        path = filedialog.asksaveasfilename(
+            title="导出工作总结",
+            initialfile=f"工作总结_{start}_{end}.md",
+            defaultextension='.md',
+            filetypes=[("Markdown", "*.md"), ("HTML", "*.html"), ("CSV", "*.csv")]
+        )
+        if not path:
+            return
+        fmt = {'.html': 'html', '.htm': 'html', '.csv': 'csv'}.get(
+            os.path.splitext(path)[1].lower(), 'markdown')
+        
+        self.io.submit(lambda task: self.core.export_report(path, fmt, start, end, tags),
+                       lambda result: messagebox.showinfo("成功", f"工作总结已导出到: {path}"),
+                       self._show_io_error, name="导出工作总结")
+        
+    def open_bulk_io(self):
+        """批量导入导出窗口：JSONL、CSV 或 Markdown 文件夹（每天一个 .md 文件）"""
+        if hasattr(self, '_bulk_win') and self._bulk_win.winfo_exists():
+            self._bulk_win.lift()
+            return
+        
+        self._bulk_win = tk.Toplevel(self.root)
+        self._bulk_win.title("批量导入导出")
+        self._bulk_win.geometry("560x400")
+        
+        format_var = tk.StringVar(value='jsonl')
+        dry_run_var = tk.BooleanVar(value=True)
+        skip_var = tk.BooleanVar(value=False)
+        option_frame = tk.Frame(self._bulk_win)
+        option_frame.pack(fill=tk.X, padx=10, pady=5)
+        tk.Label(option_frame, text="格式:").pack(side=tk.LEFT)
+        for value, label in (('jsonl', "JSONL"), ('csv', "CSV"), ('markdown', "Markdown 文件夹")):
+            tk.Radiobutton(option_frame, text=label, variable=format_var, value=value).pack(side=tk.LEFT)
+        check_frame = tk.Frame(self._bulk_win)
+        check_frame.pack(fill=tk.X, padx=10)
+        tk.Checkbutton(check_frame, text="只检查冲突，不写入", variable=dry_run_var).pack(side=tk.LEFT)
+        tk.Checkbutton(check_frame, text="已有计划的日期保留原内容", variable=skip_var).pack(side=tk.LEFT, padx=10)
+        
+        report_text = tk.Text(self._bulk_win, height=12)
+        report_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        def show_report(text):
+            if report_text.winfo_exists():
+                report_text.delete(1.0, tk.END)
+                report_text.insert(tk.END, text)
+        
+        def choose_path(for_import):
+            fmt = format_var.get()
+            if fmt == 'markdown':
+                return filedialog.askdirectory(title="选择文件夹", parent=self._bulk_win)
+            filetypes = [("JSON Lines", "*.jsonl")] if fmt == 'jsonl' else [("CSV", "*.csv")]
+            if for_import:
+                return filedialog.askopenfilename(title="选择导入文件", filetypes=filetypes, parent=self._bulk_win)
+            return filedialog.asksaveasfilename(title="导出到", initialfile=f"plans.{fmt}",
+                                                defaultextension=f".{fmt}", filetypes=filetypes,
+                                                parent=self._bulk_win)
+        
+        def run_import():
+            path = choose_path(True)
+            if not path:
+                return
+            fmt, dry_run, skip_existing = format_var.get(), dry_run_var.get(), skip_var.get()
+            
+            def done(result):
+                lines = [f"读取 {result['read']} 天，{'将导入' if dry_run else '已导入'} {result['imported']} 天，"
+                         f"内容相同 {result['unchanged']} 天，跳过 {result['skipped']} 天"]
+                if result['conflicts_count']:
+                    lines.append(f"与已有计划冲突 {result['conflicts_count']} 天: {', '.join(result['conflicts'])}")
+                if result['new_tags']:
+                    lines.append(f"新增分类: {', '.join(result['new_tags'])}")
+                if result['errors_count']:
+                    lines.append(f"错误 {result['errors_count']} 条:")
+                    lines.extend(result['errors'])
+                show_report('\n'.join(lines))
+                if not dry_run:
+                    self.load_plan(quiet=True)
+            
+            def failed(error):
+                if isinstance(error, TransferCancelled):
+                    # 已经写入的批次保留，重新加载当前日期
+                    show_report("导入已取消，取消前读取的批次已导入" if not dry_run else "检查已取消")
+                    if not dry_run:
+                        self.load_plan(quiet=True)
+                else:
+                    self._show_io_error(error)
+            
+            self.io.submit(lambda task: import_plans(self.core, path, fmt, dry_run, skip_existing,
+                                                     progress=task.progress, cancelled=lambda: task.cancelled),
+                           done, failed, name="批量导入", serial=True, cancellable=True)
+        
+        def run_export():
+            path = choose_path(False)
+            if not path:
+                return
+            fmt = format_var.get()
+            
+            def failed(error):
+                if isinstance(error, TransferCancelled):
+                    show_report("导出已取消")
+                else:
+                    self._show_io_error(error)
+            
+            self.io.submit(lambda task: export_plans(self.core, path, fmt, progress=task.progress,
+                                                     cancelled=lambda: task.cancelled),
+                           lambda count: show_report(f"已导出 {count} 天的计划到: {path}"),
+                           failed, name="批量导出", cancellable=True)
+        
+        btn_frame = tk.Frame(self._bulk_win)
+        btn_frame.pack(pady=10)
+        tk.Button(btn_frame, text="导入", command=run_import).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="导出", command=run_export).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="关闭", command=self._bulk_win.destroy).pack(side=tk.LEFT, padx=5)
+        
+    def setup_reminder(self, reminders=None):
+        """按配置注册提醒任务，确保只创建一个定时线程；reminders 为空时在后台读取配置"""
+        if not hasattr(self, 'scheduler'):
+            self.reminders_file = os.path.join(self.data_dir, 'reminders.json')
+            self.scheduler = ReminderScheduler(
+                os.path.join(self.data_dir, 'reminder_state.json'))
+            self.scheduler.start()
+        if reminders is None:
+            self.io.submit(lambda task: load_reminders(self.reminders_file), self.setup_reminder,
+                           self._show_io_error, name="加载提醒")
+            return
+        
+        self.scheduler.clear()
+        for reminder in reminders:
+            if not reminder.get('enabled', True):
+                continue
+            try:
+                hour, minute = parse_reminder_time(reminder['time'])
+            except (KeyError, ValueError):
+                print(f"忽略格式错误的提醒: {reminder}")
+                continue
+            tag = reminder.get('tag')
+            self.scheduler.add_job(ScheduledJob(
+                reminder['name'],
+                daily_at(hour, minute, reminder.get('weekdays')),
+                lambda tag=tag: self.check_and_remind(tag)
+            ))
+        
+    def check_and_remind(self, tag=None):
+        """检查今天的计划并发送通知，指定 tag 时只提醒该分类的计划"""
+        today = date.today().strftime('%Y-%m-%d')
+        data = self.core.effective_plan(today)
+        
+        if tag and (data is None or data.get('tag') != tag):
+            return
+        from plyer import notification
+        if data is None:
+            notification.notify(
+                title="每日计划提醒",
+                message="今天是新的一天！请填写今天的计划",
+                timeout=10
+            )
+        elif data.get('recurring'):
+            notification.notify(
+                title="每日计划提醒",
+                message="今天还没有计划，例行事项:\n" + data['content'],
+                timeout=10
+            )
+        elif data.get('content', '').strip():
+            notification.notify(
+                title="今日计划提醒",
+                message="您今天有以下计划:\n" + data['content'],
+                timeout=10
+            )
+        else:
+            notification.notify(
+                title="每日计划提醒",
+                message="今天的计划是空的，请补充",
+                timeout=10
+            )
+
+    def open_search(self):
+        """全文搜索窗口，双击结果打开对应计划或模板"""
+        if hasattr(self, '_search_win') and self._search_win.winfo_exists():
+            self._search_win.lift()
+            return
+        
+        self._search_win = tk.Toplevel(self.root)
+        self._search_win.title("搜索计划和模板")
+        self._search_win.geometry("600x450")
+        
+        query_var = tk.StringVar()
+        entry_frame = tk.Frame(self._search_win)
+        entry_frame.pack(fill=tk.X, padx=10, pady=5)
+        entry = tk.Entry(entry_frame, textvariable=query_var)
+        entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        entry.focus_set()
+        
+        result_list = tk.Listbox(self._search_win)
+        result_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        results = []
+        
+        def run_search(event=None):
+            query = query_var.get()
+            
+            def show(found):
+                # 输入已经变化时丢弃过期的结果
+                if query != query_var.get() or not result_list.winfo_exists():
+                    return
+                results[:] = found
+                result_list.delete(0, tk.END)
+                for item in results:
+                    kind = "计划" if item['kind'] == 'plan' else "模板"
+                    result_list.insert(tk.END, f"[{kind}] {item['key']}  ({item['tag']})")
+                if not results and query.strip():
+                    result_list.insert(tk.END, "没有匹配的结果")
+            
+            self.io.submit(lambda task: self.search_index.search(query, limit=100), show)
+        
+        def open_result(event=None):
+            selection = result_list.curselection()
+            if not selection or selection[0] >= len(results):
+                return
+            item = results[selection[0]]
+            if item['kind'] == 'plan':
+                self.date_str.set(item['key'])
+                self.load_plan()
+            else:
+                category, template_name = item['key'].split('/', 1)
+                self._load_template_file(category, template_name)
+        
+        # 输入时即时搜索
+        query_var.trace_add('write', lambda *args: run_search())
+        tk.Button(entry_frame, text="搜索", command=run_search).pack(side=tk.LEFT, padx=5)
+        entry.bind('<Return>', run_search)
+        result_list.bind('<Double-Button-1>', open_result)
+
+    def manage_reminders(self):
+        """提醒设置窗口：添加、删除、启停提醒以及稍后提醒"""
+        if hasattr(self, '_reminder_win') and self._reminder_win.winfo_exists():
+            self._reminder_win.lift()
+            return
+        
+        self._reminder_win = tk.Toplevel(self.root)
+        self._reminder_win.title("提醒设置")
+        self._reminder_win.geometry("500x400")
+        
+        reminders = []
+        reminder_list = tk.Listbox(self._reminder_win)
+        reminder_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        def refresh():
+            if not self._reminder_win.winfo_exists():
+                return
+            reminder_list.delete(0, tk.END)
+            for reminder in reminders:
+                reminder_list.insert(tk.END, describe_reminder(reminder))
+        
+        def loaded(result):
+            reminders[:] = result
+            refresh()
+        
+        def apply():
+            # 写入配置的副本，后台写文件期间界面上的修改不影响本次写入
+            snapshot = [dict(reminder) for reminder in reminders]
+            
+            def saved(result):
+                self.setup_reminder(snapshot)
+                refresh()
+            
+            self.io.submit(lambda task: save_reminders(self.reminders_file, snapshot), saved,
+                           self._show_io_error, name="保存提醒", serial=True)
+        
+        def selected():
+            selection = reminder_list.curselection()
+            if not selection:
+                messagebox.showwarning("警告", "请先选择一个提醒", parent=self._reminder_win)
+                return None
+            return reminders[selection[0]]
+        
+        def add_reminder():
+            name = simpledialog.askstring("新提醒", "提醒名称:", parent=self._reminder_win)
+            if not name:
+                return
+            if any(reminder['name'] == name for reminder in reminders):
+                messagebox.showerror("错误", "已存在同名提醒", parent=self._reminder_win)
+                return
+            time_text = simpledialog.askstring("新提醒", "提醒时间(HH:MM):",
+                                               initialvalue="09:00", parent=self._reminder_win)
+            if not time_text:
+                return
+            try:
+                parse_reminder_time(time_text)
+            except ValueError:
+                messagebox.showerror("错误", "时间格式不正确，请使用HH:MM格式", parent=self._reminder_win)
+                return
+            days_text = simpledialog.askstring(
+                "新提醒", "星期(1-7，逗号分隔，留空表示每天):", parent=self._reminder_win)
+            if days_text is None:
+                return
+            try:
+                weekdays = sorted({int(day) - 1 for day in days_text.replace('，', ',').split(',') if day.strip()})
+            except ValueError:
+                weekdays = None
+            if weekdays and not all(0 <= day <= 6 for day in weekdays):
+                messagebox.showerror("错误", "星期必须在1到7之间", parent=self._reminder_win)
+                return
+            tag = simpledialog.askstring(
+                "新提醒", "只提醒该分类的计划(留空表示全部):", parent=self._reminder_win)
+            reminders.append({
+                'name': name,
+                'time': time_text.strip(),
+                'weekdays': weekdays or None,
+                'tag': tag.strip() if tag and tag.strip() else None,
+                'enabled': True,
+            })
+            apply()
+        
+        def delete_reminder():
+            reminder = selected()
+            if reminder is not None:
+                reminders.remove(reminder)
+                apply()
+        
+        def toggle_reminder():
+            reminder = selected()
+            if reminder is not None:
+                reminder['enabled'] = not reminder.get('enabled', True)
+                apply()
+        
+        def snooze_reminder():
+            reminder = selected()
+            if reminder is not None:
+                self.scheduler.snooze(reminder['name'], 10)
+                messagebox.showinfo("提示", "将在10分钟后再次提醒", parent=self._reminder_win)
+        
+        btn_frame = tk.Frame(self._reminder_win)
+        btn_frame.pack(pady=10)
+        tk.Button(btn_frame, text="添加", command=add_reminder).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="删除", command=delete_reminder).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="启用/停用", command=toggle_reminder).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="10分钟后提醒", command=snooze_reminder).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="关闭", command=self._reminder_win.destroy).pack(side=tk.LEFT, padx=5)
+        self.io.submit(lambda task: load_reminders(self.reminders_file), loaded, self._show_io_error,
+                       name="加载提醒")
+
+    def manage_recurring(self):
+        """例行计划窗口：按重复规则在没有计划的日期自动带出模板内容，可跳过某一天"""
+        if hasattr(self, '_recurring_win') and self._recurring_win.winfo_exists():
+            self._recurring_win.lift()
+            return
+        
+        self._recurring_win = tk.Toplevel(self.root)
+        self._recurring_win.title("例行计划")
+        self._recurring_win.geometry("620x400")
+        
+        book = self.core.recurrence
+        rules = []
+        rule_list = tk.Listbox(self._recurring_win)
+        rule_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        def show(result):
+            if not self._recurring_win.winfo_exists():
+                return
+            rules[:] = result
+            rule_list.delete(0, tk.END)
+            for rule in rules:
+                state = '' if rule.get('enabled', True) else '（已停用）'
+                source = f"模板 {rule['template']}" if rule.get('template') else "任务"
+                rule_list.insert(tk.END, f"{rule['name']}{state}  {describe_rule(rule)}  {source}")
+        
+        def refresh():
+            # 规则文件被外部修改时 rules() 会重新读取，放到后台执行
+            self.io.submit(lambda task: book.rules(), show, self._show_io_error, name="加载例行计划")
+        
+        def changed(result):
+            refresh()
+            # 当前日期可能受影响，没有计划时重新带出例行内容
+            self.load_plan(quiet=True)
+        
+        def run(operation, invalid_message=None):
+            """在串行通道中修改规则（每次都会写入规则文件），完成后刷新列表"""
+            def failed(error):
+                if isinstance(error, ValueError):
+                    messagebox.showerror("错误", invalid_message or str(error), parent=self._recurring_win)
+                else:
+                    self._show_io_error(error)
+            
+            self.io.submit(lambda task: operation(), changed, failed, name="修改例行计划", serial=True)
+        
+        def selected():
+            selection = rule_list.curselection()
+            if not selection:
+                messagebox.showwarning("警告", "请先选择一个例行计划", parent=self._recurring_win)
+                return None
+            return rules[selection[0]]
+        
+        def add_rule():
+            name = simpledialog.askstring("新例行计划", "名称:", parent=self._recurring_win)
+            if not name:
+                return
+            rule_text = simpledialog.askstring(
+                "新例行计划", "重复规则(每天、工作日、每周1,3、每月1,-1、每年，或 RRULE 如 FREQ=WEEKLY;BYDAY=MO):",
+                initialvalue="工作日", parent=self._recurring_win)
+            if not rule_text:
+                return
+            start = simpledialog.askstring("新例行计划", "开始日期(YYYY-MM-DD):",
+                                           initialvalue=self.date_str.get(), parent=self._recurring_win)
+            if not start:
+                return
+            template = simpledialog.askstring(
+                "新例行计划", "插入的模板(分类/模板名，留空表示插入以名称为内容的任务):", parent=self._recurring_win)
+            if template is None:
+                return
+            tag = simpledialog.askstring("新例行计划", "分类(留空使用默认分类):", parent=self._recurring_win)
+            run(lambda: book.add(name.strip(), rule_text, start, template.strip(), tag.strip() if tag else None))
+        
+        def delete_rule():
+            rule = selected()
+            if rule is not None and messagebox.askyesno("确认", f"删除例行计划 {rule['name']}？",
+                                                         parent=self._recurring_win):
+                run(lambda: book.remove(rule['id']))
+        
+        def toggle_rule():
+            rule = selected()
+            if rule is not None:
+                run(lambda: book.update(rule['id'], enabled=not rule.get('enabled', True)))
+        
+        def skip_day():
+            rule = selected()
+            if rule is None:
+                return
+            skip_date = simpledialog.askstring("跳过", "跳过哪一天(YYYY-MM-DD):",
+                                               initialvalue=self.date_str.get(), parent=self._recurring_win)
+            if not skip_date:
+                return
+            run(lambda: book.skip(rule['id'], skip_date), "日期格式不正确，请使用YYYY-MM-DD格式")
+        
+        btn_frame = tk.Frame(self._recurring_win)
+        btn_frame.pack(pady=10)
+        tk.Button(btn_frame, text="添加", command=add_rule).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="删除", command=delete_rule).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="启用/停用", command=toggle_rule).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="跳过某天", command=skip_day).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="关闭", command=self._recurring_win.destroy).pack(side=tk.LEFT, padx=5)
+        refresh()
+
+    def backup_data(self):
+        """在后台创建增量快照，只保存变化的计划和文件"""
+        def work(task):
+            return self.core.backup(task.progress, lambda: task.cancelled, self.BACKUP_KEEP_LAST)
+        
+        def failed(error):
+            if isinstance(error, BackupCancelled):
+                messagebox.showinfo("提示", "备份已取消")
+            else:
+                messagebox.showerror("错误", f"备份失败: {error}")
+        
+        def done(manifest):
+            messagebox.showinfo(
+                "成功",
+                f"已创建备份 {manifest['id']}\n"
+                f"计划 {len(manifest['plans'])} 天，文件 {len(manifest['files'])} 个，"
+                f"新增 {manifest['new_objects']} 项（{manifest['new_bytes'] // 1024} KB）")
+        
+        self.io.submit(work, done, failed, name="备份数据", cancellable=True)
+
+    def manage_backups(self):
+        """备份管理窗口：恢复到某个快照或清理旧快照"""
+        if hasattr(self, '_backup_win') and self._backup_win.winfo_exists():
+            self._backup_win.lift()
+            return
+        
+        repo = BackupRepository(self.data_dir)
+        self._backup_win = tk.Toplevel(self.root)
+        self._backup_win.title("备份管理")
+        self._backup_win.geometry("500x400")
+        
+        snapshot_list = tk.Listbox(self._backup_win)
+        snapshot_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        snapshots = []
+        
+        def refresh():
+            # 每个快照的清单都要读文件，放到后台读取，读完再填列表
+            def load(task):
+                return [(snapshot_id, repo.load_manifest(snapshot_id)) for snapshot_id in repo.list_snapshots()]
+            
+            def show(entries):
+                if not self._backup_win.winfo_exists():
+                    return
+                snapshots[:] = [snapshot_id for snapshot_id, _ in entries]
+                snapshot_list.delete(0, tk.END)
+                for _, manifest in entries:
+                    snapshot_list.insert(
+                        tk.END, f"{manifest['created']}  计划 {len(manifest['plans'])} 天  文件 {len(manifest['files'])} 个")
+            
+            self.io.submit(load, show, self._show_io_error, name="读取备份列表")
+        
+        def restore():
+            selection = snapshot_list.curselection()
+            if not selection:
+                messagebox.showwarning("警告", "请先选择一个备份", parent=self._backup_win)
+                return
+            snapshot_id = snapshots[selection[0]]
+            if not messagebox.askyesno(
+                    "确认", "恢复会覆盖当前的计划和模板，恢复前会自动备份当前数据。是否继续？",
+                    parent=self._backup_win):
+                return
+            
+            def work(task):
+                repo.create_snapshot(self.store)
+                repo.restore_snapshot(snapshot_id, self.store, task.progress)
+                self.core.rebuild_search_index()
+            
+            def done(result):
+                self.reload_views()
+                if self._backup_win.winfo_exists():
+                    refresh()
+                messagebox.showinfo("成功", "数据已恢复")
+            
+            # 先保存编辑器中的修改，它们会进入恢复前自动创建的快照
+            self.autosaver.flush()
+            self.io.submit(work, done, lambda error: messagebox.showerror("错误", f"恢复失败: {error}"),
+                           name="恢复备份", serial=True)
+        
+        def prune():
+            keep = simpledialog.askinteger("清理备份", "保留最近的备份数量:",
+                                           initialvalue=self.BACKUP_KEEP_LAST, minvalue=1,
+                                           parent=self._backup_win)
+            if keep is None:
+                return
+            def done(freed):
+                if self._backup_win.winfo_exists():
+                    refresh()
+                messagebox.showinfo("成功", f"已释放 {freed // 1024} KB")
+            
+            self.io.submit(lambda task: repo.prune(keep), done, self._show_io_error, name="清理备份")
+        
+        def archive():
+            days = simpledialog.askinteger("归档旧计划", "归档多少天以前的计划:",
+                                           initialvalue=DEFAULT_ARCHIVE_AGE_DAYS, minvalue=1,
+                                           parent=self._backup_win)
+            if days is None:
+                return
+            def done(result):
+                messagebox.showinfo("成功", f"已归档 {result['archived_days']} 天的计划，"
+                                            f"节省 {result['bytes_saved'] // 1024} KB")
+            
+            self.io.submit(lambda task: self.core.compact(days), done, self._show_io_error,
+                           name="归档旧计划", serial=True)
+        
+        btn_frame = tk.Frame(self._backup_win)
+        btn_frame.pack(pady=10)
+        tk.Button(btn_frame, text="恢复到此备份", command=restore).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="清理旧备份", command=prune).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="归档旧计划", command=archive).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="关闭", command=self._backup_win.destroy).pack(side=tk.LEFT, padx=5)
+        refresh()
+
+    def load_tags(self):
+        """加载所有可用标签（来自内存中的标签注册表）"""
+        return self.tag_registry.tags()
+        
+    def save_tags(self, tags):
+        """保存标签列表"""
+        self.tag_registry.save(tags)
+            
+    def add_new_tag(self):
+        """添加新分类标签"""
+        from tkinter import simpledialog
+        new_tag = simpledialog.askstring("新分类", "输入新分类名称:")
+        if new_tag and new_tag.strip():
+            new_tag = new_tag.strip()
+            if self.tag_registry.add(new_tag):
+                self.tag_combobox.config(values=self.load_tags())
+                self.tag_var.set(new_tag)
+    
+    def manage_tags(self):
+        """分类管理窗口：重命名、合并、删除分类，并同步改写计划和模板"""
+        if hasattr(self, '_tag_win') and self._tag_win.winfo_exists():
+            self._tag_win.lift()
+            return
+        
+        self._tag_win = tk.Toplevel(self.root)
+        self._tag_win.title("分类管理")
+        self._tag_win.geometry("360x400")
+        
+        tag_list = tk.Listbox(self._tag_win, selectmode=tk.EXTENDED)
+        tag_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        def refresh():
+            tag_list.delete(0, tk.END)
+            for tag in self.load_tags():
+                tag_list.insert(tk.END, tag)
+            self.tag_combobox.config(values=self.load_tags())
+        
+        def selected_tags():
+            tags = [tag_list.get(i) for i in tag_list.curselection()]
+            if not tags:
+                messagebox.showwarning("警告", "请先选择分类", parent=self._tag_win)
+            return tags
+        
+        def finish(changed, old_tags, new_tag):
+            if self.tag_var.get() in old_tags:
+                self.tag_var.set(new_tag)
+            # 计划的索引已随写入更新，模板换了分类目录，后台重建搜索索引和模板库索引
+            self.rebuild_search_index()
+            self.io.submit(lambda task: self.template_catalog.refresh(), name="刷新模板库")
+            self.tag_combobox.config(values=self.load_tags())
+            if self._tag_win.winfo_exists():
+                refresh()
+                messagebox.showinfo("成功", f"已更新 {changed} 天的计划", parent=self._tag_win)
+        
+        def run(operation, old_tags, new_tag):
+            # 改写计划和移动模板目录可能很慢，放到串行队列中执行，与保存计划互不交错
+            self.io.submit(lambda task: operation(), lambda changed: finish(changed, old_tags, new_tag),
+                           self._show_io_error, name="修改分类", serial=True)
+        
+        def rename_tag():
+            tags = selected_tags()
+            if len(tags) != 1:
+                if tags:
+                    messagebox.showwarning("警告", "重命名时只能选择一个分类", parent=self._tag_win)
+                return
+            new_tag = simpledialog.askstring("重命名分类", "新名称:", initialvalue=tags[0], parent=self._tag_win)
+            if not new_tag or not new_tag.strip() or new_tag.strip() == tags[0]:
+                return
+            new_tag = new_tag.strip()
+            if new_tag in self.load_tags() and not messagebox.askyesno(
+                    "确认", f"分类'{new_tag}'已存在，是否合并？", parent=self._tag_win):
+                return
+            run(lambda: self.core.rename_tag(tags[0], new_tag), tags, new_tag)
+        
+        def merge_tags():
+            tags = selected_tags()
+            if len(tags) < 2:
+                if tags:
+                    messagebox.showwarning("警告", "请至少选择两个分类", parent=self._tag_win)
+                return
+            target = simpledialog.askstring("合并分类", "合并后的分类名称:", initialvalue=tags[0], parent=self._tag_win)
+            if not target or not target.strip():
+                return
+            target = target.strip()
+            run(lambda: self.core.merge_tags(tags, target), tags, target)
+        
+        def delete_tag():
+            tags = selected_tags()
+            if len(tags) != 1:
+                if tags:
+                    messagebox.showwarning("警告", "删除时只能选择一个分类", parent=self._tag_win)
+                return
+            remaining = [tag for tag in self.load_tags() if tag != tags[0]]
+            if not remaining:
+                messagebox.showerror("错误", "至少需要保留一个分类", parent=self._tag_win)
+                return
+            if not messagebox.askyesno(
+                    "确认", f"删除分类'{tags[0]}'后，其计划和模板将归入'{remaining[0]}'。是否继续？",
+                    parent=self._tag_win):
+                return
+            run(lambda: self.core.delete_tag(tags[0]), tags, remaining[0])
+        
+        btn_frame = tk.Frame(self._tag_win)
+        btn_frame.pack(pady=10)
+        tk.Button(btn_frame, text="重命名", command=rename_tag).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="合并", command=merge_tags).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="删除", command=delete_tag).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="关闭", command=self._tag_win.destroy).pack(side=tk.LEFT, padx=5)
+        refresh()
+                
+    def insert_markdown_test(self):
+        """插入Markdown测试内容"""
+        test_content = """# 每日计划测试案例
+        
+
+## 今日重点
+- [x] 完成项目设计文档
+- [ ] 代码评审
+- [ ] 团队会议
+
+## 任务详情
+1. **核心功能开发**
+   - 用户认证模块
+   - 数据可视化组件
+   - `API`接口调试
+
+2. *次要任务*
+   - 回复客户邮件
+   - 更新项目进度表
+
+## 代码示例
+```python
+def hello_world():
+    print("Hello, Markdown!")
+```
+
+## 注意事项
+> 重要提示：明天上午10点有客户演示
+
+[项目文档链接](https://example.com)"""
+        
+        self.text.delete(1.0, tk.END)
+        self.text.insert(tk.END, test_content)
+        
+    def preview_markdown(self):
+        """预览Markdown格式内容"""
+        content = self.text.get(1.0, tk.END)
+        
+        def work(task):
+            return self.preview_file.write(render_page(self.renderer.render(content)))
+            
+        # 在浏览器中打开
+        self.io.submit(work, lambda path: webbrowser.open(self.preview_file.url()),
+                       self._show_io_error, name="预览")
+        
+    def toggle_live_preview(self):
+        """开关实时预览：优先在窗口内并排显示，缺少 tkhtmlview 时改为自动刷新的浏览器页面"""
+        if not self.live_preview_var.get():
+            if self.preview_pane is not None:
+                self.editor_pane.forget(self.preview_pane)
+                self.preview_pane.destroy()
+                self.preview_pane = None
+            return
+        
+        try:
+            from tkhtmlview import HTMLScrolledText
+        except ImportError:
+            HTMLScrolledText = None
+        if HTMLScrolledText is not None:
+            self.preview_pane = HTMLScrolledText(self.editor_pane, html='')
+            self.editor_pane.add(self.preview_pane, stretch='always')
+            self.refresh_live_preview()
+        else:
+            self.refresh_live_preview(open_browser=True)
+        
+    def schedule_live_preview(self):
+        """编辑时延迟刷新实时预览，连续输入只刷新一次"""
+        if not self.live_preview_var.get():
+            return
+        if self._live_preview_job is not None:
+            self.root.after_cancel(self._live_preview_job)
+        self._live_preview_job = self.root.after(400, self.refresh_live_preview)
+        
+    def refresh_live_preview(self, open_browser=False):
+        self._live_preview_job = None
+        content = self.text.get(1.0, tk.END)
+        
+        def show(body):
+            if self.preview_pane is not None:
+                self.preview_pane.set_html(body)
+        
+        def work(task):
+            body = self.renderer.render(content)
+            if self.preview_pane is None:
+                self.preview_file.write(render_page(body, refresh_seconds=2))
+            return body
+        
+        def done(body):
+            show(body)
+            if open_browser:
+                webbrowser.open(self.preview_file.url())
+        
+        self.io.submit(work, done, self._show_io_error, name="实时预览")
+        
+    def import_to_template(self):
+        content = self.text.get(1.0, tk.END).strip()
+        if not content:
+            messagebox.showwarning("警告", "当前内容为空，无法创建模板")
+            return
+        
+        template_name = simpledialog.askstring("创建模板", "输入模板名称:")
+        if not template_name:
+            return
+        
+        category = simpledialog.askstring("选择分类", "输入模板分类:", 
+                 initialvalue="工作")
+        if not category:
+            return
+        
+        self._write_template(category, template_name, content,
+                             lambda result: messagebox.showinfo("成功", f"模板'{template_name}'已创建"))
+        
+    def _write_template(self, category, template_name, content, on_done):
+        """在后台写入模板文件并更新索引"""
+        self.io.submit(lambda task: self.core.write_template(category, template_name, content), on_done, self._show_io_error, name="保存模板")
+        
+    def get_categories(self):
+        """获取所有可用分类"""
+        return self.load_tags() # 可以改为从配置文件读取
+
+    def validate_category(self, category):
+        """验证分类是否有效"""
+        return category in self.get_categories()
+
+    def manage_templates(self):
+        """模板管理窗口"""
+        # 防止重复创建窗口
+        if hasattr(self, '_template_win') and self._template_win.winfo_exists():
+            self._template_win.lift()
+            return
+
+        self._template_win = tk.Toplevel(self.root)
+        self._template_win.title("模板库管理")
+        self._template_win.geometry("800x600")
+        
+        # 使用统一分类管理
+        categories = self.load_tags()
+        current_category = self.tag_var.get() if self.validate_category(self.tag_var.get()) \
+                         else self.get_categories()[0]
+        self.template_category = tk.StringVar(value=current_category)
+        
+        # 分类选择区域
+        category_frame = tk.Frame(self._template_win)
+        category_frame.pack(fill=tk.X, padx=10, pady=5)
+        tk.Label(category_frame, text="分类:").pack(side=tk.LEFT)
+        
+        for cat in categories:
+            tk.Radiobutton(
+                category_frame,
+                text=cat,
+                variable=self.template_category,
+                value=cat,
+                command=self.refresh_template_list
+            ).pack(side=tk.LEFT, padx=5)
+        
+        # 搜索框，输入时即时过滤
+        search_frame = tk.Frame(self._template_win)
+        search_frame.pack(fill=tk.X, padx=10, pady=5)
+        tk.Label(search_frame, text="搜索:").pack(side=tk.LEFT)
+        self.template_search = tk.StringVar()
+        tk.Entry(search_frame, textvariable=self.template_search).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.template_search.trace_add('write', lambda *args: self.refresh_template_list())
+        
+        # 模板列表区域
+        list_frame = tk.Frame(self._template_win)
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        scrollbar = tk.Scrollbar(list_frame)
+        self.template_list = tk.Listbox(
+            list_frame, 
+            yscrollcommand=scrollbar.set,
+            selectmode=tk.SINGLE
+        )
+        scrollbar.config(command=self.template_list.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.template_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        # 选中模板时显示开头部分的预览
+        self.template_preview = tk.Text(list_frame, wrap=tk.WORD, width=40)
+        self.template_preview.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(10, 0))
+        self.template_list.bind('<<ListboxSelect>>', self.show_template_preview)
+        
+        # 添加右键菜单
+        #self.template_menu = tk.Menu(self.template_list, tearoff=0)
+        #self.template_menu.add_command(label="预览", command=self.preview_selected_template)
+        #self.template_list.bind("<Button-3>", self.show_template_menu)
+        
+        # 操作按钮区域
+        btn_frame = tk.Frame(self._template_win)
+        btn_frame.pack(pady=10)
+        
+        tk.Button(btn_frame, text="导出到计划", command=self.load_template).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="批量应用", command=self.apply_template_range).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="删除模板", command=self.delete_template).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="关闭", command=self._template_win.destroy).pack(side=tk.LEFT, padx=5)
+        
+        # 初始刷新模板列表，然后在后台检查磁盘上是否有外部修改
+        self.refresh_template_list()
+        
+        def refreshed(changed):
+            if changed and self._template_win.winfo_exists():
+                self.refresh_template_list()
+        
+        self.io.submit(lambda task: self.template_catalog.refresh(), refreshed, name="刷新模板库")
+    def refresh_template_list(self):
+        """刷新模板列表，支持搜索功能"""
+        if not hasattr(self, 'template_list'):
+            return
+            
+        self.template_list.delete(0, tk.END)
+        category = self.template_category.get()
+        search_term = getattr(self, 'template_search', tk.StringVar()).get().lower()
+        
+        if not self.validate_category(category):
+            category = self.get_categories()[0]
+            self.template_category.set(category)
+        
+        def show(templates):
+            # 窗口已关闭或已切换到其他分类时丢弃结果
+            if not self.template_list.winfo_exists() or self.template_category.get() != category:
+                return
+            self.template_list.delete(0, tk.END)
+            for template in templates:
+                self.template_list.insert(tk.END, template)
+            if self.template_list.size() == 0:
+                self.template_list.insert(tk.END, "该分类下暂无模板")
+        
+        if self.template_catalog.ready:
+            show(self.template_catalog.list(category, search_term))
+        else:
+            # 模板库索引尚未建好时先在后台建立
+            def work(task):
+                if not self.template_catalog.ready:
+                    self.template_catalog.build()
+                return self.template_catalog.list(category, search_term)
+            
+            self.io.submit(work, show, lambda e: print(f"加载模板错误: {e}"), name="加载模板列表")
+            
+    def show_template_preview(self, event=None):
+        """显示选中模板的预览"""
+        if not hasattr(self, 'template_preview'):
+            return
+            
+        selection = self.template_list.curselection()
+        if not selection:
+            return
+            
+        template_name = self.template_list.get(selection[0])
+        category = self.template_category.get()
+        
+        # 预览片段来自模板库索引，不读磁盘
+        content = self.template_catalog.preview(category, template_name)
+        self.template_preview.delete(1.0, tk.END)
+        if content is not None:
+            self.template_preview.insert(tk.END, content)
+            
+    def preview_selected_template(self):
+        """预览选中的完整模板"""
+        selection = self.template_list.curselection()
+        if not selection:
+            messagebox.showwarning("警告", "请先选择一个模板")
+            return
+            
+        template_name = self.template_list.get(selection[0])
+        category = self.template_category.get()
+        
+        def work(task):
+            content = self.template_catalog.content(category, template_name)
+            return self.preview_file.write(render_page(self.renderer.render(content), title=template_name))
+                
+        # 在浏览器中打开
+        self.io.submit(work, lambda path: webbrowser.open(self.preview_file.url()),
+                       lambda e: messagebox.showerror("错误", f"预览模板失败: {str(e)}"),
+                       name="预览模板")
+    
+    def save_as_template(self, content):
+        """保存当前内容为模板"""
+        template_name = simpledialog.askstring("新建模板", "输入模板名称:")
+        if not template_name:
+            return
+            
+        category = self.template_category.get()
+        
+        def done(result):
+            self.refresh_template_list()
+            messagebox.showinfo("成功", "模板保存成功")
+        
+        self._write_template(category, template_name, content, done)
+    
+    def load_template(self):
+        """加载模板到当前编辑器"""
+        selection = self.template_list.curselection()
+        if not selection:
+            messagebox.showwarning("警告", "请先选择一个模板")
+            return
+            
+        template_name = self.template_list.get(selection[0])
+        category = self.template_category.get()
+        self._load_template_file(category, template_name)
+    
+    def _load_template_file(self, category, template_name):
+        """按当前日期渲染模板（编译结果有缓存），有自定义字段时先询问，渲染后替换编辑器内容"""
+        plan_date = self.current_date or self.date_str.get()
+        tag = self.tag_var.get()
+        
+        def show(content):
+            self.text.delete(1.0, tk.END)
+            self.text.insert(tk.END, content)
+        
+        def ask_fields(compiled):
+            fields = {}
+            for name, default in compiled.custom_fields():
+                value = simpledialog.askstring("模板字段", f"{name}:", initialvalue=default or '')
+                if value is None:
+                    return
+                fields[name] = value
+            self.io.submit(lambda task: self.core.render_template(category, template_name, plan_date, fields, tag),
+                           show, self._show_io_error, name="加载模板", serial=True)
+        
+        self.io.submit(lambda task: self.core.template_engine.compile(category, template_name),
+                       ask_fields, self._show_io_error, name="加载模板")
+    
+    def apply_template_range(self):
+        """把选中的模板批量应用到一段日期：先预览每天的变化，确认后一次写入"""
+        selection = self.template_list.curselection()
+        if not selection:
+            messagebox.showwarning("警告", "请先选择一个模板")
+            return
+        template_name = self.template_list.get(selection[0])
+        category = self.template_category.get()
+        if hasattr(self, '_apply_win') and self._apply_win.winfo_exists():
+            self._apply_win.destroy()
+        
+        self._apply_win = win = tk.Toplevel(self.root)
+        win.title(f"批量应用模板 {category}/{template_name}")
+        win.geometry("720x520")
+        
+        first, last = next_month()
+        start_var, end_var = tk.StringVar(value=first), tk.StringVar(value=last)
+        workdays_var = tk.BooleanVar(value=True)
+        mode_var = tk.StringVar(value='skip')
+        fields_var = tk.StringVar()
+        range_frame = tk.Frame(win)
+        range_frame.pack(fill=tk.X, padx=10, pady=5)
+        tk.Label(range_frame, text="从").pack(side=tk.LEFT)
+        tk.Entry(range_frame, textvariable=start_var, width=11).pack(side=tk.LEFT, padx=5)
+        tk.Label(range_frame, text="到").pack(side=tk.LEFT)
+        tk.Entry(range_frame, textvariable=end_var, width=11).pack(side=tk.LEFT, padx=5)
+        tk.Checkbutton(range_frame, text="只包含工作日", variable=workdays_var).pack(side=tk.LEFT, padx=5)
+        mode_frame = tk.Frame(win)
+        mode_frame.pack(fill=tk.X, padx=10)
+        tk.Label(mode_frame, text="已有计划的日期:").pack(side=tk.LEFT)
+        for value, label in (('skip', "保留原计划"), ('append', "追加到末尾"), ('replace', "替换")):
+            tk.Radiobutton(mode_frame, text=label, variable=mode_var, value=value).pack(side=tk.LEFT)
+        fields_frame = tk.Frame(win)
+        fields_frame.pack(fill=tk.X, padx=10, pady=5)
+        tk.Label(fields_frame, text="自定义字段(名称=值，分号分隔):").pack(side=tk.LEFT)
+        tk.Entry(fields_frame, textvariable=fields_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        
+        body = tk.PanedWindow(win, orient=tk.HORIZONTAL)
+        body.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        change_list = tk.Listbox(body, width=28)
+        preview = tk.Text(body, wrap=tk.WORD)
+        body.add(change_list)
+        body.add(preview)
+        summary_label = tk.Label(win, text="", anchor=tk.W)
+        summary_label.pack(fill=tk.X, padx=10)
+        changes = []
+        
+        def fill_fields(compiled):
+            if win.winfo_exists() and not fields_var.get():
+                fields_var.set('; '.join(f"{name}={default or ''}" for name, default in compiled.custom_fields()))
+        
+        def options():
+            try:
+                dates = date_range(validate_date(start_var.get()), validate_date(end_var.get()), workdays_var.get())
+            except ValueError as e:
+                messagebox.showerror("错误", f"日期不正确: {e}", parent=win)
+                return None
+            fields = {}
+            for item in fields_var.get().replace('；', ';').split(';'):
+                key, sep, value = item.partition('=')
+                if sep and key.strip():
+                    fields[key.strip()] = value.strip()
+            return dates, fields, mode_var.get()
+        
+        def show_changes(found):
+            if not win.winfo_exists():
+                return
+            changes[:] = found
+            change_list.delete(0, tk.END)
+            for change in changes:
+                change_list.insert(tk.END, f"{change['date']}  {ACTION_NAMES[change['action']]}")
+            written = sum(change['action'] not in (ACTION_SKIP, ACTION_UNCHANGED) for change in changes)
+            summary_label.config(text=f"将写入 {written} 天，共 {len(changes)} 天")
+        
+        def on_select(event=None):
+            selection = change_list.curselection()
+            if selection and selection[0] < len(changes):
+                change = changes[selection[0]]
+                preview.delete(1.0, tk.END)
+                preview.insert(tk.END, change['content'])
+        
+        def run(dry_run):
+            chosen = options()
+            if chosen is None:
+                return
+            dates, fields, mode = chosen
+            if not dry_run and not messagebox.askyesno(
+                    "确认", f"把模板应用到 {len(dates)} 天？覆盖的内容会保留在历史版本中。", parent=win):
+                return
+            if not dry_run:
+                self.autosaver.flush()
+            
+            def done(found):
+                show_changes(found)
+                if not dry_run:
+                    summary_label.config(text=f"已写入 {sum(c['action'] not in (ACTION_SKIP, ACTION_UNCHANGED) for c in found)} 天")
+                    self.load_plan(quiet=True)
+            
+            self.io.submit(lambda task: self.core.apply_template(category, template_name, dates, fields, mode,
+                                                                 dry_run=dry_run),
+                           done, self._show_io_error, name="预览模板" if dry_run else "批量应用模板", serial=True)
+        
+        change_list.bind('<<ListboxSelect>>', on_select)
+        btn_frame = tk.Frame(win)
+        btn_frame.pack(pady=10)
+        tk.Button(btn_frame, text="预览", command=lambda: run(True)).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="应用", command=lambda: run(False)).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="关闭", command=win.destroy).pack(side=tk.LEFT, padx=5)
+        self.io.submit(lambda task: self.core.template_engine.compile(category, template_name),
+                       fill_fields, self._show_io_error, name="加载模板")
+    
+    def delete_template(self):
+        """删除选中的模板"""
+        selection = self.template_list.curselection()
+        if not selection:
+            messagebox.showwarning("警告", "请先选择一个模板")
+            return
+            
+        template_name = self.template_list.get(selection[0])
+        category = self.template_category.get()
+        def done(removed):
+            if removed:
+                self.refresh_template_list()
+                messagebox.showinfo("成功", "模板已删除")
+        
+        self.io.submit(lambda task: self.core.delete_template(category, template_name),
+                       done, self._show_io_error, name="删除模板")
+
+def main():
+    """创建主窗口并进入事件循环，退出时保存并释放资源"""
+    root = tk.Tk()
+    app = DailyPlanner(root)
+    root.mainloop()
+    app.io.shutdown()
+    app.core.close()
+    shared_cache.close()
@@ -0,0 +1,206 @@
+
+# 标准库导入
+import os
+import re
+import html
+import zlib
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+# 本地模块导入
+from fileutil import atomic_write
+from perf import timed
+
+PAGE_STYLE = """
+        body { font-family: Arial; margin: 20px; }
+        h1 { color: #333; }
+        ul, ol { margin-left: 20px; }
+        code { background: #f0f0f0; padding: 2px 5px; }
+        pre { background: #f0f0f0; padding: 10px; }
+"""
+
+FENCE_PATTERN = re.compile(r'^\s*(```|~~~)')
+# 顶格的 ATX 标题，前面有空行时会结束之前的列表、引用和段落
+HEADING_PATTERN = re.compile(r'^#{1,6}(\s|$)')
+# 引用式链接的定义（[ref]: url）对全文生效，行首的 HTML 块可以跨越标题，含有它们时不能分片渲染
+UNSPLITTABLE_PATTERN = re.compile(r'^ {0,3}(\[[^\]\n]+\]:|<[A-Za-z!/?])', re.MULTILINE)
+
+
+def content_key(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class HtmlCache:
+    """按内容哈希缓存渲染结果的 LRU，总大小超过上限时淘汰最久未用的条目"""
+
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._items[key] = value
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+
+def split_blocks(text):
+    """把 Markdown 切成可以各自独立渲染的块
+
+    只在代码块之外、前面是空行的顶格标题处切分：标题会结束之前的列表和段落，
+    切开后每块的渲染结果与整篇渲染时相同，有序列表的编号也不会被打断。
+    """
+    blocks, current, in_fence, after_blank = [], [], False, True
+    for line in text.splitlines():
+        if not in_fence and after_blank and HEADING_PATTERN.match(line):
+            block = '\n'.join(current).strip('\n')
+            if block:
+                blocks.append(block)
+            current = []
+        if FENCE_PATTERN.match(line):
+            in_fence = not in_fence
+        after_blank = not line.strip() and not in_fence
+        current.append(line)
+    block = '\n'.join(current).strip('\n')
+    if block:
+        blocks.append(block)
+    return blocks
+
+
+def group_blocks(blocks, boundary_mod=8, max_chars=16 * 1024):
+    """把相邻的块合并成片段，按块内容决定分界点
+
+    分界点只取决于块自身的内容，局部修改不会让后面所有片段的边界都移动，
+    未修改的片段仍能命中缓存；合并后也减少了渲染器的调用次数。
+    """
+    chunk, size = [], 0
+    for block in blocks:
+        chunk.append(block)
+        size += len(block)
+        if zlib.crc32(block.encode('utf-8')) % boundary_mod == 0 or size >= max_chars:
+            yield '\n\n'.join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield '\n\n'.join(chunk)
+
+
+class MarkdownRenderer:
+    """带缓存的 Markdown 渲染器
+
+    整篇内容先按哈希查缓存；超过 BLOCK_THRESHOLD 的大文档按标题分片渲染，
+    每个片段单独缓存，编辑时只有改动过的片段需要重新渲染。
+    含有引用式链接定义或 HTML 块的文档整篇渲染，定义才能作用到所有片段。
+    """
+
+    BLOCK_THRESHOLD = 20 * 1024
+
+    def __init__(self, cache=None):
+        self.cache = cache or HtmlCache()
+
+    @timed('preview.markdown')
+    def _render(self, text):
+        # markdown 库较重，第一次渲染时才导入
+        import markdown
+        return markdown.markdown(text, extensions=['fenced_code'])
+
+    def _render_cached(self, text):
+        key = content_key(text)
+        rendered = self.cache.get(key)
+        if rendered is None:
+            rendered = self._render(text)
+            self.cache.put(key, rendered)
+        return rendered
+
+    @timed('preview.render')
+    def render(self, text):
+        """把 Markdown 渲染为 HTML 片段"""
+        if len(text) < self.BLOCK_THRESHOLD or UNSPLITTABLE_PATTERN.search(text):
+            return self._render_cached(text)
+
+        key = content_key(text)
+        rendered = self.cache.get(key)
+        if rendered is None:
+            rendered = '\n'.join(
+                self._render_cached(chunk) for chunk in group_blocks(split_blocks(text)))
+            self.cache.put(key, rendered)
+        return rendered
+
+
+def render_page(body, title=None, refresh_seconds=None):
+    """包装成完整的 HTML 页面，refresh_seconds 用于浏览器中的实时预览自动刷新"""
+    head = '<meta charset="utf-8">'
+    if refresh_seconds:
+        head += f'\n    <meta http-equiv="refresh" content="{refresh_seconds}">'
+    heading = ''
+    if title:
+        head += f'\n    <title>{html.escape(title)}</title>'
+        heading = f'<h1>{html.escape(title)}</h1>\n'
+    return f"""<html>
+<head>
+    {head}
+    <style>{PAGE_STYLE}    </style>
+</head>
+<body>
+{heading}{body}
+</body>
+</html>
+"""
+
+
+class PreviewFile:
+    """本窗口受管理的预览文件，每次预览覆盖写入，退出时删除
+
+    文件名在第一次写入时由 mkstemp 生成，多个进程、多个档案窗口和不同的系统用户互不干扰。
+    """
+
+    def __init__(self, prefix='daily_planner_preview_'):
+        self.prefix = prefix
+        self.path = None
+        self._last_key = None
+
+    def write(self, page):
+        """写入页面，内容未变化时跳过，返回文件路径"""
+        if self.path is None:
+            fd, self.path = tempfile.mkstemp(prefix=self.prefix, suffix='.html')
+            os.close(fd)
+        key = content_key(page)
+        if key != self._last_key or not os.path.exists(self.path):
+            atomic_write(self.path, page, fsync=False)
+            self._last_key = key
+        return self.path
+
+    def url(self):
+        return f'file://{self.path}'
+
+    def cleanup(self):
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
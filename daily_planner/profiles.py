@@ -0,0 +1,164 @@
+
+# 标准库导入
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+
+# 本地模块导入
+from fileutil import atomic_write
+from plan_store import SQLiteStore
+from archive import ArchivedStore
+from tag_registry import TagRegistry
+from planner_core import DEFAULT_DATA_DIR, DEFAULT_TAGS
+from perf import timed
+
+# 档案配置放在用户目录下，不属于任何一个数据目录
+PROFILES_FILE = os.path.join(os.path.expanduser('~'), '.daily_planner_profiles.json')
+# 设置后优先于默认档案使用的数据目录
+DATA_DIR_ENV = 'DAILY_PLANNER_DATA'
+DEFAULT_PROFILE = '默认'
+
+
+def load_profiles(path=PROFILES_FILE):
+    """读取档案配置 {'default': 名称, 'profiles': {名称: 数据目录}}，文件不存在时只有默认档案"""
+    config = {'default': DEFAULT_PROFILE, 'profiles': {DEFAULT_PROFILE: DEFAULT_DATA_DIR}}
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                loaded = json.load(f)
+            config['profiles'].update(loaded.get('profiles', {}))
+            config['default'] = loaded.get('default', config['default'])
+        except (OSError, ValueError) as e:
+            print(f"读取档案配置失败: {e}")
+    return config
+
+
+def save_profiles(config, path=PROFILES_FILE):
+    atomic_write(path, json.dumps(config, ensure_ascii=False, indent=2))
+
+
+def resolve_data_dir(profile=None, path=PROFILES_FILE):
+    """确定数据目录：指定的档案 > 环境变量 > 默认档案"""
+    config = load_profiles(path)
+    if profile is not None:
+        try:
+            return config['profiles'][profile]
+        except KeyError:
+            raise ValueError(f"未知的档案: {profile}")
+    if os.environ.get(DATA_DIR_ENV):
+        return os.environ[DATA_DIR_ENV]
+    return config['profiles'].get(config['default'], DEFAULT_DATA_DIR)
+
+
+class RootCache:
+    """一个数据目录的只读缓存：标签、按年的每日摘要和最近读取的计划
+
+    plans.db 及其 WAL 文件的修改时间和大小作为版本，版本变化时整体失效。
+    检查版本至多每 CHECK_INTERVAL 秒一次，网络盘上也不会频繁 stat。
+    """
+
+    CHECK_INTERVAL = 2.0
+    MAX_PLANS = 256
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        # 每个数据目录一把锁，一个慢速网络盘不会阻塞其他目录的读取
+        self._lock = threading.RLock()
+        self._store = None
+        self.tag_registry = TagRegistry(data_dir, DEFAULT_TAGS)
+        self._version = None
+        self._checked_at = 0.0
+        self._summaries = {}
+        self._plans = OrderedDict()
+
+    def _db_version(self):
+        version = []
+        for name in (SQLiteStore.DB_NAME, SQLiteStore.DB_NAME + '-wal'):
+            try:
+                stat = os.stat(os.path.join(self.data_dir, name))
+                version.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                version.append(None)
+        return tuple(version)
+
+    def _validate(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        version = self._db_version()
+        if version != self._version:
+            self._version = version
+            self._summaries.clear()
+            self._plans.clear()
+
+    def _open_store(self):
+        if self._store is None:
+            self._store = ArchivedStore(SQLiteStore(self.data_dir, read_only=True),
+                                        os.path.join(self.data_dir, 'archive'))
+        return self._store
+
+    def tags(self):
+        return self.tag_registry.tags()
+
+    @timed('shared_cache.year')
+    def day_summaries(self, year):
+        """某一年的每日摘要"""
+        with self._lock:
+            self._validate()
+            summaries = self._summaries.get(year)
+            if summaries is None:
+                if not os.path.exists(os.path.join(self.data_dir, SQLiteStore.DB_NAME)):
+                    return {}
+                summaries = self._open_store().day_summaries(f"{year:04d}-01-01", f"{year:04d}-12-31")
+                self._summaries[year] = summaries
+            return summaries
+
+    @timed('shared_cache.load')
+    def load(self, plan_date):
+        """读取某天的计划，结果按 LRU 缓存"""
+        with self._lock:
+            self._validate()
+            if plan_date in self._plans:
+                self._plans.move_to_end(plan_date)
+                return self._plans[plan_date]
+            if not os.path.exists(os.path.join(self.data_dir, SQLiteStore.DB_NAME)):
+                return None
+            data = self._open_store().load(plan_date)
+            self._plans[plan_date] = data
+            if len(self._plans) > self.MAX_PLANS:
+                self._plans.popitem(last=False)
+            return data
+
+    def close(self):
+        with self._lock:
+            if self._store is not None:
+                self._store.close()
+                self._store = None
+
+
+class SharedCache:
+    """进程内所有数据目录共用的缓存，按规范化后的路径区分"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._roots = {}
+
+    def for_root(self, data_dir):
+        key = os.path.normcase(os.path.abspath(data_dir))
+        with self._lock:
+            cache = self._roots.get(key)
+            if cache is None:
+                cache = self._roots[key] = RootCache(data_dir)
+            return cache
+
+    def close(self):
+        with self._lock:
+            for cache in self._roots.values():
+                cache.close()
+            self._roots.clear()
+
+
+shared_cache = SharedCache()
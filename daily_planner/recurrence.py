@@ -0,0 +1,376 @@
+
+# 标准库导入
+import os
+import json
+import calendar
+import threading
+from datetime import date, datetime
+
+# 本地模块导入
+from fileutil import atomic_write
+from perf import timed
+
+RULES_FILE = 'recurrence.json'
+
+FREQUENCIES = ('daily', 'workdays', 'weekly', 'monthly', 'yearly')
+FREQUENCY_NAMES = {'daily': '每天', 'workdays': '工作日', 'weekly': '每周', 'monthly': '每月', 'yearly': '每年'}
+RRULE_WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+WEEKDAY_NAMES = ['一', '二', '三', '四', '五', '六', '日']
+
+# COUNT 换算成结束日期时最多向后查找的天数，防止规则永远不触发时死循环
+COUNT_SEARCH_DAYS = 366 * 100
+
+
+def _parse_day(text):
+    return datetime.strptime(text.strip(), '%Y-%m-%d').date()
+
+
+def _parse_numbers(text):
+    return [int(value) for value in text.replace('，', ',').split(',') if value.strip()]
+
+
+def parse_rule(text):
+    """把重复规则文本解析为规则字段
+
+    支持 RRULE 写法（FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE;BYMONTHDAY=1,-1;UNTIL=20251231;COUNT=10），
+    以及简写：每天、工作日、每周1,3（1~7 表示周一到周日）、每月1,15,-1（-1 表示最后一天）、每年。
+    """
+    text = text.strip()
+    fields = {'freq': None, 'interval': 1, 'weekdays': None, 'monthdays': None, 'until': None, 'count': None}
+    if '=' in text:
+        text = text.upper()
+        if text.startswith('RRULE:'):
+            text = text[len('RRULE:'):]
+        for part in text.split(';'):
+            key, _, value = part.partition('=')
+            key, value = key.strip(), value.strip()
+            if key == 'FREQ':
+                fields['freq'] = value.lower()
+            elif key == 'INTERVAL':
+                fields['interval'] = int(value)
+            elif key == 'BYDAY':
+                try:
+                    fields['weekdays'] = sorted({RRULE_WEEKDAYS.index(day.strip()) for day in value.split(',')})
+                except ValueError:
+                    raise ValueError(f"不支持的 BYDAY: {value}")
+            elif key == 'BYMONTHDAY':
+                fields['monthdays'] = sorted(set(_parse_numbers(value)))
+            elif key == 'UNTIL':
+                fields['until'] = datetime.strptime(value[:8], '%Y%m%d').strftime('%Y-%m-%d')
+            elif key == 'COUNT':
+                fields['count'] = int(value)
+            elif key:
+                raise ValueError(f"不支持的规则字段: {key}")
+        # 只在工作日重复的每日规则按工作日处理
+        if fields['freq'] == 'daily' and fields['weekdays'] == [0, 1, 2, 3, 4]:
+            fields['freq'], fields['weekdays'] = 'workdays', None
+    else:
+        for freq, name in FREQUENCY_NAMES.items():
+            if text.startswith(name) or text.lower().startswith(freq):
+                fields['freq'] = freq
+                rest = text[len(name):] if text.startswith(name) else text[len(freq):]
+                if rest.strip():
+                    if freq == 'weekly':
+                        fields['weekdays'] = sorted({day - 1 for day in _parse_numbers(rest)})
+                    elif freq == 'monthly':
+                        fields['monthdays'] = sorted(set(_parse_numbers(rest)))
+                    else:
+                        raise ValueError(f"无法识别的重复规则: {text}")
+                break
+    if fields['freq'] not in FREQUENCIES:
+        raise ValueError(f"无法识别的重复规则: {text}")
+    if fields['interval'] < 1:
+        raise ValueError("INTERVAL 必须大于 0")
+    if fields['weekdays'] and not all(0 <= day <= 6 for day in fields['weekdays']):
+        raise ValueError("星期必须在1到7之间")
+    if fields['monthdays'] and not all(1 <= abs(day) <= 31 for day in fields['monthdays']):
+        raise ValueError("日期必须在1到31或-31到-1之间")
+    return fields
+
+
+def format_rule(rule):
+    """规则的 RRULE 文本"""
+    parts = [f"FREQ={'DAILY' if rule['freq'] == 'workdays' else rule['freq'].upper()}"]
+    if rule.get('interval', 1) != 1:
+        parts.append(f"INTERVAL={rule['interval']}")
+    weekdays = [0, 1, 2, 3, 4] if rule['freq'] == 'workdays' else rule.get('weekdays')
+    if weekdays:
+        parts.append(f"BYDAY={','.join(RRULE_WEEKDAYS[day] for day in weekdays)}")
+    if rule.get('monthdays'):
+        parts.append(f"BYMONTHDAY={','.join(str(day) for day in rule['monthdays'])}")
+    if rule.get('until'):
+        parts.append(f"UNTIL={rule['until'].replace('-', '')}")
+    if rule.get('count'):
+        parts.append(f"COUNT={rule['count']}")
+    return ';'.join(parts)
+
+
+def describe_rule(rule):
+    """规则的中文说明"""
+    freq = rule['freq']
+    interval = rule.get('interval', 1)
+    if freq == 'weekly':
+        text = '每周' if interval == 1 else f"每{interval}周"
+        text += '、'.join(f"周{WEEKDAY_NAMES[day]}" for day in rule.get('weekdays') or [])
+    elif freq == 'monthly':
+        text = '每月' if interval == 1 else f"每{interval}个月"
+        text += '、'.join('最后一天' if day == -1 else f"倒数第{-day}天" if day < 0 else f"{day}日"
+                         for day in rule.get('monthdays') or [])
+    elif freq == 'daily' and interval != 1:
+        text = f"每{interval}天"
+    else:
+        text = FREQUENCY_NAMES[freq]
+    text += f"，从 {rule['start']} 开始"
+    if rule.get('until'):
+        text += f"，到 {rule['until']} 为止"
+    if rule.get('count'):
+        text += f"，共 {rule['count']} 次"
+    return text
+
+
+class CompiledRule:
+    """编译后的规则：日期都换成序数，判断某天是否触发只需几次整数运算"""
+
+    __slots__ = ('rule', 'freq', 'interval', 'start', 'until', 'weekdays', 'monthdays',
+                 'start_week', 'start_month', 'start_year', 'month_day', 'exceptions')
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.freq = rule['freq']
+        self.interval = rule.get('interval') or 1
+        start = _parse_day(rule['start'])
+        self.start = start.toordinal()
+        self.until = _parse_day(rule['until']).toordinal() if rule.get('until') else None
+        weekdays = rule.get('weekdays') or ([start.weekday()] if self.freq == 'weekly' else None)
+        self.weekdays = frozenset(weekdays) if weekdays else None
+        self.monthdays = frozenset(rule.get('monthdays') or [start.day])
+        # 每周规则按"从开始那周的周一算起第几周"判断间隔
+        self.start_week = (self.start - start.weekday()) // 7
+        self.start_month = start.year * 12 + start.month - 1
+        self.start_year = start.year
+        self.month_day = (start.month, start.day)
+        self.exceptions = frozenset(_parse_day(day).toordinal() for day in rule.get('exceptions') or [])
+        if rule.get('count'):
+            self._apply_count(rule['count'])
+
+    def _apply_count(self, count):
+        """把 COUNT 换算成最后一次触发的日期，之后判断与 UNTIL 相同；被排除的日期也计数"""
+        exceptions, self.exceptions = self.exceptions, frozenset()
+        last = self.start + COUNT_SEARCH_DAYS if self.until is None else self.until
+        seen = 0
+        for ordinal in range(self.start, last + 1):
+            if self.occurs_ordinal(ordinal):
+                seen += 1
+                if seen == count:
+                    last = ordinal
+                    break
+        self.until = last
+        self.exceptions = exceptions
+
+    def occurs_ordinal(self, ordinal):
+        if ordinal < self.start or (self.until is not None and ordinal > self.until) or ordinal in self.exceptions:
+            return False
+        freq = self.freq
+        # 0001-01-01 是周一，序数减一对 7 取余即为星期
+        weekday = (ordinal - 1) % 7
+        if freq == 'daily':
+            return ((ordinal - self.start) % self.interval == 0
+                    and (self.weekdays is None or weekday in self.weekdays))
+        if freq == 'workdays':
+            return weekday < 5
+        if freq == 'weekly':
+            return weekday in self.weekdays and ((ordinal - weekday) // 7 - self.start_week) % self.interval == 0
+        day = date.fromordinal(ordinal)
+        if freq == 'monthly':
+            if (day.year * 12 + day.month - 1 - self.start_month) % self.interval:
+                return False
+            if self.weekdays is not None and weekday not in self.weekdays:
+                return False
+            if day.day in self.monthdays:
+                return True
+            # 负数表示倒数第几天
+            return day.day - calendar.monthrange(day.year, day.month)[1] - 1 in self.monthdays
+        return (day.month, day.day) == self.month_day and (day.year - self.start_year) % self.interval == 0
+
+    def occurs(self, day):
+        return self.occurs_ordinal(day.toordinal())
+
+    def between(self, first, last):
+        """first 到 last（含，均为 date）之间触发的日期序数"""
+        first, last = max(first.toordinal(), self.start), last.toordinal()
+        if self.until is not None:
+            last = min(last, self.until)
+        if first > last:
+            return []
+        if self.freq == 'daily' and self.weekdays is None:
+            # 每 interval 天一次，直接跳到第一个触发日
+            first += (self.start - first) % self.interval
+            ordinals = range(first, last + 1, self.interval)
+        elif self.freq in ('weekly', 'workdays'):
+            # 每个星期几各自按 7 * interval 天的步长生成，再合并排序
+            weekdays = self.weekdays if self.freq == 'weekly' else range(5)
+            interval = self.interval if self.freq == 'weekly' else 1
+            week_start = first - (first - 1) % 7
+            # 跳到第一个满足间隔的周
+            week_start += (-((week_start // 7 - self.start_week) % interval) % interval) * 7
+            ordinals = sorted(ordinal for weekday in weekdays
+                              for ordinal in range(week_start + weekday, last + 1, 7 * interval)
+                              if ordinal >= first)
+        elif self.freq == 'monthly':
+            ordinals = self._monthly_between(first, last)
+        elif self.freq == 'yearly':
+            ordinals = []
+            month, day = self.month_day
+            for year in range(date.fromordinal(first).year, date.fromordinal(last).year + 1):
+                if (year - self.start_year) % self.interval == 0 and (
+                        day <= calendar.monthrange(year, month)[1]):
+                    ordinal = date(year, month, day).toordinal()
+                    if first <= ordinal <= last:
+                        ordinals.append(ordinal)
+        else:
+            occurs = self.occurs_ordinal
+            return [ordinal for ordinal in range(first, last + 1) if occurs(ordinal)]
+        if self.exceptions:
+            return [ordinal for ordinal in ordinals if ordinal not in self.exceptions]
+        return list(ordinals)
+
+
+    def _monthly_between(self, first, last):
+        """逐月计算各个日期，不逐日判断"""
+        ordinals = []
+        first_day, last_day = date.fromordinal(first), date.fromordinal(last)
+        for index in range(first_day.year * 12 + first_day.month - 1, last_day.year * 12 + last_day.month):
+            if (index - self.start_month) % self.interval:
+                continue
+            year, month = divmod(index, 12)
+            days_in_month = calendar.monthrange(year, month + 1)[1]
+            month_start = date(year, month + 1, 1).toordinal() - 1
+            days = sorted({day if day > 0 else days_in_month + day + 1 for day in self.monthdays
+                           if abs(day) <= days_in_month})
+            for day in days:
+                ordinal = month_start + day
+                if first <= ordinal <= last and (self.weekdays is None or (ordinal - 1) % 7 in self.weekdays):
+                    ordinals.append(ordinal)
+        return ordinals
+
+
+class RecurrenceBook:
+    """例行计划规则，保存在数据目录下的 recurrence.json
+
+    规则只保存一次，不为将来的日期生成计划文件；查看、加载或提醒某天时才计算当天有哪些规则触发。
+    编译结果常驻内存，文件被外部修改（例如同步或恢复备份）后按修改时间重新加载。
+    """
+
+    def __init__(self, data_dir):
+        self.rules_file = os.path.join(data_dir, RULES_FILE)
+        self._lock = threading.RLock()
+        self._rules = None
+        self._compiled = []
+        self._mtime = None
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.rules_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self):
+        mtime = self._file_mtime()
+        if self._rules is not None and mtime == self._mtime:
+            return
+        rules = []
+        if mtime is not None:
+            try:
+                with open(self.rules_file, 'r', encoding='utf-8') as f:
+                    rules = json.load(f).get('rules', [])
+            except (OSError, ValueError) as e:
+                print(f"读取例行计划失败: {e}")
+        compiled = []
+        for rule in rules:
+            try:
+                compiled.append(CompiledRule(rule))
+            except (KeyError, ValueError) as e:
+                print(f"忽略无效的例行计划 {rule.get('name')}: {e}")
+        self._rules, self._compiled, self._mtime = rules, compiled, mtime
+
+    def _save(self, rules):
+        atomic_write(self.rules_file, json.dumps({'rules': rules}, ensure_ascii=False, indent=2))
+        self._rules = None
+        self._load()
+
+    def rules(self):
+        """全部规则的副本"""
+        with self._lock:
+            self._load()
+            return [dict(rule) for rule in self._rules]
+
+    def get(self, rule_id):
+        for rule in self.rules():
+            if rule['id'] == rule_id:
+                return rule
+        raise ValueError(f"没有这个例行计划: {rule_id}")
+
+    def add(self, name, rule_text, start=None, template=None, tag=None):
+        """添加规则，rule_text 见 parse_rule；template 为"分类/模板名"，为空时插入以规则名称为内容的任务"""
+        fields = parse_rule(rule_text)
+        start = start or date.today().strftime('%Y-%m-%d')
+        rule = dict(fields, name=name, start=_parse_day(start).strftime('%Y-%m-%d'),
+                    template=template or None, tag=tag or None, exceptions=[], enabled=True)
+        # 先编译一次，无效的规则不写入文件
+        CompiledRule(rule)
+        with self._lock:
+            rules = self.rules()
+            rule['id'] = max((item['id'] for item in rules), default=0) + 1
+            rules.append(rule)
+            self._save(rules)
+        return rule
+
+    def update(self, rule_id, **changes):
+        with self._lock:
+            rules = self.rules()
+            for rule in rules:
+                if rule['id'] == rule_id:
+                    rule.update(changes)
+                    CompiledRule(rule)
+                    self._save(rules)
+                    return rule
+        raise ValueError(f"没有这个例行计划: {rule_id}")
+
+    def remove(self, rule_id):
+        with self._lock:
+            rules = self.rules()
+            remaining = [rule for rule in rules if rule['id'] != rule_id]
+            if len(remaining) == len(rules):
+                raise ValueError(f"没有这个例行计划: {rule_id}")
+            self._save(remaining)
+
+    def skip(self, rule_id, plan_date):
+        """某天不触发这条规则"""
+        with self._lock:
+            rule = self.get(rule_id)
+            exceptions = sorted(set(rule.get('exceptions') or []) | {_parse_day(plan_date).strftime('%Y-%m-%d')})
+            return self.update(rule_id, exceptions=exceptions)
+
+    def rules_on(self, plan_date):
+        """某天触发的规则"""
+        ordinal = _parse_day(plan_date).toordinal()
+        with self._lock:
+            self._load()
+            compiled = self._compiled
+        return [dict(item.rule) for item in compiled
+                if item.rule.get('enabled', True) and item.occurs_ordinal(ordinal)]
+
+    @timed('recurrence.expand')
+    def occurrences(self, start, end):
+        """start 到 end（含）之间每天触发的规则 {日期: [规则名称]}，只包含有规则触发的日期"""
+        first, last = _parse_day(start), _parse_day(end)
+        with self._lock:
+            self._load()
+            compiled = self._compiled
+        by_day = {}
+        for item in compiled:
+            if not item.rule.get('enabled', True):
+                continue
+            for ordinal in item.between(first, last):
+                by_day.setdefault(ordinal, []).append(item.rule['name'])
+        return {date.fromordinal(ordinal).strftime('%Y-%m-%d'): names for ordinal, names in sorted(by_day.items())}
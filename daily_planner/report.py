@@ -0,0 +1,183 @@
+
+# 标准库导入
+import re
+import csv
+import html
+from collections import Counter
+
+# 本地模块导入
+from perf import timed
+
+# Markdown 复选框，例如 "- [x] 完成设计文档"
+CHECKBOX_PATTERN = re.compile(r'^\s*[-*+]\s+\[([ xX])\]\s+(.*\S)\s*$')
+
+# 统计高频事项时最多保留的不同事项数量，超出后淘汰出现次数最少的一半
+MAX_DISTINCT_ITEMS = 5000
+
+
+def parse_items(content):
+    """逐条产出计划中的复选框事项 (是否完成, 文本)"""
+    for line in (content or '').splitlines():
+        match = CHECKBOX_PATTERN.match(line)
+        if match:
+            yield match.group(1) in 'xX', match.group(2)
+
+
+def iter_report_items(plans):
+    """把计划流展开为事项流 (日期, 分类, 是否完成, 文本)"""
+    for data in plans:
+        for done, text in parse_items(data.get('content', '')):
+            yield data['date'], data.get('tag', ''), done, text
+
+
+class WorkSummary:
+    """工作总结的聚合结果，内存占用与天数无关"""
+
+    def __init__(self, start=None, end=None, tags=None):
+        self.start = start
+        self.end = end
+        self.tags = list(tags) if tags else []
+        self.first_date = None
+        self.last_date = None
+        self.days = 0
+        self.done_days = 0
+        self.completed_items = 0
+        self.open_items = 0
+        self.days_per_tag = Counter()
+        self.completed_per_tag = Counter()
+        self.top_completed = Counter()
+        self.top_open = Counter()
+
+    def add_plan(self, data):
+        """累加一天的计划"""
+        plan_date = data['date']
+        tag = data.get('tag', '')
+        if self.first_date is None:
+            self.first_date = plan_date
+        self.last_date = plan_date
+        self.days += 1
+        self.days_per_tag[tag] += 1
+        if data.get('done'):
+            self.done_days += 1
+        for done, text in parse_items(data.get('content', '')):
+            if done:
+                self.completed_items += 1
+                self.completed_per_tag[tag] += 1
+                _count_bounded(self.top_completed, text)
+            else:
+                self.open_items += 1
+                _count_bounded(self.top_open, text)
+
+    def to_markdown(self, top_n=10):
+        """导出为 Markdown"""
+        lines = [f"# 工作总结 {self._period()}", '']
+        if self.tags:
+            lines += [f"分类: {', '.join(self.tags)}", '']
+        lines += [
+            '## 概览',
+            f"- 记录天数: {self.days}",
+            f"- 已完成天数: {self.done_days}",
+            f"- 已完成事项: {self.completed_items}",
+            f"- 未完成事项: {self.open_items}",
+            '',
+            '## 分类统计',
+        ]
+        for tag, days in self.days_per_tag.most_common():
+            lines.append(f"- {tag}: {days} 天，完成 {self.completed_per_tag[tag]} 项")
+        lines += ['', '## 主要完成事项']
+        for index, (text, count) in enumerate(self.top_completed.most_common(top_n), 1):
+            lines.append(f"{index}. {text}（{count} 次）")
+        lines += ['', '## 未完成事项']
+        for text, count in self.top_open.most_common(top_n):
+            lines.append(f"- [ ] {text}（{count} 次）")
+        return '\n'.join(lines) + '\n'
+
+    def to_html(self, top_n=10):
+        """导出为独立的 HTML 页面"""
+        def items(counter, ordered):
+            tag = 'ol' if ordered else 'ul'
+            rows = ''.join(
+                f"<li>{html.escape(text)}（{count} 次）</li>"
+                for text, count in counter.most_common(top_n))
+            return f"<{tag}>{rows}</{tag}>"
+
+        tag_rows = ''.join(
+            f"<tr><td>{html.escape(tag)}</td><td>{days}</td>"
+            f"<td>{self.completed_per_tag[tag]}</td></tr>"
+            for tag, days in self.days_per_tag.most_common())
+        title = html.escape(f"工作总结 {self._period()}")
+        return f"""<html>
+<head>
+    <meta charset="utf-8">
+    <title>{title}</title>
+    <style>
+        body {{ font-family: Arial; margin: 20px; }}
+        h1 {{ color: #333; }}
+        table {{ border-collapse: collapse; }}
+        td, th {{ border: 1px solid #ccc; padding: 4px 10px; }}
+    </style>
+</head>
+<body>
+    <h1>{title}</h1>
+    <ul>
+        <li>记录天数: {self.days}</li>
+        <li>已完成天数: {self.done_days}</li>
+        <li>已完成事项: {self.completed_items}</li>
+        <li>未完成事项: {self.open_items}</li>
+    </ul>
+    <h2>分类统计</h2>
+    <table><tr><th>分类</th><th>天数</th><th>完成事项</th></tr>{tag_rows}</table>
+    <h2>主要完成事项</h2>
+    {items(self.top_completed, True)}
+    <h2>未完成事项</h2>
+    {items(self.top_open, False)}
+</body>
+</html>
+"""
+
+    def _period(self):
+        start = self.start or self.first_date or ''
+        end = self.end or self.last_date or ''
+        return f"{start} ~ {end}"
+
+
+def _count_bounded(counter, text):
+    counter[text] += 1
+    if len(counter) > MAX_DISTINCT_ITEMS:
+        for key, _ in counter.most_common()[MAX_DISTINCT_ITEMS // 2:]:
+            del counter[key]
+
+
+@timed('report.summary')
+def build_summary(store, start=None, end=None, tags=None):
+    """流式汇总区间内的计划"""
+    summary = WorkSummary(start, end, tags)
+    for data in store.iter_plans(start, end, tags=tags):
+        summary.add_plan(data)
+    return summary
+
+
+@timed('report.export')
+def export_report(store, path, fmt, start=None, end=None, tags=None):
+    """导出工作总结，fmt 为 markdown、html 或 csv
+
+    CSV 按事项逐行写出，不经过汇总，因此不受区间长度影响。
+    """
+    if fmt == 'csv':
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['date', 'tag', 'done', 'item'])
+            for plan_date, tag, done, text in iter_report_items(
+                    store.iter_plans(start, end, tags=tags)):
+                writer.writerow([plan_date, tag, int(done), text])
+        return
+
+    summary = build_summary(store, start, end, tags)
+    if fmt == 'markdown':
+        content = summary.to_markdown()
+    elif fmt == 'html':
+        content = summary.to_html()
+    else:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
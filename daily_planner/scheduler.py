@@ -0,0 +1,240 @@
+
+# 标准库导入
+import os
+import json
+import heapq
+import threading
+from datetime import datetime, timedelta
+
+# 本地模块导入
+from fileutil import atomic_write
+from perf import timed, span
+
+# 系统休眠期间单调时钟不走，等待超过这个时长就重新对一次墙上时间
+MAX_WAIT_SECONDS = 15 * 60
+
+# 默认提醒：每天上午9点
+DEFAULT_REMINDERS = [
+    {'name': '每日提醒', 'time': '09:00', 'weekdays': None, 'tag': None, 'enabled': True},
+]
+
+WEEKDAY_NAMES = ['一', '二', '三', '四', '五', '六', '日']
+
+
+def daily_at(hour, minute, weekdays=None):
+    """返回计算下次触发时间的函数，weekdays 为 0(周一)~6(周日) 的列表，None 表示每天"""
+    def next_time(after):
+        candidate = after.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if candidate <= after:
+            candidate += timedelta(days=1)
+        for _ in range(7):
+            if not weekdays or candidate.weekday() in weekdays:
+                return candidate
+            candidate += timedelta(days=1)
+        return None
+    return next_time
+
+
+class ScheduledJob:
+    """一个定时任务
+
+    next_time(after) 返回严格晚于 after 的下次触发时间，返回 None 表示不再触发。
+    catch_up_window 内错过的触发（例如电脑休眠）会在恢复后补发一次。
+    """
+
+    def __init__(self, name, next_time, callback, catch_up_window=timedelta(hours=12)):
+        self.name = name
+        self.next_time = next_time
+        self.callback = callback
+        self.catch_up_window = catch_up_window
+
+
+class ReminderScheduler:
+    """基于最小堆的单线程定时器，睡眠到最近的触发时间为止"""
+
+    def __init__(self, state_file=None):
+        self.state_file = state_file
+        self._jobs = {}
+        self._generations = {}
+        self._heap = []
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._last_run = self._load_state()
+
+    def _load_state(self):
+        if not self.state_file or not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return {name: datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+                        for name, value in json.load(f).items()}
+        except (OSError, ValueError) as e:
+            print(f"读取提醒状态失败: {e}")
+            return {}
+
+    def _save_state(self):
+        if not self.state_file:
+            return
+        try:
+            atomic_write(self.state_file, json.dumps(
+                {name: value.strftime('%Y-%m-%d %H:%M:%S') for name, value in self._last_run.items()},
+                ensure_ascii=False, indent=2))
+        except OSError as e:
+            print(f"保存提醒状态失败: {e}")
+
+    def _push(self, due, name):
+        # 旧的堆条目不删除，靠代数判断是否已失效
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, name, self._generations[name]))
+        self._cond.notify()
+
+    def add_job(self, job, now=None):
+        """注册任务，同名任务会被替换"""
+        now = now or datetime.now()
+        with self._cond:
+            self._jobs[job.name] = job
+            self._generations[job.name] = self._generations.get(job.name, 0) + 1
+
+            due = job.next_time(now)
+            last_run = self._last_run.get(job.name)
+            if last_run is not None:
+                missed = job.next_time(last_run)
+                if missed is not None and missed <= now and now - missed <= job.catch_up_window:
+                    due = now
+            if due is not None:
+                self._push(due, job.name)
+
+    def remove_job(self, name):
+        with self._cond:
+            self._jobs.pop(name, None)
+            self._generations[name] = self._generations.get(name, 0) + 1
+            self._cond.notify()
+
+    def clear(self):
+        """移除全部任务"""
+        with self._cond:
+            for name in list(self._jobs):
+                self.remove_job(name)
+
+    def job_names(self):
+        with self._cond:
+            return list(self._jobs)
+
+    def snooze(self, name, minutes=10, now=None):
+        """在若干分钟后额外触发一次任务，不影响原有的周期"""
+        now = now or datetime.now()
+        with self._cond:
+            job = self._jobs.get(name)
+            if job is None:
+                return
+            snooze_name = f"{name}#snooze"
+            self._jobs[snooze_name] = ScheduledJob(
+                snooze_name, lambda after: None, job.callback)
+            self._generations[snooze_name] = self._generations.get(snooze_name, 0) + 1
+            self._push(now + timedelta(minutes=minutes), snooze_name)
+
+    def next_due(self):
+        """返回最近一次有效的触发时间，没有则返回 None"""
+        with self._cond:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def _drop_stale(self):
+        while self._heap:
+            due, _, name, generation = self._heap[0]
+            if name in self._jobs and self._generations.get(name) == generation:
+                return
+            heapq.heappop(self._heap)
+
+    @timed('reminder.run_pending')
+    def run_pending(self, now=None):
+        """执行所有已到期的任务，返回执行的任务名列表"""
+        now = now or datetime.now()
+        fired = []
+        with self._cond:
+            self._drop_stale()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, name, _ = heapq.heappop(self._heap)
+                job = self._jobs[name]
+                fired.append(job)
+                if name.endswith('#snooze'):
+                    del self._jobs[name]
+                else:
+                    self._last_run[name] = now
+                    due = job.next_time(now)
+                    if due is not None:
+                        self._push(due, name)
+                self._drop_stale()
+            if fired:
+                self._save_state()
+
+        # 回调在锁外执行，回调里可以再注册或推迟任务
+        for job in fired:
+            try:
+                with span('reminder.callback', job.name):
+                    job.callback()
+            except Exception as e:
+                print(f"提醒任务 {job.name} 执行失败: {e}")
+        return [job.name for job in fired]
+
+    def start(self):
+        """启动定时线程，重复调用无副作用"""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                due = self.next_due()
+                if due is None:
+                    self._cond.wait()
+                else:
+                    delay = (due - datetime.now()).total_seconds()
+                    if delay > 0:
+                        self._cond.wait(min(delay, MAX_WAIT_SECONDS))
+                if not self._running:
+                    return
+            self.run_pending()
+
+
+def load_reminders(path):
+    """读取提醒配置，文件不存在时返回默认配置"""
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('reminders', [])
+        except (OSError, ValueError) as e:
+            print(f"读取提醒配置失败: {e}")
+    return [dict(reminder) for reminder in DEFAULT_REMINDERS]
+
+
+def save_reminders(path, reminders):
+    atomic_write(path, json.dumps({'reminders': reminders}, ensure_ascii=False, indent=2))
+
+
+def parse_reminder_time(text):
+    """解析 HH:MM，格式错误时抛出 ValueError"""
+    parsed = datetime.strptime(text.strip(), '%H:%M')
+    return parsed.hour, parsed.minute
+
+
+def describe_reminder(reminder):
+    """提醒配置的简短描述，用于列表显示"""
+    weekdays = reminder.get('weekdays')
+    days = '每天' if not weekdays else '周' + '、'.join(WEEKDAY_NAMES[day] for day in sorted(weekdays))
+    tag = f" [{reminder['tag']}]" if reminder.get('tag') else ''
+    state = '' if reminder.get('enabled', True) else '（已停用）'
+    return f"{reminder['name']}: {days} {reminder['time']}{tag}{state}"
@@ -0,0 +1,269 @@
+
+# 标准库导入
+import os
+import re
+import math
+import sqlite3
+import threading
+from collections import Counter
+
+# 本地模块导入
+from perf import timed
+
+# 中日韩统一表意文字及常用扩展、假名、谚文
+CJK_RANGES = (
+    '\u3040-\u30ff'   # 平假名、片假名
+    '\u3400-\u4dbf'   # 扩展A
+    '\u4e00-\u9fff'   # 基本区
+    '\uac00-\ud7af'   # 谚文音节
+    '\uf900-\ufaff'   # 兼容表意文字
+)
+TOKEN_PATTERN = re.compile(f'([{CJK_RANGES}]+)|([0-9a-zA-Z_]+)')
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text):
+    """分词：英文数字按单词切分并转小写，中日韩文字按单字和相邻二字切分"""
+    tokens = []
+    for cjk, word in TOKEN_PATTERN.findall(text or ''):
+        if word:
+            tokens.append(word.lower())
+            continue
+        tokens.extend(cjk)
+        tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+    return tokens
+
+
+def query_terms(query):
+    """查询分词：中文连续片段只取二字词，单字查询才退回单字"""
+    terms = []
+    for cjk, word in TOKEN_PATTERN.findall(query or ''):
+        if word:
+            terms.append(word.lower())
+        elif len(cjk) == 1:
+            terms.append(cjk)
+        else:
+            terms.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+    # 去重但保持顺序
+    return list(dict.fromkeys(terms))
+
+
+def plan_doc_id(plan_date):
+    return f"plan:{plan_date}"
+
+
+def template_doc_id(category, template_name):
+    return f"template:{category}/{template_name}"
+
+
+class SearchIndex:
+    """计划和模板的增量倒排索引，保存在数据目录下的 search.db"""
+
+    DB_NAME = 'search.db'
+
+    def __init__(self, data_dir):
+        self.db_path = os.path.join(data_dir, self.DB_NAME)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                doc_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                tag TEXT,
+                length INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        self._conn.commit()
+        # 文档表常驻内存，查询时不必再回表
+        self._docs = None
+
+    def _load_docs(self):
+        if self._docs is None:
+            self._docs = {
+                doc_id: (kind, key, tag, length)
+                for doc_id, kind, key, tag, length in self._conn.execute(
+                    'SELECT doc_id, kind, key, tag, length FROM docs')
+            }
+        return self._docs
+
+    def _index(self, doc_id, kind, key, tag, text):
+        counts = Counter(tokenize(text))
+        counts.update(tokenize(tag))
+        self._conn.execute('DELETE FROM postings WHERE doc_id = ?', (doc_id,))
+        self._conn.execute(
+            'INSERT OR REPLACE INTO docs (doc_id, kind, key, tag, length) VALUES (?, ?, ?, ?, ?)',
+            (doc_id, kind, key, tag, sum(counts.values())))
+        self._load_docs()[doc_id] = (kind, key, tag, sum(counts.values()))
+        self._conn.executemany(
+            'INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)',
+            [(term, doc_id, tf) for term, tf in counts.items()])
+
+    def _remove(self, doc_id):
+        self._conn.execute('DELETE FROM postings WHERE doc_id = ?', (doc_id,))
+        self._conn.execute('DELETE FROM docs WHERE doc_id = ?', (doc_id,))
+        self._load_docs().pop(doc_id, None)
+
+    @timed('search.index_plan')
+    def index_plan(self, data):
+        """索引或更新一天的计划"""
+        with self._lock, self._conn:
+            self._index(plan_doc_id(data['date']), 'plan', data['date'],
+                        data.get('tag', ''), data.get('content', ''))
+
+    @timed('search.index_plans')
+    def index_plans(self, records):
+        """在一个事务中索引多天的计划，批量写入时使用；所有词项合并为一次写入"""
+        with self._lock, self._conn:
+            docs = self._load_docs()
+            doc_rows, posting_rows = [], []
+            for data in records:
+                doc_id = plan_doc_id(data['date'])
+                if doc_id in docs:
+                    # 新文档没有旧词项，不必删除
+                    self._conn.execute('DELETE FROM postings WHERE doc_id = ?', (doc_id,))
+                counts = Counter(tokenize(data.get('content', '')))
+                counts.update(tokenize(data.get('tag', '')))
+                length = sum(counts.values())
+                docs[doc_id] = ('plan', data['date'], data.get('tag', ''), length)
+                doc_rows.append((doc_id, 'plan', data['date'], data.get('tag', ''), length))
+                posting_rows.extend((term, doc_id, tf) for term, tf in counts.items())
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO docs (doc_id, kind, key, tag, length) VALUES (?, ?, ?, ?, ?)', doc_rows)
+            # 按主键顺序插入，B 树页的命中率高得多
+            posting_rows.sort()
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO postings (term, doc_id, tf) VALUES (?, ?, ?)', posting_rows)
+
+    def remove_plan(self, plan_date):
+        with self._lock, self._conn:
+            self._remove(plan_doc_id(plan_date))
+
+    def index_template(self, category, template_name, content):
+        """索引或更新一个模板，模板名也参与检索"""
+        with self._lock, self._conn:
+            self._index(template_doc_id(category, template_name), 'template',
+                        f"{category}/{template_name}", category,
+                        f"{template_name}\n{content}")
+
+    def remove_template(self, category, template_name):
+        with self._lock, self._conn:
+            self._remove(template_doc_id(category, template_name))
+
+    def is_built(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'built'").fetchone()
+        return row is not None
+
+    @timed('search.rebuild')
+    def rebuild(self, store, template_dir):
+        """清空后重新索引全部计划和模板，返回文档数"""
+        count = 0
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM postings')
+            self._conn.execute('DELETE FROM docs')
+            self._docs = {}
+            for data in store.iter_plans():
+                self._index(plan_doc_id(data['date']), 'plan', data['date'],
+                            data.get('tag', ''), data.get('content', ''))
+                count += 1
+            for category, template_name, content in iter_templates(template_dir):
+                self._index(template_doc_id(category, template_name), 'template',
+                            f"{category}/{template_name}", category,
+                            f"{template_name}\n{content}")
+                count += 1
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('built', '1')")
+        return count
+
+    @timed('search.query')
+    def search(self, query, limit=20, kind=None):
+        """按 BM25 相关度返回同时包含所有查询词的文档
+
+        返回列表元素为 {'kind', 'key', 'tag', 'score'}，kind 为 plan 或 template，
+        计划的 key 是日期，模板的 key 是 "分类/模板名"。
+        """
+        terms = query_terms(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            all_docs = self._load_docs()
+            total_docs = len(all_docs)
+            if not total_docs:
+                return []
+            avg_length = sum(doc[3] for doc in all_docs.values()) / total_docs
+
+            # 先取文档频率最低的词，缩小候选集合
+            postings = []
+            for term in terms:
+                rows = self._conn.execute(
+                    'SELECT doc_id, tf FROM postings WHERE term = ?', (term,)).fetchall()
+                if not rows:
+                    return []
+                postings.append(dict(rows))
+            postings.sort(key=len)
+
+            candidates = set(postings[0])
+            for term_postings in postings[1:]:
+                candidates &= term_postings.keys()
+                if not candidates:
+                    return []
+
+            docs = {
+                doc_id: all_docs[doc_id] for doc_id in candidates
+                if doc_id in all_docs and (kind is None or all_docs[doc_id][0] == kind)
+            }
+
+        results = []
+        for doc_id, (doc_kind, key, tag, length) in docs.items():
+            score = 0.0
+            for term_postings in postings:
+                df = len(term_postings)
+                tf = term_postings[doc_id]
+                idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                score += idf * tf * (BM25_K1 + 1) / (tf + norm)
+            results.append({'kind': doc_kind, 'key': key, 'tag': tag, 'score': score})
+
+        # 相关度相同时新的日期排在前面
+        results.sort(key=lambda r: (r['score'], r['key']), reverse=True)
+        return results[:limit]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def iter_templates(template_dir):
+    """遍历模板目录，产出 (分类, 模板名, 内容)"""
+    if not os.path.exists(template_dir):
+        return
+    for category in sorted(os.listdir(template_dir)):
+        category_dir = os.path.join(template_dir, category)
+        if not os.path.isdir(category_dir):
+            continue
+        for name in sorted(os.listdir(category_dir)):
+            template_path = os.path.join(category_dir, name)
+            if not name.endswith('.md') or not os.path.isfile(template_path):
+                continue
+            try:
+                with open(template_path, 'r', encoding='utf-8') as f:
+                    yield category, name[:-3], f.read()
+            except OSError as e:
+                print(f"读取模板错误 {template_path}: {e}")
@@ -0,0 +1,501 @@
+
+# 标准库导入
+import os
+import json
+import time
+import zlib
+import hashlib
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 本地模块导入
+from fileutil import atomic_write
+from planner_core import now_str
+from perf import timed
+
+# 同步状态：远端地址、已同步到的远端版本号、每条记录上次同步时双方一致的哈希
+STATE_FILE = 'sync_state.json'
+DEFAULT_PORT = 8765
+# 一次请求上传或下载的对象数
+TRANSFER_BATCH = 500
+# 同步目录的锁超过这么多秒视为残留，可以强制解除
+LOCK_STALE_SECONDS = 60
+# 提交时远端已被其他设备更新，重新比较的最大次数
+MAX_ATTEMPTS = 3
+
+KEEP_LOCAL = 'local'
+KEEP_REMOTE = 'remote'
+# 基准中的修改标记取这个值时，下次同步必定重新比较本机内容
+UNSYNCED = ''
+
+
+class SyncError(Exception):
+    """同步失败，例如远端数据不完整或无法连接"""
+
+
+class RemoteChanged(SyncError):
+    """提交时远端版本号已经不是读取时的版本"""
+
+
+def record_digest(payload):
+    """记录内容的哈希，也是对象的文件名；修改时间不参与，只改时间不算改动"""
+    return hashlib.sha256(_encode(payload)).hexdigest()
+
+
+def _encode(payload):
+    return json.dumps(payload, ensure_ascii=False, sort_keys=True).encode('utf-8')
+
+
+def plan_payload(data):
+    return {'date': data['date'], 'content': data.get('content', ''),
+            'tag': data.get('tag'), 'done': bool(data.get('done'))}
+
+
+class FolderTransport:
+    """以普通共享文件夹（网盘、U 盘、SMB 共享）作为同步中心
+
+    objects/ 下按哈希存放压缩后的记录，manifest.json 保存每条记录的最新哈希和变更时的版本号，
+    head.json 只有当前版本号：没有变化的同步只读这一个小文件。
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.head_path = os.path.join(root, 'head.json')
+        self.manifest_path = os.path.join(root, 'manifest.json')
+        self.lock_path = os.path.join(root, 'sync.lock')
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def _read_json(self, path, default):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return default
+
+    def revision(self):
+        return self._read_json(self.head_path, {'revision': 0})['revision']
+
+    def changes(self, since):
+        """版本号 since 之后变化的记录 {'revision', 'records': {键: {'hash', 'modified', 'rev'}}}"""
+        revision = self.revision()
+        if revision == since:
+            return {'revision': revision, 'records': {}}
+        manifest = self._read_json(self.manifest_path, {'revision': 0, 'records': {}})
+        return {'revision': manifest['revision'],
+                'records': {key: entry for key, entry in manifest['records'].items() if entry['rev'] > since}}
+
+    def has_object(self, digest):
+        return os.path.exists(self._object_path(digest))
+
+    def put_objects(self, objects):
+        for digest, payload in objects.items():
+            encoded = _encode(payload)
+            if hashlib.sha256(encoded).hexdigest() != digest:
+                raise SyncError(f"对象内容与哈希不符: {digest}")
+            path = self._object_path(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                atomic_write(path, zlib.compress(encoded), fsync=False)
+
+    def fetch(self, digests):
+        objects = {}
+        for digest in digests:
+            try:
+                with open(self._object_path(digest), 'rb') as f:
+                    objects[digest] = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+            except FileNotFoundError:
+                raise SyncError(f"同步中心缺少对象: {digest}")
+        return objects
+
+    def _acquire_lock(self, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                os.close(os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.lock_path) > LOCK_STALE_SECONDS:
+                        os.remove(self.lock_path)
+                        continue
+                except OSError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise SyncError("同步目录正被其他设备使用，请稍后再试")
+                time.sleep(0.1)
+
+    def commit(self, base_revision, updates):
+        """在 base_revision 的基础上写入更新，返回新版本号；远端已有更新时抛出 RemoteChanged"""
+        missing = [entry['hash'] for entry in updates.values()
+                   if entry['hash'] is not None and not self.has_object(entry['hash'])]
+        if missing:
+            raise SyncError(f"提交引用了不存在的对象: {missing[0]}")
+        self._acquire_lock()
+        try:
+            manifest = self._read_json(self.manifest_path, {'revision': 0, 'records': {}})
+            if manifest['revision'] != base_revision:
+                raise RemoteChanged(f"远端版本已更新到 {manifest['revision']}")
+            revision = base_revision + 1
+            for key, entry in updates.items():
+                manifest['records'][key] = {'hash': entry['hash'], 'modified': entry.get('modified'), 'rev': revision}
+            manifest['revision'] = revision
+            # 先写清单再写版本号，读取方看到新版本号时清单一定已经就绪
+            atomic_write(self.manifest_path, json.dumps(manifest, ensure_ascii=False))
+            atomic_write(self.head_path, json.dumps({'revision': revision}))
+            return revision
+        finally:
+            os.remove(self.lock_path)
+
+
+class HttpTransport:
+    """通过 SyncServer 同步，接口与 FolderTransport 相同"""
+
+    def __init__(self, url, timeout=30):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, path, body=None):
+        # urllib.request 导入较慢，只在真正联网时加载
+        from urllib.request import Request, urlopen
+        from urllib.error import HTTPError, URLError
+        data = zlib.compress(_encode(body)) if body is not None else None
+        request = Request(self.url + path, data=data, method='POST' if data is not None else 'GET',
+                          headers={'Content-Type': 'application/octet-stream'})
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                return json.loads(zlib.decompress(response.read()).decode('utf-8'))
+        except HTTPError as e:
+            message = e.read().decode('utf-8', 'replace')
+            if e.code == 409:
+                raise RemoteChanged(message)
+            raise SyncError(f"同步服务器返回错误 {e.code}: {message}")
+        except URLError as e:
+            raise SyncError(f"无法连接同步服务器 {self.url}: {e.reason}")
+
+    def changes(self, since):
+        return self._request(f"/changes?since={int(since)}")
+
+    def put_objects(self, objects):
+        self._request('/objects', objects)
+
+    def fetch(self, digests):
+        return self._request('/fetch', list(digests))
+
+    def commit(self, base_revision, updates):
+        return self._request('/commit', {'base_revision': base_revision, 'updates': updates})['revision']
+
+
+def open_transport(target):
+    if target.startswith(('http://', 'https://')):
+        return HttpTransport(target)
+    return FolderTransport(target)
+
+
+class SyncHandler(BaseHTTPRequestHandler):
+    """同步服务器的请求处理：请求和响应体都是 zlib 压缩的 JSON"""
+
+    def _reply(self, status, value):
+        body = zlib.compress(_encode(value)) if status == 200 else str(value).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(zlib.decompress(self.rfile.read(length)).decode('utf-8'))
+
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        if path != '/changes':
+            return self._reply(404, "未知的地址")
+        params = dict(part.partition('=')[::2] for part in query.split('&') if part)
+        try:
+            self._reply(200, self.server.transport.changes(int(params.get('since', 0))))
+        except ValueError:
+            self._reply(400, "since 参数不正确")
+
+    def do_POST(self):
+        transport = self.server.transport
+        try:
+            body = self._body()
+            if self.path == '/objects':
+                transport.put_objects(body)
+                return self._reply(200, {})
+            if self.path == '/fetch':
+                return self._reply(200, transport.fetch(body))
+            if self.path == '/commit':
+                with self.server.commit_lock:
+                    return self._reply(200, {'revision': transport.commit(body['base_revision'], body['updates'])})
+            self._reply(404, "未知的地址")
+        except RemoteChanged as e:
+            self._reply(409, e)
+        except (SyncError, ValueError, KeyError, zlib.error) as e:
+            self._reply(400, e)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SyncServer(ThreadingHTTPServer):
+    """本机或局域网内的同步服务器，数据放在一个 FolderTransport 目录中"""
+
+    daemon_threads = True
+
+    def __init__(self, root, host='127.0.0.1', port=DEFAULT_PORT):
+        self.transport = FolderTransport(root)
+        self.commit_lock = threading.Lock()
+        super().__init__((host, port), SyncHandler)
+
+
+def saved_target(data_dir):
+    """数据目录上次使用的同步目录或服务器地址，没有时返回 None"""
+    try:
+        with open(os.path.join(data_dir, STATE_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f).get('target')
+    except (OSError, ValueError):
+        return None
+
+
+class SyncClient:
+    """把一个数据目录与同步中心双向同步
+
+    记录包括每天的计划（plan:日期）、模板（template:分类/名称）和分类列表（tags）。
+    每条记录保存上次同步时双方一致的哈希作为基准：只有本机变了就上传，只有远端变了就下载，
+    两边都变且内容不同则记为冲突，两边都保留，等待用户选择。
+    本机改动先用修改时间判断，时间变了才计算哈希，没有变化的同步只交换一次版本号。
+    """
+
+    def __init__(self, core, target=None):
+        self.core = core
+        self.state_path = os.path.join(core.data_dir, STATE_FILE)
+        self.state = self._load_state()
+        self._state_changed = False
+        if target and target != self.state.get('target'):
+            # 换了同步中心，以前的基准不再适用
+            self.state = {'target': target, 'revision': 0, 'base': {}, 'conflicts': {}}
+        if not self.state.get('target'):
+            raise ValueError("尚未设置同步目录或同步服务器地址")
+        self.transport = open_transport(self.state['target'])
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'target': None, 'revision': 0, 'base': {}, 'conflicts': {}}
+
+    def _save_state(self):
+        atomic_write(self.state_path, json.dumps(self.state, ensure_ascii=False))
+
+    def _template_key(self, category, name):
+        return f"template:{category}/{name}"
+
+    def _local_markers(self):
+        """每条本机记录的修改标记：计划用摘要中的内容哈希，文件用修改时间
+
+        last_modified 只精确到秒，同一秒内的两次修改标记相同，不能用作计划的标记；
+        早期归档段中没有哈希的计划退回 last_modified，归档后的计划不会再被修改。
+        """
+        markers = {f"plan:{plan_date}": summary.get('hash') or summary['last_modified']
+                   for plan_date, summary in self.core.day_summaries().items()}
+        template_dir = self.core.template_dir
+        for category in os.listdir(template_dir):
+            category_dir = os.path.join(template_dir, category)
+            if not os.path.isdir(category_dir):
+                continue
+            for entry in os.scandir(category_dir):
+                if entry.name.endswith('.md') and entry.is_file():
+                    markers[self._template_key(category, entry.name[:-3])] = entry.stat().st_mtime_ns
+        try:
+            markers['tags'] = os.stat(self.core.tag_registry.tags_file).st_mtime_ns
+        except OSError:
+            pass
+        return markers
+
+    def _local_record(self, key):
+        """本机记录的 (内容, 修改时间)，不存在时内容为 None"""
+        kind, _, name = key.partition(':')
+        if kind == 'plan':
+            data = self.core.load_plan(name)
+            return (plan_payload(data), data.get('last_modified')) if data else (None, None)
+        if kind == 'template':
+            category, _, template_name = name.partition('/')
+            path = self.core.template_path(category, template_name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+            except FileNotFoundError:
+                return None, None
+            modified = datetime.fromtimestamp(os.path.getmtime(path)).strftime('%Y-%m-%d %H:%M:%S')
+            return {'category': category, 'name': template_name, 'content': content}, modified
+        return {'tags': self.core.tags()}, None
+
+    def _apply(self, key, payload, modified):
+        """把远端的内容写入本机，payload 为 None 表示删除"""
+        kind, _, name = key.partition(':')
+        if kind == 'plan':
+            if payload is None:
+                self.core.delete_plan(name)
+            else:
+                self.core.save_plans([dict(payload, last_modified=modified or now_str())])
+        elif kind == 'template':
+            category, _, template_name = name.partition('/')
+            if payload is None:
+                self.core.delete_template(category, template_name)
+            else:
+                self.core.write_template(category, template_name, payload['content'])
+        elif payload is not None:
+            self.core.tag_registry.save(payload['tags'])
+
+    def _marker(self, key):
+        return self._local_markers().get(key)
+
+    def local_changes(self):
+        """自上次同步以来本机改动的记录 {键: (哈希, 内容, 修改时间, 修改标记)}，删除的哈希为 None"""
+        base = self.state['base']
+        markers = self._local_markers()
+        changes = {}
+        for key in set(markers) | set(base):
+            known = base.get(key)
+            marker = markers.get(key)
+            if known is not None and known['marker'] == marker:
+                continue
+            if marker is None:
+                if known['hash'] is not None:
+                    changes[key] = (None, None, None, None)
+                continue
+            payload, modified = self._local_record(key)
+            digest = record_digest(payload)
+            if known is not None and known['hash'] == digest:
+                # 只是修改时间变了，记下新标记，下次不必再算哈希
+                known['marker'] = marker
+                self._state_changed = True
+                continue
+            changes[key] = (digest, payload, modified, marker)
+        return changes
+
+    @timed('sync.run')
+    def sync(self, progress=None):
+        """同步一次，返回 {'pushed', 'pulled', 'conflicts', 'revision'}"""
+        for _ in range(MAX_ATTEMPTS):
+            try:
+                return self._sync_once(progress)
+            except RemoteChanged:
+                # 其他设备刚好提交了新版本，重新比较
+                continue
+        raise SyncError("同步中心更新频繁，请稍后再试")
+
+    def _sync_once(self, progress):
+        state = self.state
+        self._state_changed = False
+        remote = self.transport.changes(state['revision'])
+        local = self.local_changes()
+        result = {'pushed': 0, 'pulled': 0, 'conflicts': [], 'revision': remote['revision']}
+        conflicts = state['conflicts']
+        pulls, pushes = {}, {}
+        for key in set(remote['records']) | set(local):
+            entry = remote['records'].get(key)
+            if key in conflicts:
+                # 冲突未解决前不上传也不下载，只记下远端最新的版本
+                if entry is not None:
+                    conflicts[key] = entry
+                continue
+            if entry is not None and key in local:
+                if entry['hash'] == local[key][0]:
+                    state['base'][key] = {'hash': entry['hash'], 'marker': local[key][3]}
+                elif key == 'tags' and local[key][1] is not None:
+                    # 分类列表两边都改了就取并集，不算冲突
+                    pushes[key] = self._merge_tags(local[key][1]['tags'], entry)
+                else:
+                    conflicts[key] = entry
+                continue
+            if entry is not None:
+                pulls[key] = entry
+            else:
+                pushes[key] = local[key]
+
+        if pushes:
+            objects = {digest: payload for digest, payload, _, _ in pushes.values() if digest is not None}
+            digests = list(objects)
+            for start in range(0, len(digests), TRANSFER_BATCH):
+                self.transport.put_objects({digest: objects[digest] for digest in digests[start:start + TRANSFER_BATCH]})
+                if progress is not None:
+                    progress(min(start + TRANSFER_BATCH, len(digests)), len(digests) + len(pulls))
+            updates = {key: {'hash': digest, 'modified': modified} for key, (digest, _, modified, _) in pushes.items()}
+            result['revision'] = self.transport.commit(remote['revision'], updates)
+            for key, (digest, _, _, marker) in pushes.items():
+                state['base'][key] = {'hash': digest, 'marker': marker}
+            result['pushed'] = len(pushes)
+
+        wanted = sorted({entry['hash'] for entry in pulls.values() if entry['hash'] is not None})
+        objects = {}
+        for start in range(0, len(wanted), TRANSFER_BATCH):
+            objects.update(self.transport.fetch(wanted[start:start + TRANSFER_BATCH]))
+            if progress is not None:
+                progress(len(pushes) + min(start + TRANSFER_BATCH, len(wanted)), len(pushes) + len(wanted))
+        # 计划批量写入，模板和分类逐条写入
+        plan_records = []
+        for key, entry in sorted(pulls.items()):
+            payload = objects.get(entry['hash']) if entry['hash'] is not None else None
+            if key.startswith('plan:') and payload is not None:
+                plan_records.append(dict(payload, last_modified=entry.get('modified') or now_str()))
+            else:
+                self._apply(key, payload, entry.get('modified'))
+        self.core.save_plans(plan_records)
+        if pulls:
+            markers = self._local_markers()
+            for key, entry in pulls.items():
+                state['base'][key] = {'hash': entry['hash'], 'marker': markers.get(key)}
+            result['pulled'] = len(pulls)
+
+        result['conflicts'] = sorted(conflicts)
+        if remote['records'] or local or self._state_changed:
+            state['revision'] = result['revision']
+            self._save_state()
+        return result
+
+    def _merge_tags(self, local_tags, entry):
+        remote_tags = self.transport.fetch([entry['hash']])[entry['hash']]['tags'] if entry['hash'] else []
+        merged = local_tags + [tag for tag in remote_tags if tag not in local_tags]
+        if merged != local_tags:
+            self.core.tag_registry.save(merged)
+        payload = {'tags': merged}
+        return record_digest(payload), payload, None, self._marker('tags')
+
+    def conflicts(self):
+        """未解决的冲突 [{'key', 'local_modified', 'remote_modified'}]"""
+        items = []
+        for key, entry in sorted(self.state['conflicts'].items()):
+            _, modified = self._local_record(key)
+            items.append({'key': key, 'local_modified': modified, 'remote_modified': entry.get('modified')})
+        return items
+
+    def conflict_versions(self, key):
+        """冲突双方的内容 (本机, 远端)，删除的一方为 None"""
+        entry = self.state['conflicts'][key]
+        remote = self.transport.fetch([entry['hash']])[entry['hash']] if entry['hash'] else None
+        return self._local_record(key)[0], remote
+
+    def resolve(self, key, keep):
+        """解决冲突：keep 为 'local' 时下次同步上传本机内容，为 'remote' 时立即用远端内容覆盖本机"""
+        entry = self.state['conflicts'].get(key)
+        if entry is None:
+            raise ValueError(f"没有这个冲突: {key}")
+        if keep == KEEP_REMOTE:
+            payload = self.transport.fetch([entry['hash']])[entry['hash']] if entry['hash'] else None
+            self._apply(key, payload, entry.get('modified'))
+            self.state['base'][key] = {'hash': entry['hash'], 'marker': self._marker(key)}
+        elif keep == KEEP_LOCAL:
+            # 以远端为基准并清除修改标记，下次同步时本机内容视为新的改动上传
+            self.state['base'][key] = {'hash': entry['hash'], 'marker': UNSYNCED}
+        else:
+            raise ValueError(f"未知的选项: {keep}")
+        del self.state['conflicts'][key]
+        self._save_state()
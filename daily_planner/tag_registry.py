@@ -0,0 +1,167 @@
+
+# 标准库导入
+import os
+import json
+import time
+import shutil
+import threading
+from datetime import datetime
+
+# 本地模块导入
+from fileutil import atomic_write
+from perf import timed
+
+
+class TagRegistry:
+    """分类标签注册表：读一次后常驻内存，tags.json 被外部修改时自动重新加载"""
+
+    # 两次检查文件修改时间的最小间隔（秒），避免界面频繁访问时反复 stat
+    CHECK_INTERVAL = 2.0
+
+    def __init__(self, data_dir, default_tags):
+        self.tags_file = os.path.join(data_dir, 'tags.json')
+        self.default_tags = list(default_tags)
+        self._lock = threading.RLock()
+        self._tags = None
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.tags_file).st_mtime_ns
+        except OSError:
+            return None
+
+    @timed('tags.reload')
+    def _reload(self, mtime):
+        tags = self.default_tags
+        if mtime is not None:
+            try:
+                with open(self.tags_file, 'r', encoding='utf-8') as f:
+                    tags = json.load(f).get('tags', self.default_tags)
+            except (OSError, ValueError) as e:
+                print(f"读取标签文件失败: {e}")
+        self._tags = list(tags)
+        self._mtime = mtime
+
+    @timed('tags.get')
+    def tags(self):
+        """返回全部标签的副本"""
+        with self._lock:
+            now = time.monotonic()
+            if self._tags is None or now - self._checked_at >= self.CHECK_INTERVAL:
+                self._checked_at = now
+                mtime = self._file_mtime()
+                if self._tags is None or mtime != self._mtime:
+                    self._reload(mtime)
+            return list(self._tags)
+
+    def __contains__(self, tag):
+        return tag in self.tags()
+
+    def invalidate(self):
+        """丢弃缓存，下次访问时重新读取"""
+        with self._lock:
+            self._tags = None
+
+    def save(self, tags):
+        """写入标签列表并更新缓存"""
+        with self._lock:
+            atomic_write(self.tags_file, json.dumps({'tags': list(tags)}, ensure_ascii=False, indent=2))
+            self._tags = list(tags)
+            self._mtime = self._file_mtime()
+            self._checked_at = time.monotonic()
+
+    def add(self, tag):
+        """添加标签，已存在时返回 False"""
+        with self._lock:
+            tags = self.tags()
+            if tag in tags:
+                return False
+            tags.append(tag)
+            self.save(tags)
+            return True
+
+    @timed('tags.rename')
+    def rename(self, old_tag, new_tag, store, template_dir, save_plans=None):
+        """重命名标签，同时改写该分类下的计划和模板目录，返回受影响的计划天数
+
+        save_plans 用于写回改过分类的计划（PlannerCore.save_plans 会同时记录历史、更新索引），
+        缺省时直接写入 store。
+        """
+        return self.merge([old_tag], new_tag, store, template_dir, save_plans)
+
+    @timed('tags.merge')
+    def merge(self, source_tags, target_tag, store, template_dir, save_plans=None):
+        """把若干标签合并到 target_tag，返回受影响的计划天数"""
+        sources = [tag for tag in source_tags if tag != target_tag]
+        if not sources:
+            return 0
+        with self._lock:
+            changed = _retag_plans(store, sources, target_tag, save_plans or store.save_many)
+            for tag in sources:
+                _move_templates(template_dir, tag, target_tag)
+
+            tags = self.tags()
+            position = min((tags.index(tag) for tag in sources if tag in tags), default=len(tags))
+            tags = [tag for tag in tags if tag not in sources and tag != target_tag]
+            tags.insert(min(position, len(tags)), target_tag)
+            self.save(tags)
+            return changed
+
+    @timed('tags.delete')
+    def delete(self, tag, store, template_dir, fallback_tag=None, save_plans=None):
+        """删除标签，原有计划和模板归入 fallback_tag（默认取剩余的第一个标签）"""
+        with self._lock:
+            remaining = [t for t in self.tags() if t != tag]
+            if not remaining:
+                raise ValueError("至少需要保留一个分类")
+            fallback_tag = fallback_tag or remaining[0]
+            if fallback_tag not in remaining:
+                remaining.append(fallback_tag)
+            changed = _retag_plans(store, [tag], fallback_tag, save_plans or store.save_many)
+            _move_templates(template_dir, tag, fallback_tag)
+            self.save(remaining)
+            return changed
+
+
+def _retag_plans(store, source_tags, target_tag, save_plans, batch_size=500):
+    """把属于 source_tags 的计划改为 target_tag，分批用 save_plans 写回
+
+    更新修改时间，同步和索引才会把这些计划当作已修改。
+    """
+    changed = 0
+    batch = []
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    # iter_plans 按日期分批续读，改写已读过的日期不影响后续遍历
+    for data in store.iter_plans(tags=source_tags):
+        data['tag'] = target_tag
+        data['last_modified'] = now
+        batch.append(data)
+        if len(batch) >= batch_size:
+            save_plans(batch)
+            changed += len(batch)
+            batch = []
+    if batch:
+        save_plans(batch)
+        changed += len(batch)
+    return changed
+
+
+def _move_templates(template_dir, source_tag, target_tag):
+    """把模板从一个分类目录移到另一个，同名模板自动加序号"""
+    source_dir = os.path.join(template_dir, source_tag)
+    if not os.path.isdir(source_dir):
+        return
+    target_dir = os.path.join(template_dir, target_tag)
+    os.makedirs(target_dir, exist_ok=True)
+    for name in os.listdir(source_dir):
+        source_path = os.path.join(source_dir, name)
+        stem, ext = os.path.splitext(name)
+        target_path = os.path.join(target_dir, name)
+        suffix = 1
+        while os.path.exists(target_path):
+            target_path = os.path.join(target_dir, f"{stem}_{suffix}{ext}")
+            suffix += 1
+        shutil.move(source_path, target_path)
+    os.rmdir(source_dir)
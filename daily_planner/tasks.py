@@ -0,0 +1,103 @@
+
+# 标准库导入
+import re
+from datetime import datetime, timedelta
+
+# Markdown 任务行：- [ ] 未完成，- [x] 已完成，- [>] 已顺延到其他日期
+TASK_PATTERN = re.compile(r'^(\s*[-*+]\s+\[)([ xX>])(\]\s+)(.*\S)\s*$')
+# 行内标记：#分类、~1.5h / ~30m 预估时间、（顺延自 YYYY-MM-DD）
+TAG_PATTERN = re.compile(r'(?<!\S)#([^\s#（）()]+)')
+ESTIMATE_PATTERN = re.compile(r'(?<!\S)~(\d+(?:\.\d+)?)\s*(h|m|min|小时|分钟)(?!\S)')
+CARRIED_PATTERN = re.compile(r'\s*[（(]顺延自\s*(\d{4}-\d{2}-\d{2})[)）]')
+
+STATE_OPEN = 'open'
+STATE_DONE = 'done'
+STATE_CARRIED = 'carried'
+STATE_MARKS = {' ': STATE_OPEN, 'x': STATE_DONE, 'X': STATE_DONE, '>': STATE_CARRIED}
+
+# 顺延时最多往前查找的天数
+CARRY_LOOKBACK_DAYS = 30
+
+
+def _estimate_minutes(text):
+    match = ESTIMATE_PATTERN.search(text)
+    if not match:
+        return None
+    value = float(match.group(1))
+    return int(round(value * 60)) if match.group(2) in ('h', '小时') else int(round(value))
+
+
+def parse_tasks(data):
+    """把计划内容解析为任务列表，position 为任务所在的行号"""
+    tasks = []
+    for position, line in enumerate((data.get('content') or '').splitlines()):
+        match = TASK_PATTERN.match(line)
+        if not match:
+            continue
+        body = match.group(4)
+        carried = CARRIED_PATTERN.search(body)
+        text = CARRIED_PATTERN.sub('', body)
+        tag = TAG_PATTERN.search(text)
+        estimate = _estimate_minutes(text)
+        text = ESTIMATE_PATTERN.sub('', TAG_PATTERN.sub('', text))
+        tasks.append({
+            'date': data['date'],
+            'position': position,
+            'text': ' '.join(text.split()) or body,
+            'state': STATE_MARKS[match.group(2)],
+            'tag': tag.group(1) if tag else data.get('tag'),
+            'estimate': estimate,
+            'carried_from': carried.group(1) if carried else None,
+        })
+    return tasks
+
+
+def _set_mark(content, positions, mark):
+    lines = content.splitlines()
+    for position in positions:
+        match = TASK_PATTERN.match(lines[position])
+        if match:
+            lines[position] = f"{match.group(1)}{mark}{match.group(3)}{match.group(4)}"
+    return '\n'.join(lines)
+
+
+def carry_unfinished(store, today=None, default_tag=None, lookback_days=CARRY_LOOKBACK_DAYS):
+    """计算把之前若干天未完成的任务顺延到 today 后的计划，不写入存储
+
+    原任务标记为 [>]，今天的计划末尾追加同样的任务并注明来源日期，
+    多次顺延时保留最初的日期。返回 (顺延的任务数, 修改过的计划列表)，
+    由调用方一次批量写入，写入前可以先记录修改前的历史版本。
+    """
+    today = today or datetime.now().strftime('%Y-%m-%d')
+    start = (datetime.strptime(today, '%Y-%m-%d') - timedelta(days=lookback_days)).strftime('%Y-%m-%d')
+    end = (datetime.strptime(today, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+    open_tasks = store.query_tasks(start, end, STATE_OPEN)
+    if not open_tasks:
+        return 0, []
+
+    by_date = {}
+    for task in open_tasks:
+        by_date.setdefault(task['date'], []).append(task['position'])
+
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    target = store.load(today) or {'date': today, 'content': '', 'tag': default_tag, 'done': False}
+    new_lines = []
+    changed = []
+    for plan_date, positions in sorted(by_date.items()):
+        data = store.load(plan_date)
+        lines = data.get('content', '').splitlines()
+        for position in positions:
+            match = TASK_PATTERN.match(lines[position])
+            body = CARRIED_PATTERN.sub('', match.group(4))
+            origin = CARRIED_PATTERN.search(match.group(4))
+            # 继承自原计划的分类写成行内标记，顺延后分类不变
+            if not TAG_PATTERN.search(body) and data.get('tag') and data.get('tag') != target.get('tag'):
+                body += f" #{data['tag']}"
+            new_lines.append(f"- [ ] {body}（顺延自 {origin.group(1) if origin else plan_date}）")
+        changed.append(dict(data, content=_set_mark(data['content'], positions, '>'), last_modified=now))
+
+    content = target.get('content', '').rstrip()
+    target = dict(target, content='\n'.join(filter(None, [content, '\n'.join(new_lines)])),
+                  done=False, last_modified=now)
+    changed.append(target)
+    return len(open_tasks), changed
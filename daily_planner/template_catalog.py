@@ -0,0 +1,174 @@
+
+# 标准库导入
+import os
+import threading
+
+# 本地模块导入
+from perf import timed
+
+
+class TemplateEntry:
+    """模板库中的一个模板"""
+
+    __slots__ = ('category', 'name', 'size', 'mtime_ns', 'preview', 'content')
+
+    def __init__(self, category, name, size, mtime_ns, preview, content):
+        self.category = category
+        self.name = name
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.preview = preview
+        # 小文件整体缓存，大文件只缓存预览片段
+        self.content = content
+
+
+class TemplateCatalog:
+    """模板库的内存索引：分类 -> 模板名 -> 元数据和预览
+
+    build() 完整扫描一次；refresh() 只对比目录和文件的修改时间，
+    发生变化的文件才重新读取。列表、搜索和预览都直接从内存返回。
+    """
+
+    PREVIEW_CHARS = 500
+    # 不超过这个大小的模板全文缓存在内存中
+    CONTENT_CACHE_BYTES = 64 * 1024
+
+    def __init__(self, template_dir):
+        self.template_dir = template_dir
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._dir_mtimes = {}
+        self.ready = False
+
+    def _path(self, category, name):
+        return os.path.join(self.template_dir, category, f"{name}.md")
+
+    def _read_entry(self, category, name, stat):
+        with open(self._path(category, name), 'r', encoding='utf-8') as f:
+            if stat.st_size <= self.CONTENT_CACHE_BYTES:
+                content = f.read()
+                preview = content[:self.PREVIEW_CHARS]
+            else:
+                content = None
+                preview = f.read(self.PREVIEW_CHARS)
+        return TemplateEntry(category, name, stat.st_size, stat.st_mtime_ns, preview, content)
+
+    def _scan_category(self, category, old_entries):
+        category_dir = os.path.join(self.template_dir, category)
+        entries = {}
+        with os.scandir(category_dir) as it:
+            for item in it:
+                if not item.name.endswith('.md') or not item.is_file():
+                    continue
+                name = item.name[:-3]
+                stat = item.stat()
+                old = old_entries.get(name)
+                if old is not None and old.mtime_ns == stat.st_mtime_ns and old.size == stat.st_size:
+                    entries[name] = old
+                    continue
+                try:
+                    entries[name] = self._read_entry(category, name, stat)
+                except (OSError, UnicodeDecodeError) as e:
+                    print(f"读取模板错误 {item.path}: {e}")
+        return entries
+
+    @timed('templates.build')
+    def build(self):
+        """完整扫描模板目录"""
+        with self._lock:
+            self._entries = {}
+            self._dir_mtimes = {}
+            self.refresh()
+
+    @timed('templates.refresh')
+    def refresh(self):
+        """增量刷新：目录未变化时只检查已知文件的修改时间，返回是否有变化"""
+        changed = False
+        with self._lock:
+            if not os.path.isdir(self.template_dir):
+                changed = bool(self._entries)
+                self._entries, self._dir_mtimes = {}, {}
+                self.ready = True
+                return changed
+
+            categories = [item.name for item in os.scandir(self.template_dir) if item.is_dir()]
+            for category in list(self._entries):
+                if category not in categories:
+                    del self._entries[category]
+                    self._dir_mtimes.pop(category, None)
+                    changed = True
+
+            for category in categories:
+                category_dir = os.path.join(self.template_dir, category)
+                try:
+                    dir_mtime = os.stat(category_dir).st_mtime_ns
+                    old_entries = self._entries.get(category, {})
+                    if self._dir_mtimes.get(category) != dir_mtime:
+                        # 有文件增删，重新列目录
+                        entries = self._scan_category(category, old_entries)
+                    else:
+                        entries = {}
+                        for name, entry in old_entries.items():
+                            stat = os.stat(self._path(category, name))
+                            if stat.st_mtime_ns == entry.mtime_ns and stat.st_size == entry.size:
+                                entries[name] = entry
+                            else:
+                                entries[name] = self._read_entry(category, name, stat)
+                except OSError as e:
+                    print(f"扫描模板目录错误 {category_dir}: {e}")
+                    continue
+                if entries.keys() != old_entries.keys() or any(
+                        entries[name] is not old_entries[name] for name in entries):
+                    changed = True
+                self._entries[category] = entries
+                self._dir_mtimes[category] = dir_mtime
+            self.ready = True
+        return changed
+
+    def categories(self):
+        with self._lock:
+            return sorted(self._entries)
+
+    @timed('templates.list')
+    def list(self, category, search_term=''):
+        """返回分类下名称或预览内容包含 search_term 的模板名（不区分大小写）"""
+        search_term = search_term.lower()
+        with self._lock:
+            entries = self._entries.get(category, {})
+            return sorted(
+                name for name, entry in entries.items()
+                if not search_term or search_term in name.lower()
+                or search_term in entry.preview.lower())
+
+    def get(self, category, name):
+        with self._lock:
+            return self._entries.get(category, {}).get(name)
+
+    def preview(self, category, name):
+        entry = self.get(category, name)
+        return entry.preview if entry is not None else None
+
+    @timed('templates.content')
+    def content(self, category, name):
+        """返回模板全文，大文件不在缓存中时从磁盘读取"""
+        entry = self.get(category, name)
+        if entry is not None and entry.content is not None:
+            return entry.content
+        with open(self._path(category, name), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def put(self, category, name):
+        """模板写入磁盘后更新对应条目"""
+        stat = os.stat(self._path(category, name))
+        entry = self._read_entry(category, name, stat)
+        with self._lock:
+            self._entries.setdefault(category, {})[name] = entry
+            self._dir_mtimes[category] = os.stat(os.path.dirname(self._path(category, name))).st_mtime_ns
+
+    def remove(self, category, name):
+        """模板从磁盘删除后移除对应条目"""
+        with self._lock:
+            self._entries.get(category, {}).pop(name, None)
+            category_dir = os.path.join(self.template_dir, category)
+            if os.path.isdir(category_dir):
+                self._dir_mtimes[category] = os.stat(category_dir).st_mtime_ns
@@ -0,0 +1,267 @@
+
+# 标准库导入
+import os
+import re
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+# 本地模块导入
+from tasks import STATE_OPEN, CARRY_LOOKBACK_DAYS
+from autosave import plan_hash
+from perf import timed
+
+# {{ 和 }} 表示字面的花括号；{名称} 或 {名称:参数}，名称可以是中文
+PLACEHOLDER_PATTERN = re.compile(r'\{\{|\}\}|\{(\w+)(?::([^{}\n]*))?\}')
+
+WEEKDAY_NAMES = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+# 内置字段，其余名称都是自定义字段
+BUILTIN_FIELDS = ('date', 'weekday', 'week_no', 'year', 'month', 'day', 'tag', 'carried')
+
+MODE_SKIP = 'skip'
+MODE_REPLACE = 'replace'
+MODE_APPEND = 'append'
+MODES = (MODE_SKIP, MODE_REPLACE, MODE_APPEND)
+
+# 预览中各天的变化
+ACTION_CREATE = 'create'
+ACTION_REPLACE = 'replace'
+ACTION_APPEND = 'append'
+ACTION_SKIP = 'skip'
+ACTION_UNCHANGED = 'unchanged'
+ACTION_NAMES = {ACTION_CREATE: '新建', ACTION_REPLACE: '替换', ACTION_APPEND: '追加',
+                ACTION_SKIP: '保留原计划', ACTION_UNCHANGED: '无变化'}
+
+
+class CompiledTemplate:
+    """解析好的模板：字面文本和占位符交替的片段列表，渲染时只做拼接
+
+    date 的参数是 strftime 格式（{date:%m月%d日}），自定义字段的参数是缺省值（{项目:日常}）。
+    没有提供值也没有缺省值的占位符原样保留，模板中代码片段里的花括号不受影响。
+    """
+
+    __slots__ = ('parts', 'fields')
+
+    def __init__(self, text):
+        parts = []
+        fields = []
+        literal = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            literal.append(text[position:match.start()])
+            position = match.end()
+            token = match.group(0)
+            if token in ('{{', '}}'):
+                literal.append(token[0])
+                continue
+            if literal:
+                parts.append(''.join(literal))
+                literal = []
+            name, argument = match.group(1), match.group(2)
+            parts.append((name, argument, token))
+            if name not in fields:
+                fields.append(name)
+        literal.append(text[position:])
+        parts.append(''.join(literal))
+        self.parts = parts
+        self.fields = fields
+
+    def custom_fields(self):
+        """自定义字段 [(名称, 缺省值)]，按出现顺序"""
+        seen = {}
+        for part in self.parts:
+            if isinstance(part, tuple) and part[0] not in BUILTIN_FIELDS:
+                seen.setdefault(part[0], part[1])
+        return list(seen.items())
+
+    def uses(self, name):
+        return name in self.fields
+
+    def render(self, context):
+        """context 为 {名称: 值}；date 的值为 datetime，用于按参数格式化"""
+        out = []
+        for part in self.parts:
+            if not isinstance(part, tuple):
+                out.append(part)
+                continue
+            name, argument, token = part
+            if name == 'date' and argument:
+                out.append(context['date_value'].strftime(argument))
+            elif context.get(name) is not None:
+                out.append(str(context[name]))
+            elif argument is not None and name not in BUILTIN_FIELDS:
+                out.append(argument)
+            else:
+                out.append(token)
+        return ''.join(out)
+
+
+def day_context(plan_date, tag=None, fields=None, carried=''):
+    """某天渲染用的字段值"""
+    day = datetime.fromisoformat(plan_date)
+    context = dict(fields or {})
+    context.update({
+        'date': plan_date,
+        'date_value': day,
+        'weekday': WEEKDAY_NAMES[day.weekday()],
+        'week_no': day.isocalendar()[1],
+        'year': day.year,
+        'month': day.month,
+        'day': day.day,
+        'tag': tag or '',
+        'carried': carried,
+    })
+    return context
+
+
+def date_range(start, end, workdays_only=False):
+    """start 到 end（含）的日期列表，workdays_only=True 时只包含周一到周五"""
+    first = datetime.strptime(start, '%Y-%m-%d')
+    last = datetime.strptime(end, '%Y-%m-%d')
+    if last < first:
+        raise ValueError("结束日期早于开始日期")
+    dates = []
+    day = first
+    while day <= last:
+        if not workdays_only or day.weekday() < 5:
+            dates.append(day.strftime('%Y-%m-%d'))
+        day += timedelta(days=1)
+    return dates
+
+
+def next_month(today=None):
+    """下个月的第一天和最后一天"""
+    today = today or datetime.now()
+    first = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+    last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return first.strftime('%Y-%m-%d'), last.strftime('%Y-%m-%d')
+
+
+def _task_line(task, target_tag):
+    """把未完成的任务写回任务行，与顺延时的格式相同"""
+    body = task['text']
+    if task.get('tag') and task['tag'] != target_tag:
+        body += f" #{task['tag']}"
+    if task.get('estimate'):
+        minutes = task['estimate']
+        body += f" ~{minutes // 60}h" if minutes % 60 == 0 else f" ~{minutes}m"
+    return f"- [ ] {body}（顺延自 {task.get('carried_from') or task['date']}）"
+
+
+class TemplateEngine:
+    """编译模板并缓存，模板文件修改后（按修改时间和大小判断）才重新编译"""
+
+    MAX_CACHED = 256
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+
+    def _signature(self, category, name):
+        entry = self.catalog.get(category, name)
+        if entry is not None:
+            return entry.mtime_ns, entry.size
+        stat = os.stat(os.path.join(self.catalog.template_dir, category, f"{name}.md"))
+        return stat.st_mtime_ns, stat.st_size
+
+    @timed('templates.compile')
+    def compile(self, category, name):
+        """取得编译好的模板，模板不存在时抛出 FileNotFoundError"""
+        key = (category, name)
+        signature = self._signature(category, name)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == signature:
+                self._cache.move_to_end(key)
+                return cached[1]
+        compiled = CompiledTemplate(self.catalog.content(category, name))
+        with self._lock:
+            self._cache[key] = (signature, compiled)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.MAX_CACHED:
+                self._cache.popitem(last=False)
+        return compiled
+
+
+def carried_items(store, dates, target_tag=None, exclude=()):
+    """各目标日期要带入的未完成任务 {日期: 文本}
+
+    每个任务只带入它之后的第一个目标日期，同一次批量应用中不会重复出现；
+    只复制任务，不修改原计划（需要标记为已顺延时使用“顺延未完成”）。
+    """
+    if not dates:
+        return {}
+    first = datetime.strptime(dates[0], '%Y-%m-%d')
+    start = (first - timedelta(days=CARRY_LOOKBACK_DAYS)).strftime('%Y-%m-%d')
+    end = (datetime.strptime(dates[-1], '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+    exclude = set(exclude)
+    tasks = [task for task in store.query_tasks(start, end, STATE_OPEN) if task['date'] not in exclude]
+    lines = {}
+    for task in tasks:
+        # 任务所在日期之后的第一个目标日期
+        index = bisect_left(dates, task['date'])
+        if index < len(dates) and dates[index] == task['date']:
+            index += 1
+        if index >= len(dates):
+            continue
+        target = dates[index]
+        if (date.fromisoformat(target) - date.fromisoformat(task['date'])).days > CARRY_LOOKBACK_DAYS:
+            continue
+        lines.setdefault(target, []).append(_task_line(task, target_tag))
+    return {plan_date: '\n'.join(items) for plan_date, items in lines.items()}
+
+
+@timed('templates.plan_range')
+def plan_template_range(core, category, name, dates, fields=None, mode=MODE_SKIP, tag=None):
+    """按模板为一组日期生成计划，返回 (变化列表, 要写入的计划)
+
+    变化列表每项为 {'date', 'action', 'content', 'previous'}。已有计划的日期按 mode 处理：
+    skip 保留原计划，replace 用模板内容替换，append 追加到原内容之后。
+    """
+    if mode not in MODES:
+        raise ValueError(f"未知的处理方式: {mode}")
+    compiled = core.template_engine.compile(category, name)
+    dates = sorted(set(dates))
+    if not dates:
+        return [], []
+    new_tag = tag or core.tags()[0]
+    existing = {data['date']: data for data in core.iter_plans(dates[0], dates[-1])}
+    carried = {}
+    if compiled.uses('carried'):
+        # 保留原计划的日期不会写入，它们的任务照常可以带入后面的日期
+        written = [plan_date for plan_date in dates if plan_date not in existing or mode != MODE_SKIP]
+        carried = carried_items(core.store, written, new_tag, exclude=written)
+
+    changes, records = [], []
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    for plan_date in dates:
+        previous = existing.get(plan_date)
+        if previous is not None and mode == MODE_SKIP:
+            changes.append({'date': plan_date, 'action': ACTION_SKIP, 'content': previous.get('content', ''),
+                            'previous': previous.get('content', '')})
+            continue
+        # 未指定分类时已有计划保留原分类
+        day_tag = tag or (previous.get('tag') if previous is not None else None) or new_tag
+        content = compiled.render(day_context(plan_date, day_tag, fields, carried.get(plan_date, ''))).strip('\n')
+        if previous is None:
+            action = ACTION_CREATE
+            data = {'date': plan_date, 'content': content, 'tag': day_tag, 'done': False}
+        elif mode == MODE_APPEND:
+            action = ACTION_APPEND
+            old = previous.get('content', '').rstrip()
+            # 已经追加过同样的内容时不再重复追加
+            data = dict(previous) if content in old else dict(
+                previous, content='\n\n'.join(filter(None, [old, content])), done=False)
+        else:
+            action = ACTION_REPLACE
+            data = dict(previous, content=content, tag=day_tag, done=False)
+        if previous is not None and plan_hash(previous) == plan_hash(data):
+            action = ACTION_UNCHANGED
+        else:
+            data['last_modified'] = now
+            records.append(data)
+        changes.append({'date': plan_date, 'action': action, 'content': data['content'],
+                        'previous': previous.get('content', '') if previous is not None else None})
+    return changes, records